@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright © 2025, UChicago Argonne, LLC
+The full description is available in the LICENSE file at location:
+    https://github.com/Saurajyoti/BestBiomassUse/blob/master/LICENSE
+
+@Project: Best Use of Biomass
+@Title: Benchmark of the main_2 model stages on synthetic inputs
+@Authors: Saurajyoti Kar
+@Contact: skar@anl.gov
+@Affiliation: Argonne National Laboratory
+
+"""
+
+"""
+Runs the main_2 model on synthetic inputs of growing size, scaling one of
+N pathways, M production years, K variability points and R LCI rows at a time,
+and times every stage along with model_units.unit_convert_df. unit_convert_df
+is also timed on frames of up to tens of millions of rows, and its time per
+row is checked to stay flat as the frames grow. The timings are
+appended to a local CSV file, and compared with the last stored run of the same
+sizes to flag regressions. The time to import main_2 in a fresh interpreter is
+checked against an import-time budget; with --import-only, only this check is
+run and the exit code is 1 when the budget is exceeded.
+
+Usage:
+    python benchmark_main_2.py [--quick] [--label LABEL] [--data DATA_PATH] [--out CSV_FILE]
+    python benchmark_main_2.py --import-only
+
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import main_2
+from model_profile import stage_profiler
+from unit_conversions import model_units
+import synthetic_inputs as syn
+
+# Sizes as (N pathways, M production years, K variability points, R LCI rows).
+# R of None generates only the LCI rows referenced by the synthetic pathways.
+scaling = {
+    'N': [(10, 5, 1, None), (20, 5, 1, None), (40, 5, 1, None)],
+    'M': [(10, 5, 1, None), (10, 15, 1, None), (10, 29, 1, None)],
+    'K': [(10, 5, 1, None), (10, 5, 5, None), (10, 5, 10, None)],
+    'R': [(10, 5, 1, None), (10, 5, 1, 50000), (10, 5, 1, 200000)],
+    'all': [(50, 29, 10, 200000)],
+}
+scaling_quick = {
+    'N': [(2, 2, 1, None), (4, 2, 1, None)],
+    'M': [(2, 2, 1, None), (2, 4, 1, None)],
+    'K': [(2, 2, 1, None), (2, 2, 3, None)],
+    'R': [(2, 2, 1, None), (2, 2, 1, 10000)],
+}
+
+# row counts of the unit_convert_df benchmark, up to the LCA_items rows of large variability runs
+unit_convert_rows = [1000, 10000, 100000, 1000000, 10000000, 30000000]
+unit_convert_rows_quick = [1000, 10000, 100000]
+
+# flag unit_convert_df when the time per row of the largest frame exceeds the time per row of the
+# frames of at least unit_convert_linear_min_rows rows by this ratio
+unit_convert_linear_ratio = 2.0
+unit_convert_linear_min_rows = 100000
+
+# flag stages slower than the last stored run by this ratio
+regression_ratio = 1.5
+
+first_year = 2022
+
+# seconds allowed for importing main_2 in a fresh interpreter, and modules that must not be
+# imported by it, as they are only needed by the dashboard write and the inflation stages
+import_time_budget_s = 1.0
+import_lazy_modules = ['xlwings', 'cpi']
+
+
+# Model inputs of the given size, with the correspondence, price and emission factor files of the repository
+def synthetic_model_inputs(config, n_pathways, n_years, k_points=1, n_LCI_rows=None, ob_units=None, seed=0):
+    df_econ = syn.synthetic_db(n_pathways, seed)
+    cases = list(df_econ['Case/Scenario'].unique())
+
+    if ob_units is None:
+        ob_units = model_units(config.input_path_units, config.input_path_GREET, config.input_path_corr, verbose=False)
+
+    def read_corr(f):
+        return pd.read_csv(config.input_path_corr + '/' + f, header=3, index_col=None)
+
+    return main_2.model_inputs(
+        df_econ, syn.synthetic_pathway_names(cases),
+        pd.read_csv(config.input_path_EIA_price + '/' + main_2.f_EIA_price, index_col=None),
+        pd.read_csv(config.input_path_GREET + '/' + main_2.f_GREET_efs, header=3, index_col=None).drop_duplicates(),
+        ob_units,
+        syn.synthetic_corr_replaced_replacing_fuel(cases),
+        read_corr(main_2.f_corr_fuel_replaced_GREET_pathway),
+        read_corr(main_2.f_corr_GGE_GREET_fuel_replaced),
+        read_corr(main_2.f_corr_GGE_GREET_fuel_replacing),
+        syn.synthetic_LCI(list(range(first_year, first_year + n_years)), n_LCI_rows, seed),
+        read_corr(main_2.f_corr_replaced_EIA_mfsp),
+        corr_params_variability=syn.synthetic_var_p(k_points))
+
+
+# Configuration of a benchmark run of the given size
+def synthetic_config(config, inputs, n_years, k_points):
+    return config.copy(pathways_to_consider=list(inputs.df_econ['Case/Scenario'].unique()),
+                       production_year=[first_year, first_year + n_years - 1],
+                       consider_variability_study=k_points > 1,
+                       consider_which_variabilities='Stream_LCA',
+                       save_interim_files=False, write_to_dashboard=False,
+                       consider_scale_up_study=False, decarb_electric_grid=False)
+
+
+# Time every stage of a model run on synthetic inputs of the given size
+def bench_model(config, size, ob_units):
+    n, m, k, r = size
+    inputs = synthetic_model_inputs(config, n, m, k, r, ob_units)
+    run_config = synthetic_config(config, inputs, m, k)
+
+    profiler = stage_profiler()
+    wall_0 = time.perf_counter()
+    with profiler.track(model_units, 'unit_convert_df'):
+        results = main_2.run_model(run_config, inputs, None, profiler)
+    wall = time.perf_counter() - wall_0
+
+    df = profiler.to_frame()
+    df = pd.concat([df, pd.DataFrame([{'stage': 'run_model', 'calls': 1, 'wall_s': wall,
+                                       'rows_out': results['MAC_df'].shape[0]}])], ignore_index=True)
+    df['LCI_rows'] = inputs.corr_itemized_LCA.shape[0]
+    return df
+
+
+# Time unit_convert_df on frames of random flow units
+def bench_unit_convert(ob_units, n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    units = pd.Series(['kWh', 'MMBtu', 'MJ', 'lb', 'g', 'Short Tons', 'gal', 'Liter'])
+    df = pd.DataFrame({'Unit': units.take(rng.integers(0, len(units), n_rows)).reset_index(drop=True),
+                       'Value': rng.uniform(0, 100, n_rows)})
+    wall_0 = time.perf_counter()
+    cpu_0 = time.process_time()
+    ob_units.unit_convert_df(df, Unit='Unit', Value='Value', if_unit_numerator=False, if_given_category=False)
+    return pd.DataFrame([{'stage': 'model_units.unit_convert_df', 'calls': 1,
+                          'wall_s': time.perf_counter() - wall_0, 'cpu_s': time.process_time() - cpu_0,
+                          'rows_in': n_rows}])
+
+
+# Time per row of unit_convert_df by frame size, flagging growth beyond linear scaling. Returns False
+# when the largest frame is slower per row than the frames of at least unit_convert_linear_min_rows
+# rows by more than unit_convert_linear_ratio.
+def check_unit_convert_scaling(df):
+    df = df.loc[df['axis'] == 'unit_convert', ['rows_in', 'wall_s']].astype({'rows_in': 'int64'})
+    df = df.sort_values('rows_in').reset_index(drop=True)
+    df['us_per_1000_rows'] = df['wall_s'] / df['rows_in'] * 1E9
+    print(df.to_string(index=False, float_format='{:.3f}'.format))
+    base = df.loc[df['rows_in'] >= unit_convert_linear_min_rows, 'us_per_1000_rows']
+    if base.shape[0] < 2:
+        return True
+    ratio = base.iloc[-1] / base.iloc[:-1].min()
+    if ratio > unit_convert_linear_ratio:
+        print('Warning: time per row of unit_convert_df grows with the frame size, by ' + '{:.2f}'.format(ratio) + ' ..')
+        return False
+    print('unit_convert_df scales linearly, time per row of the largest frame within ' + '{:.2f}'.format(ratio) + ' of the smaller frames.')
+    return True
+
+
+# Time the import of main_2 in a fresh interpreter, with the slowest imported modules as
+# reported by python -X importtime
+def bench_import(n_top=10):
+    code = ('import sys, time; t = time.perf_counter(); import main_2; '
+            'print(time.perf_counter() - t); print(",".join(m for m in ' + repr(import_lazy_modules) +
+            ' if m in sys.modules))')
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+    if proc.returncode != 0:
+        raise ValueError('Import of main_2 failed ..\n' + proc.stderr[-2000:])
+    out = proc.stdout.split('\n')
+    wall = float(out[0])
+    loaded = [m for m in out[1].split(',') if m != '']
+
+    # lines of: import time: self [us] | cumulative [us] | imported package, indented by import depth,
+    # with the modules imported by a package listed before it
+    rows = []
+    block = []
+    for line in proc.stderr.split('\n'):
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cum_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            if name.strip() == 'main_2':
+                rows = block
+            block = []
+        elif depth == 1:
+            block.append({'module': name.strip(), 'cumulative_s': int(cum_us) / 1E6})
+    top = pd.DataFrame(rows, columns=['module', 'cumulative_s']).sort_values('cumulative_s', ascending=False)
+
+    print('Import of main_2: ' + '{:.3f}'.format(wall) + ' s, budget ' + str(import_time_budget_s) + ' s')
+    print(top.head(n_top).to_string(index=False, float_format='{:.3f}'.format))
+    ok = wall <= import_time_budget_s
+    if not ok:
+        print('Warning: import of main_2 is over the import-time budget ..')
+    if len(loaded) > 0:
+        print('Warning: main_2 imports ' + ', '.join(loaded) + ' at load time, these should be imported by the stages using them ..')
+        ok = False
+
+    return pd.DataFrame([{'stage': 'import main_2', 'calls': 1, 'wall_s': wall}]), ok
+
+
+# Compare with the last stored run, matched by benchmark case and stage
+def compare_last_run(df, f_out):
+    if not os.path.isfile(f_out):
+        return
+    last = pd.read_csv(f_out)
+    last = last.loc[last['run_time'] == last['run_time'].max(), ['case', 'stage', 'wall_s']]
+    cmp = df[['case', 'stage', 'wall_s']].merge(last, how='inner', on=['case', 'stage'], suffixes=('', '_last'))
+    cmp['ratio'] = cmp['wall_s'] / cmp['wall_s_last']
+    slow = cmp.loc[(cmp['ratio'] > regression_ratio) & (cmp['wall_s'] > 0.05), :]
+    if slow.shape[0] > 0:
+        print('Warning: the following stages are slower than the last stored benchmark run ..')
+        print(slow.to_string(index=False, float_format='{:.3f}'.format))
+    else:
+        print('No regression against the last stored benchmark run.')
+
+
+def run_benchmarks(config, quick=False, label='', f_out=None):
+    if f_out is None:
+        f_out = config.output_path_prefix + '/benchmarks/bench_main_2.csv'
+    ob_units = model_units(config.input_path_units, config.input_path_GREET, config.input_path_corr, verbose=False)
+    run_time = datetime.now().isoformat(timespec='seconds')
+
+    out = []
+    for axis, sizes in (scaling_quick if quick else scaling).items():
+        for size in sizes:
+            print('Benchmark: scaling ' + axis + ', N, M, K, R = ' + str(size) + ' ..')
+            df = bench_model(config, size, ob_units)
+            df['case'] = 'model_' + '_'.join(str(x) for x in size)
+            df['axis'] = axis
+            df[['N', 'M', 'K', 'R']] = [size[0], size[1], size[2], -1 if size[3] is None else size[3]]
+            out.append(df)
+
+    for n_rows in (unit_convert_rows_quick if quick else unit_convert_rows):
+        print('Benchmark: unit_convert_df, rows = ' + str(n_rows) + ' ..')
+        df = bench_unit_convert(ob_units, n_rows)
+        df['case'] = 'unit_convert_' + str(n_rows)
+        df['axis'] = 'unit_convert'
+        out.append(df)
+
+    check_unit_convert_scaling(pd.concat(out, ignore_index=True))
+
+    print('Benchmark: import of main_2 ..')
+    df, _ = bench_import()
+    df['case'] = 'import'
+    df['axis'] = 'import'
+    out.append(df)
+
+    df = pd.concat(out, ignore_index=True)
+    df.insert(0, 'run_time', run_time)
+    df.insert(1, 'label', label)
+
+    # run_model totals per size
+    summary = df.loc[df['stage'].isin(['run_model']), ['axis', 'N', 'M', 'K', 'R', 'LCI_rows', 'rows_out', 'wall_s']]
+    summary = summary.astype({c: 'int64' for c in ['N', 'M', 'K', 'R', 'LCI_rows', 'rows_out']})
+    print(summary.to_string(index=False, float_format='{:.3f}'.format))
+
+    compare_last_run(df, f_out)
+
+    os.makedirs(os.path.dirname(f_out), exist_ok=True)
+    df.to_csv(f_out, mode='a', header=not os.path.isfile(f_out), index=False)
+    print('Benchmark results appended to ' + f_out)
+    return df
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark of the main_2 model stages on synthetic inputs')
+    parser.add_argument('--quick', action='store_true', help='small sizes, for a smoke test')
+    parser.add_argument('--label', default='', help='label stored with the results, e.g. a branch name')
+    parser.add_argument('--data', default=None, help='data folder, defaults to input_path_prefix of main_2')
+    parser.add_argument('--out', default=None, help='results CSV file, defaults to <output folder>/benchmarks/bench_main_2.csv')
+    parser.add_argument('--import-only', action='store_true', help='only check the import time of main_2 against the budget')
+    args = parser.parse_args()
+
+    if args.import_only:
+        _, ok = bench_import()
+        sys.exit(0 if ok else 1)
+
+    config = main_2.model_config()
+    if args.data is not None:
+        config = config.copy(input_path_prefix=args.data)
+
+    run_benchmarks(config, args.quick, args.label, args.out)
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright © 2025, UChicago Argonne, LLC
+The full description is available in the LICENSE file at location:
+    https://github.com/Saurajyoti/BestBiomassUse/blob/master/LICENSE
+
+@Project: Best Use of Biomass
+@Title: Indexed store of the GREET emission factors of conventional fuels
+@Authors: Saurajyoti Kar
+@Contact: skar@anl.gov
+@Affiliation: Argonne National Laboratory
+
+"""
+
+"""
+The GREET emission factor file holds the emission factors of conventional fuels
+by GREET Pathway, Formula, Case and Year. The EF store converts it once to a
+parquet file with the rows sorted by these keys and typed value columns, and is
+rebuilt when the CSV file changes, the same way as the LCI store.
+
+The EF index looks up the emission factors of a list of keys without joining
+the whole table: the key columns are coded against their sorted unique values,
+combined into one sorted integer key, and the requested keys are located by
+binary search. A lookup returns numpy arrays aligned with the requested keys,
+with NaN for keys not in the table.
+
+Usage:
+    python ef_store.py CSV_FILE STORE_PATH
+
+"""
+
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from lci_store import read_source, store_is_current, f_source
+from sheet_cache import hash_file
+
+# Options of pd.read_csv for the emission factor file
+EF_read_kwargs = {'header': 3, 'index_col': None}
+
+EF_key_columns = ['GREET Pathway', 'Formula', 'Case', 'Year']
+
+EF_value_columns = ['Reference case', 'Elec0']
+
+f_EF_table = 'ef.parquet'
+
+
+# Emission factor table of the CSV file f, with duplicate rows dropped and value columns as float
+def read_EF_csv(f):
+    df = pd.read_csv(f, **EF_read_kwargs).drop_duplicates()
+    for colm in EF_value_columns:
+        df[colm] = pd.to_numeric(df[colm], errors='coerce')
+    df['Year'] = df['Year'].astype('int64')
+    return df
+
+
+# Convert the CSV file f to a parquet file sorted by the key columns under store_path
+def write_EF_store(f, store_path, verbose=True):
+    if verbose:
+        print('EF store: converting ' + os.path.basename(f) + ' to a sorted parquet store ..')
+    st = os.stat(f)
+    df = read_EF_csv(f)
+    df = df.sort_values(EF_key_columns, kind='stable').reset_index(drop=True)
+
+    # written to a temporary folder first, a store is complete once it is in place
+    tmp_path = store_path + '.tmp'
+    if os.path.isdir(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    df.to_parquet(tmp_path + '/' + f_EF_table, index=False)
+    source = {'file': os.path.basename(f), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha1': hash_file(f),
+              'columns': [str(c) for c in df.columns], 'dtypes': [str(dt) for dt in df.dtypes]}
+    with open(tmp_path + '/' + f_source, 'w') as fh:
+        json.dump(source, fh)
+    if os.path.isdir(store_path):
+        shutil.rmtree(store_path)
+    os.replace(tmp_path, store_path)
+
+
+# Read the emission factor table from the store, rows sorted by the key columns
+def read_EF_store(store_path, columns=None):
+    source = read_source(store_path)
+    df = pd.read_parquet(store_path + '/' + f_EF_table, columns=columns)
+    dtypes = dict(zip(source['columns'], source['dtypes']))
+    for colm in df.columns:
+        if str(df[colm].dtype) != dtypes[colm]:
+            df[colm] = df[colm].astype(dtypes[colm])
+    return df
+
+
+# Read the emission factor table, converting the CSV file f to the store first when the store
+# is missing or out of date
+def read_EF(f, store_path, columns=None, verbose=True):
+    if not store_is_current(f, store_path):
+        write_EF_store(f, store_path, verbose)
+    return read_EF_store(store_path, columns)
+
+
+class ef_index:
+    """Sorted key index of the emission factor table for lookups of aligned value arrays"""
+
+    def __init__(self, ef, value_columns=EF_value_columns):
+        # sorted unique values of every key column, and the radix of the combined key
+        self.levels = [pd.Index(np.sort(ef[colm].dropna().unique())) for colm in EF_key_columns]
+        self.radix = np.cumprod([1] + [len(lv) for lv in self.levels[:0:-1]])[::-1].astype('int64')
+        if np.prod([float(len(lv)) for lv in self.levels]) >= 2.**62:
+            raise ValueError('EF index: too many key values to combine into one integer key')
+
+        keys = self._combine([ef[colm].values for colm in EF_key_columns])
+        valid = keys >= 0
+        if not valid.all():
+            print('Warning: EF index: ' + str((~valid).sum()) + ' rows with missing keys are not indexed')
+        order = np.flatnonzero(valid)
+        if not (np.diff(keys[order]) >= 0).all():
+            order = order[np.argsort(keys[order], kind='stable')]
+        self.keys = keys[order]
+
+        # the first row of repeated keys is the one looked up
+        first = np.ones(self.keys.shape[0], dtype=bool)
+        first[1:] = self.keys[1:] != self.keys[:-1]
+        if not first.all():
+            print('Warning: EF index: ' + str((~first).sum()) + ' rows with repeated keys, the first row is used')
+        self.keys = self.keys[first]
+        rows = order[first]
+        self.values = {colm: pd.to_numeric(ef[colm], errors='coerce').to_numpy(dtype='float64')[rows]
+                       for colm in value_columns}
+
+    # Combined integer keys of the key column arrays, -1 where any key value is not in the levels
+    def _combine(self, arrays):
+        keys = np.zeros(len(arrays[0]), dtype='int64')
+        missing = np.zeros(len(arrays[0]), dtype=bool)
+        for lv, r, a in zip(self.levels, self.radix, arrays):
+            codes = lv.get_indexer(np.asarray(a))
+            missing |= codes < 0
+            keys += codes.astype('int64') * r
+        keys[missing] = -1
+        return keys
+
+    # Positions in the index of the requested keys, -1 for keys not in the table. Scalar keys are
+    # broadcast to the length of the other keys.
+    def locate(self, pathways, formulas, cases, years):
+        arrays = [np.atleast_1d(np.asarray(a, dtype=object if i < 3 else None))
+                  for i, a in enumerate([pathways, formulas, cases, years])]
+        n = max(a.shape[0] for a in arrays)
+        arrays = [np.broadcast_to(a, (n,)) for a in arrays]
+        keys = self._combine(arrays)
+        pos = np.searchsorted(self.keys, keys)
+        pos[pos == self.keys.shape[0]] = 0
+        found = (keys >= 0) & (self.keys[pos] == keys) if self.keys.shape[0] > 0 else np.zeros(n, dtype=bool)
+        return np.where(found, pos, -1)
+
+    # Emission factors of the requested keys as a float array aligned with the keys, NaN for keys
+    # not in the table; a dictionary of arrays when column is a list of value columns
+    def lookup(self, pathways, formulas, cases, years, column='Reference case'):
+        pos = self.locate(pathways, formulas, cases, years)
+        columns = [column] if isinstance(column, str) else column
+        out = {}
+        for colm in columns:
+            v = self.values[colm][np.maximum(pos, 0)] if self.keys.shape[0] > 0 else np.zeros(pos.shape[0])
+            out[colm] = np.where(pos >= 0, v, np.nan)
+        return out[column] if isinstance(column, str) else out
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Convert the GREET emission factor file to a sorted parquet store')
+    parser.add_argument('f', help='GREET emission factor CSV file')
+    parser.add_argument('store_path', help='folder of the store')
+    args = parser.parse_args()
+
+    write_EF_store(args.f, args.store_path)
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright © 2025, UChicago Argonne, LLC
+The full description is available in the LICENSE file at location:
+    https://github.com/Saurajyoti/BestBiomassUse/blob/master/LICENSE
+
+@Project: Best Use of Biomass
+@Title: Versioned bundle of the model input data sets
+@Authors: Saurajyoti Kar
+@Contact: skar@anl.gov
+@Affiliation: Argonne National Laboratory
+
+"""
+
+"""
+The model reads about fifteen files from the GREET, EIA, Units, BT16 and
+correspondence file folders. The input bundle packs the data sets read for a
+model run into one folder: every data frame as an uncompressed Arrow IPC file,
+which is memory-mapped on read, other objects such as the unit conversion
+object as pickle files, and a manifest. The manifest lists the version of the
+bundle, the source files with their size, modification time and hash, the
+hash, size and column types of every bundled data set, and the selection of
+pathways and production years the data sets were read for. The bundle id, a
+hash of the bundled data sets, identifies the contents of a bundle.
+
+A bundle is current while its source files are unchanged, judged by size and
+modification time, or by the hash of the file when these differ.
+
+Usage:
+    python input_bundle.py BUNDLE_PATH
+
+verifies the data sets of a bundle against the hashes of the manifest.
+
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+
+from sheet_cache import hash_file
+
+f_manifest = 'manifest.json'
+
+
+# Write a data set to the bundle folder, returns its file name and format
+def _write_value(bundle_path, name, value):
+    if isinstance(value, pd.DataFrame):
+        try:
+            table = pa.Table.from_pandas(value, preserve_index=True)
+            f = name + '.arrow'
+            with pa.OSFile(bundle_path + '/' + f, 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            return f, 'arrow'
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            # columns of mixed types, kept as pickle
+            pass
+    f = name + '.pkl'
+    with open(bundle_path + '/' + f, 'wb') as fh:
+        pickle.dump(value, fh, protocol=4)
+    return f, 'pickle'
+
+
+# Read the data set name of the bundle with the given manifest, Arrow files are memory-mapped
+def read_bundle_table(bundle_path, manifest, name):
+    entry = manifest['tables'][name]
+    f = bundle_path + '/' + entry['file']
+    if entry['format'] == 'pickle':
+        with open(f, 'rb') as fh:
+            return pickle.load(fh)
+    with pa.memory_map(f, 'r') as source:
+        df = pa.ipc.open_file(source).read_all().to_pandas()
+    # Arrow infers types of object columns, original types are restored
+    for i, c in enumerate(df.columns):
+        dtype = entry['dtypes'].get(str(c))
+        if dtype is not None and str(df.dtypes.iloc[i]) != dtype:
+            df.isetitem(i, df.iloc[:, i].astype(dtype))
+    return df
+
+
+# Write the data sets in values, a dictionary of data set name to data, to a new bundle at bundle_path.
+# sources lists the source files of the data sets, and selection the options they were read with.
+# Returns the manifest of the bundle.
+def write_bundle(values, sources, selection, bundle_path, version=None, verbose=True):
+    if version is None:
+        version = datetime.now().strftime('%Y%m%d_%H%M%S')
+    if verbose:
+        print('Input bundle: writing ' + str(len(values)) + ' data sets to ' + bundle_path + ' ..')
+
+    # written to a temporary folder first, a bundle is complete once it is in place
+    tmp_path = bundle_path + '.tmp'
+    if os.path.isdir(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    tables = {}
+    for name, value in values.items():
+        f, fmt = _write_value(tmp_path, name, value)
+        entry = {'file': f, 'format': fmt, 'sha1': hash_file(tmp_path + '/' + f)}
+        if isinstance(value, pd.DataFrame):
+            entry.update(rows=value.shape[0], columns=value.shape[1],
+                         dtypes={str(c): str(dt) for c, dt in value.dtypes.items()})
+        tables[name] = entry
+
+    files = {}
+    for f in dict.fromkeys(sources):
+        if os.path.isfile(f):
+            st = os.stat(f)
+            files[f] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha1': hash_file(f)}
+        else:
+            # folders are recorded without hash
+            files[f] = None
+
+    bundle_id = hashlib.sha1(json.dumps({k: v['sha1'] for k, v in sorted(tables.items())}).encode()).hexdigest()
+    manifest = {'version': version, 'bundle_id': bundle_id, 'created': datetime.now().isoformat(timespec='seconds'),
+                'selection': selection, 'sources': files, 'tables': tables}
+    with open(tmp_path + '/' + f_manifest, 'w') as fh:
+        json.dump(manifest, fh, indent=1)
+
+    if os.path.isdir(bundle_path):
+        shutil.rmtree(bundle_path)
+    os.replace(tmp_path, bundle_path)
+    return manifest
+
+
+# Manifest of the bundle, None when there is no bundle
+def read_manifest(bundle_path):
+    if not os.path.isfile(bundle_path + '/' + f_manifest):
+        return None
+    with open(bundle_path + '/' + f_manifest) as fh:
+        return json.load(fh)
+
+
+# True when the source files of the bundle are unchanged since it was written
+def sources_unchanged(manifest):
+    for f, rec in manifest['sources'].items():
+        if rec is None:
+            continue
+        if not os.path.isfile(f):
+            return False
+        st = os.stat(f)
+        if rec['size'] != st.st_size:
+            return False
+        if rec['mtime_ns'] != st.st_mtime_ns and rec['sha1'] != hash_file(f):
+            return False
+    return True
+
+
+# Names of the data sets of the bundle whose files do not match the hashes of the manifest
+def verify_bundle(bundle_path):
+    manifest = read_manifest(bundle_path)
+    return [name for name, entry in manifest['tables'].items()
+            if not os.path.isfile(bundle_path + '/' + entry['file'])
+            or hash_file(bundle_path + '/' + entry['file']) != entry['sha1']]
+
+
+# Read the data sets of the bundle, all or the given names. Returns a dictionary of data set name
+# to data, and the manifest. With verify = True, the data set files are checked against the hashes
+# of the manifest first.
+def read_bundle(bundle_path, names=None, verify=False):
+    manifest = read_manifest(bundle_path)
+    if manifest is None:
+        raise ValueError('No input bundle at ' + bundle_path)
+    if verify:
+        bad = verify_bundle(bundle_path)
+        if len(bad) > 0:
+            raise ValueError('Input bundle data sets do not match the manifest: ' + str(bad))
+    names = list(manifest['tables'].keys()) if names is None else names
+    return {name: read_bundle_table(bundle_path, manifest, name) for name in names}, manifest
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Verify an input bundle against the hashes of its manifest')
+    parser.add_argument('bundle_path', help='folder of the bundle')
+    args = parser.parse_args()
+
+    manifest = read_manifest(args.bundle_path)
+    if manifest is None:
+        parser.error('no input bundle at ' + args.bundle_path)
+    print('Input bundle ' + manifest['version'] + ', id ' + manifest['bundle_id'])
+    bad = verify_bundle(args.bundle_path)
+    print('All data sets match the manifest' if len(bad) == 0 else 'Data sets not matching the manifest: ' + str(bad))
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright © 2025, UChicago Argonne, LLC
+The full description is available in the LICENSE file at location:
+    https://github.com/Saurajyoti/BestBiomassUse/blob/master/LICENSE
+
+@Project: Best Use of Biomass
+@Title: Year-partitioned parquet store of the temporal GREET LCI
+@Authors: Saurajyoti Kar
+@Contact: skar@anl.gov
+@Affiliation: Argonne National Laboratory
+
+"""
+
+"""
+The temporal GREET LCI correspondence file holds every GREET row for every year
+of the study period. The LCI store converts it once to a parquet dataset
+partitioned by Year, so that a model run reads only the partitions of its
+production years, and within them only the rows of the Parameter_B,
+Stream_Flow and Stream_LCA keys it uses. The store keeps the size, modification
+time and hash of the CSV file it was built from, and is rebuilt when the CSV
+file changes.
+
+The frames read from the store have the row order, index and column types of
+the CSV file read with pd.read_csv.
+
+Usage:
+    python lci_store.py CSV_FILE STORE_PATH
+
+"""
+
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from sheet_cache import hash_file
+
+# Options of pd.read_csv for the temporal LCI file
+LCI_read_kwargs = {'dtype': {8: 'str'}, 'header': 0, 'index_col': 0}
+
+LCI_key_columns = ['Parameter_B', 'Stream_Flow', 'Stream_LCA']
+
+# row position in the CSV file, to restore the row order of rows read from several partitions
+row_column = '_row'
+
+f_source = '_source.json'
+
+
+# Source file record of the store, None when there is no store
+def read_source(store_path):
+    if not os.path.isfile(store_path + '/' + f_source):
+        return None
+    with open(store_path + '/' + f_source) as fh:
+        return json.load(fh)
+
+
+# True when the store was built from the current contents of the CSV file f
+def store_is_current(f, store_path):
+    source = read_source(store_path)
+    if source is None or source['file'] != os.path.basename(f):
+        return False
+    st = os.stat(f)
+    if source['size'] == st.st_size and source['mtime_ns'] == st.st_mtime_ns:
+        return True
+    return source['size'] == st.st_size and source['sha1'] == hash_file(f)
+
+
+# Convert the CSV file f to a parquet dataset partitioned by Year under store_path
+def write_LCI_store(f, store_path, verbose=True):
+    if verbose:
+        print('LCI store: converting ' + os.path.basename(f) + ' to a year-partitioned parquet store ..')
+    st = os.stat(f)
+    df = pd.read_csv(f, **LCI_read_kwargs).drop_duplicates()
+    df['Year'] = df['Year'].astype('int64')
+    df[row_column] = np.arange(df.shape[0], dtype='int64')
+
+    # written to a temporary folder first, a store is complete once it is in place
+    tmp_path = store_path + '.tmp'
+    if os.path.isdir(tmp_path):
+        shutil.rmtree(tmp_path)
+    pq.write_to_dataset(pa.Table.from_pandas(df, preserve_index=True), tmp_path, partition_cols=['Year'])
+    source = {'file': os.path.basename(f), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha1': hash_file(f),
+              'index_name': df.index.name, 'columns': [str(c) for c in df.columns if c != row_column],
+              'dtypes': [str(df[c].dtype) for c in df.columns if c != row_column]}
+    with open(tmp_path + '/' + f_source, 'w') as fh:
+        json.dump(source, fh)
+    if os.path.isdir(store_path):
+        shutil.rmtree(store_path)
+    os.replace(tmp_path, store_path)
+
+
+# Read the LCI rows of the given years and (Parameter_B, Stream_Flow, Stream_LCA) keys from the
+# store, all years or keys when not given. Only the partitions of the years are read, and the
+# keys are filtered in the parquet read before conversion to a data frame.
+def read_LCI_store(store_path, years=None, keys=None, columns=None):
+    source = read_source(store_path)
+    filters = []
+    if years is not None:
+        filters.append(('Year', 'in', [int(y) for y in years]))
+    if keys is not None:
+        keys = keys[LCI_key_columns].drop_duplicates()
+        for colm in LCI_key_columns:
+            # parquet filters drop missing values, which pandas merges match with each other
+            if not keys[colm].isna().any() and keys.shape[0] > 0:
+                filters.append((colm, 'in', [str(v) for v in keys[colm].unique()]))
+
+    read_cols = None if columns is None else list(dict.fromkeys(list(columns) + [row_column]))
+    if years is not None and len(years) == 0:
+        df = pd.read_parquet(store_path, columns=read_cols).iloc[:0]
+    else:
+        df = pd.read_parquet(store_path, columns=read_cols, filters=filters if len(filters) > 0 else None)
+
+    # exact match of the key combinations, the parquet filters select each key column separately
+    if keys is not None:
+        match = df[LCI_key_columns].merge(keys, how='left', on=LCI_key_columns, indicator=True)
+        df = df.loc[(match['_merge'] == 'both').values, :]
+
+    df = df.sort_values(row_column, kind='stable')
+    df.index.name = source['index_name']
+
+    # partition values are read as categoricals, column types of the CSV read are restored
+    dtypes = dict(zip(source['columns'], source['dtypes']))
+    df = df[[c for c in source['columns'] if c in df.columns]]
+    for colm in df.columns:
+        if str(df[colm].dtype) != dtypes[colm]:
+            df[colm] = df[colm].astype(dtypes[colm])
+    return df
+
+
+# Read the LCI rows of the given years and keys, converting the CSV file f to the store first
+# when the store is missing or out of date
+def read_LCI(f, store_path, years=None, keys=None, columns=None, verbose=True):
+    if not store_is_current(f, store_path):
+        write_LCI_store(f, store_path, verbose)
+    return read_LCI_store(store_path, years, keys, columns)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Convert the temporal GREET LCI file to a year-partitioned parquet store')
+    parser.add_argument('f', help='temporal GREET LCI CSV file')
+    parser.add_argument('store_path', help='folder of the store')
+    args = parser.parse_args()
+
+    write_LCI_store(args.f, args.store_path)
@@ -22,14 +22,19 @@ save output files. This version of main implements itemized LCA assessment of bi
 # %%
 # Declare data input and other parameters
 
-import numbers
 from collections import Counter
-from xlwings.constants import AutoFillType
-from xlwings.constants import DeleteShiftDirection
-import xlwings as xw
-import cpi
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
 from datetime import datetime
+import hashlib
+import inspect
+import json
 import os
+import pickle
+import shutil
+import sys
+import time
 import numpy as np
 import pandas as pd
 
@@ -50,9 +55,17 @@ input_path_corr = input_path_prefix + '/correspondence_files'
 input_path_units = input_path_prefix + '/Units'
 input_path_BT16 = input_path_prefix + '/BT16'
 
-# path to the Github local repository
-os.chdir(code_path_prefix)
-from unit_conversions import model_units
+# Modules of the Github local repository are imported from code_path_prefix when it is not the
+# working folder, e.g. when cells are run from an IDE. The working folder is left unchanged.
+if os.path.isdir(code_path_prefix) and code_path_prefix not in sys.path:
+    sys.path.append(code_path_prefix)
+from unit_conversions import model_units, shared_model_units
+from stage_cache import stage_cache, hash_object, code_digest
+from sheet_cache import sheet_cache, read_workbook, stream_sheet
+from lci_store import read_LCI
+from ef_store import read_EF, read_EF_csv, ef_index
+from input_bundle import write_bundle, read_manifest, read_bundle_table, verify_bundle, sources_unchanged
+from model_profile import stage_profiler
 
 # f_model = 'MCCAM_09_11_2023_working.xlsx'
 
@@ -82,6 +95,12 @@ f_corr_itemized_LCI = 'corr_LCI_GREET_temporal_11_15_2023.csv'
 f_corr_replaced_EIA_mfsp = 'corr_replaced_mfsp.csv'
 
 f_Decarb_Model = 'US Decarbonization Model - Dashboard.xlsx'
+sheet_decarb_CI = 'EPS - CI'
+
+# Rows of the Decarb Model CIs of the decarbonized electric grid, and the columns used
+decarb_grid_CI_filters = {'Case': 'Mitigation', 'Mitigation Case': 'NREL Electric Power Decarb',
+                          'LCIA Method': 'AR4', 'timeframe_years': 100}
+decarb_grid_CI_columns = ['Year', 'Emissions Unit', 'Energy Unit', 'LCIA_estimate']
 
 f_BT16_availability = 'B2B resource availability.xlsx'
 sheet_BT16_availability = 'Sheet1'
@@ -115,6 +134,68 @@ save_interim_files = True
 # Toggle write output to the dashboard workbook
 write_to_dashboard = True
 
+# Toggle caching workbook sheets as parquet files, read instead of the workbook while it is unchanged
+use_sheet_cache = True
+sheet_cache_path = output_path_prefix + '/sheet_cache'
+
+# Toggle reading the temporal GREET LCI from a year-partitioned parquet store, built from the CSV file
+# on first use, so that only the production years and the flows of the studied pathways are read
+use_LCI_store = True
+LCI_store_path = output_path_prefix + '/LCI_store'
+
+# Toggle reading the GREET emission factors from a parquet store sorted by GREET Pathway, Formula,
+# Case and Year, built from the CSV file on first use
+use_EF_store = True
+EF_store_path = output_path_prefix + '/EF_store'
+
+# Folder caching the compiled unit conversion object and the conversion factors between all units of
+# a unit category, loaded while the unit input files are unchanged, None to construct the object
+# from the input files
+units_cache_path = output_path_prefix + '/units_cache'
+
+# Toggle reading the inputs from a versioned input bundle, written from the input files on first
+# use and written again when any of them changes. The version defaults to the time of writing.
+use_input_bundle = False
+input_bundle_path = output_path_prefix + '/input_bundle'
+input_bundle_version = None
+
+# Number of threads reading input files concurrently, 0 to read them one after the other
+input_load_workers = 4
+
+# Toggle caching stage outputs, so that stages with unchanged inputs and toggles are not recomputed on re-runs
+use_stage_cache = False
+stage_cache_path = output_path_prefix + '/stage_cache'
+
+# Toggle incremental runs, recomputing only the pathways whose Db rows changed since the last run
+use_incremental_run = False
+snapshot_path = output_path_prefix + '/last_run'
+
+# Toggle checkpointing of Stream_LCA variability runs in batches of variability points,
+# a repeated run resumes from the completed batches. Checkpoints of other inputs or toggles not
+# written to for checkpoint_retention_days are deleted once a checkpointed run completes.
+use_variability_checkpoints = False
+checkpoint_path = output_path_prefix + '/checkpoints'
+variability_batch_size = 10
+checkpoint_retention_days = 7
+
+# Number of worker processes running partitions of the pathways in parallel, 0 to run in this process
+parallel_workers = 0
+
+# Dry run: print the planned row expansion and memory of the run without running the model,
+# also switched on by running the script with --dry-run. Runs estimated above the budget are refused.
+dry_run = False
+memory_budget_GB = 16
+
+# Toggle refusing model runs estimated above the memory budget, otherwise a warning is printed
+refuse_over_budget_runs = False
+
+# Toggle profiling of model stages, also switched on by running the script with --profile
+profile_stages = False
+f_out_profile = 'stage_profile'
+
+# Run manifest, listing the input files read by the run
+f_out_manifest = 'run_manifest.csv'
+
 # Toggle scale-up analysis,
 # Only run scale-up analysis with consider_variability_study = False
 consider_scale_up_study = False # True when doing scale-up study, otherwise False
@@ -176,23 +257,249 @@ biogenic_emissions = ['Biogenic CO2',
                       'Biogenic CH4'  # biogenic CH4 are not considered to have environmental effect
                       ]
 
+# Biopower pathways
+biopower_scenarios = [
+
+    ###
+    'Baseline for Biopower, 100% coal, w/o CCS, 650 MWe',
+    'Baseline for Biopower, 100% coal, w/ CCS, 650 MWe',
+
+    'Biopower: 80% coal, w/o BECCS, 650 MWe',
+    'Biopower: 80% coal, w/ BECCS, 650 MWe',
+
+    'Biopower: 100% biomass, w/o BECCS, 130 MWe',
+    'Biopower: 100% biomass, w/ BECCS, 130 MWe',
+    ###
+    # 'Biopower: 51% coal, w/ BECCS, 650 MWe',
+    # 'Biopower: 100% biomass, w/o BECCS, 650 MWe',
+    # 'Biopower: 100% biomass, w/ BECCS, 650 MWe',
+    # 'Biopower: 51% coal, w/o BECCS, 650 MWe',
+
+]
+
+# Select pathways to consider
+pathways_to_consider = [
+
+    ###
+    '2020, 2019 SOT High Octane Gasoline from Lignocellulosic Biomass via Syngas and Methanol/Dimethyl Ether Intermediates',
+    ###
+
+    # Tan et al., 2016 pathways
+    ###
+    'Pathway 1A: Syngas to molybdenum disulfide (MoS2)-catalyzed alcohols followed by fuel production via alcohol condensation (Guerbet reaction), dehydration, oligomerization, and hydrogenation',
+    'Pathway 1B: Syngas fermentation to ethanol followed by fuel production via alcohol condensation (Guerbet reaction), dehydration, oligomerization, and hydrogenation',
+    'Pathway 2A: Syngas to rhodium (Rh)-catalyzed mixed oxygenates followed by fuel production via carbon coupling/deoxygenation (to isobutene), oligomerization, and hydrogenation',
+    'Pathway 2B: Syngas fermentation to ethanol followed by fuel production via carbon coupling/deoxygenation (to isobutene), oligomerization, and hydrogenation',
+    'Pathway FT: Syngas to liquid fuels via Fischer-Tropsch technology as a commercial benchmark for comparisons',
+    ###
+
+    # Decarb 2b pathways
+    # 'Thermochemical Research Pathway to High-Octane Gasoline Blendstock Through Methanol/Dimethyl Ether Intermediates',
+    # 'Cellulosic Ethanol',
+
+    ###
+    'Decarb 2b: Cellulosic Ethanol to renewable gasoline and jet fuels',
+    'Decarb 2b: Cellulosic Ethanol to renewable gasoline and jet fuels with CCS of fermentation offgas CO2',
+    'Decarb 2b: Cellulosic Ethanol to renewable gasoline and jet fuels with CCS of fermentation offgas and boiler vent streams CO2',
+    ###
+
+    # 'Decarb 2b: Cellulosic Ethanol to renewable gasoline and jet fuels_jet',
+    # 'Decarb 2b: Cellulosic Ethanol to renewable gasoline and jet fuels with CCS of fermentation offgas CO2_jet',
+    # 'Decarb 2b: Cellulosic Ethanol to renewable gasoline and jet fuels with CCS of fermentation offgas and boiler vent streams CO2_jet',
+
+    ###
+    'Decarb 2b: Fischer-Tropsch SPK',
+    'Decarb 2b: Fischer-Tropsch SPK with CCS of FT flue gas CO2',
+    'Decarb 2b: Fischer-Tropsch SPK with CCS of all flue gases CO2',
+    'Decarb 2b: Ex-Situ CFP',
+    'Decarb 2b: Ex-Situ CFP with CCS of all flue gases CO2',
+    ###
+
+    # 'Gasification to Methanol',
+    # 'Gasoline from upgraded bio-oil from pyrolysis'
+
+    # 2021 SOT pathways
+    ###
+    '2021 SOT: Biochemical design case, Acids pathway with burn lignin',
+    '2021 SOT: Biochemical design case, Acids pathway with convert lignin to BKA',
+    '2021 SOT: Biochemical design case, BDO pathway with burn lignin',
+    '2021 SOT: Biochemical design case, BDO pathway with convert lignin to BKA',
+    '2021 SOT: High octane gasoline from lignocellulosic biomass via syngas and methanol/dimethyl ether intermediates',
+
+    '2020 SOT: Ex-Situ CFP of lignocellulosic biomass to hydrocarbon fuels',
+
+    ###
+
+
+    # Marine pathways
+    ###
+    '2022, Marine biocrude via HTL from sludge with NH3 removal for 1000 MTPD sludge',
+    '2022, Marine biocrude via HTL from Manure with NH3 removal for 1000 MTPD Manure',
+    '2022, Partially upgraded marine fuel via HTL from sludge with NH3 removal for 1000 MTPD sludge',
+    '2022, Partially upgraded marine fuel via HTL from Manure with NH3 removal for 1000 MTPD Manure',
+    '2022, Fully upgraded marine fuel via HTL from sludge with NH3 removal for 1000 MTPD sludge',
+    '2022, Fully upgraded marine fuel via HTL from Manure with NH3 removal for 1000 MTPD Manure',
+    '2022, Marine fuel through Fast Pyrolysis of blended woody biomass',
+    '2022, Marine fuel through Catalytic Fast Pyrolysis with ZSM5 of blended woody biomass',
+    '2022, Marine fuel through Catalytic Fast Pyrolysis with Pt/TiO2 of blended woody biomass',
+    ###
+
+    # SAF, RD, RG via HTL of Sludge and Manure, and CFP of biomass (marine fuel comparison pathways)
+    ###
+    '2022 SOT: Sludge HTL to Biocrude upgraded to Hydrocarbons',
+
+    ###
+
+    # SAF, RD, RG via CFP of biomass (marine fuel comparison pathways)
+    ###
+    '2023: Catalytic Fast Pyrolysis of woody biomass to SAF, renewable diesel, and renewable gasoline, 17% oxygen content',
+    '2023: Catalytic Fast Pyrolysis of woody biomass to SAF, renewable diesel, and renewable gasoline, 20% oxygen content',
+    '2023: Catalytic Fast Pyrolysis of woody biomass to SAF, renewable diesel, and renewable gasoline, 22% oxygen content',
+    ###
+
+
+    # Biomass to Hydrogen
+    ###
+    'Biomass to Hydrogen',
+    'Biomass to Hydrogen with CCS, design case',
+    ###
+
+    # '2013 Biochemical Design Case: Corn Stover-Derived Sugars to Diesel',
+    # '2015 Biochemical Catalysis Design Report',
+    # '2018 Biochemical Design Case: BDO Pathway',
+    # '2018 Biochemical Design Case: Organic Acids Pathway',
+    # '2018, 2018 SOT High Octane Gasoline from Lignocellulosic Biomass via Syngas and Methanol/Dimethyl Ether Intermediates',
+    # '2018, 2022 projection High Octane Gasoline from Lignocellulosic Biomass via Syngas and Methanol/Dimethyl Ether Intermediates',
+
+    # '2020, 2022 projection High Octane Gasoline from Lignocellulosic Biomass via Syngas and Methanol/Dimethyl Ether Intermediates',
+    # 'Biochemical 2019 SOT: Acids Pathway (Burn Lignin Case)',
+    # 'Biochemical 2019 SOT: Acids Pathway (Convert Lignin - "Base" Case)',
+    # 'Biochemical 2019 SOT: Acids Pathway (Convert Lignin - High)',
+    # 'Biochemical 2019 SOT: BDO Pathway (Burn Lignin Case)',
+    # 'Biochemical 2019 SOT: BDO Pathway (Convert Lignin - Base)',
+    # 'Biochemical 2019 SOT: BDO Pathway (Convert Lignin - High)',
+    # 'Biomass to Gasoline and Diesel Using Integrated Hydropyrolysis and Hydroconversion',
+    # 'Corn stover ETJ',
+    # 'Dry Mill (Corn) ETJ',
+    # 'Ex Situ CFP 2022 Target Case',
+    # 'Ex-Situ CFP 2019 SOT',
+
+    ###
+    'Ex-Situ Fixed Bed 2018 SOT (0.5 wt% Pt/TiO2 Catalyst)',
+    ###
+
+    # 'Ex-Situ Fixed Bed 2022 Projection',
+    # 'In-Situ CFP 2022 Target Case',
+
+]
+pathways_to_consider = pathways_to_consider + biopower_scenarios
+
+# When studying variability of unit cost on MFSP and MAC,
+# following pathways are avoided because detailed LCI are not available yet
+cases_to_avoid = [
+    # 'Cellulosic Ethanol',
+    # 'Cellulosic Ethanol with Jet Upgrading',
+    # 'Fischer-Tropsch SPK',
+    # 'Gasification to Methanol',
+    # 'Gasoline from upgraded bio-oil from pyrolysis'
+]
+
+# Columns of the TEA database used in computation
+econ_columns = ['Case/Scenario',
+                'Parameter_A',
+                'Parameter_B',
+                'Stream_Flow',
+                'Stream_LCA',
+                'Energy_alloc_primary_fuel',
+                'Flow: Unit (numerator)',
+                'Flow: Unit (denominator)',
+                'Flow',
+                'Cost Item',
+                'Cost: Unit (numerator)',
+                'Cost: Unit (denominator)',
+                'Unit Cost',
+                'Operating Time: Unit',
+                'Operating Time',
+                'Operating Time (%)',
+                'Total Cost: Unit (numerator)',
+                'Total Cost: Unit (denominator)',
+                'Total Cost',
+                'Total Flow: Unit (numerator)',
+                'Total Flow: Unit (denominator)',
+                'Total Flow',
+                'Cost Year']
+
+# Filter relevant LCA items
+LCA_parameters = [
+    'Conversion: Input Supply Chains',
+    'Avoided Ems Credits',
+    'Conversion: Combustion Ems, Fossil',
+    'Conversion: Combustion Ems, Biogenic',
+    'Conversion: Non-Combustion Ems, Fossil',
+    'Conversion: Non-Combustion Ems, Biogenic',
+    'Coproduct Credits',
+    'Fuel Use',
+    'CCS Stream, Fossil',
+    'CCS Stream, Biogenic'
+]
+
+LCA_columns = [
+    'Case/Scenario',
+    'Parameter_A',
+    'Parameter_B',
+    'Stream_Flow',
+    'Stream_LCA',
+    'Energy_alloc_primary_fuel',
+    'Flow: Unit (numerator)',
+    'Flow: Unit (denominator)',
+    'Flow',
+    'Operating Time: Unit',
+    'Operating Time',
+    'Operating Time (%)',
+    'Total Flow: Unit (numerator)',
+    'Total Flow: Unit (denominator)',
+    'Total Flow'
+]
+
+# Map biomass types based on feedstock for the scale-up study
+map_bm_types = {
+    'Coal to Power Plants': '', 
+    'Poplar': 'Woody', 
+    'Blended woody biomass': 'Woody',
+    'Forest Residue': 'Woody', 
+    'Switchgrass': 'Herbaceous',
+    'Sludge to Biorefinery for HTL': 'Wastewater sludge',
+    'Logging Residues for CFP, 2020 SOT': 'Woody',
+    'Clean Pine for CFP, 2020 SOT': 'Woody',
+    'Manure to Biorefinery for HTL': 'Manure'
+}
+
+# columns added to the itemized tables by the variability study
+variability_columns = ['variability_id', 'col_param', 'col_val', 'param_name', 'param_min', 'param_max',
+                       'param_dist', 'dist_option', 'param_value']
+
 # %%
 # import packages
 
-# cpi.update()
-
-# Import user defined modules
-os.chdir(code_path_prefix)
+# xlwings and cpi are imported by the stages using them, so that runs without the dashboard
+# write start without loading Excel. Update the CPI data with:
+# import cpi; cpi.update()
 
 # %% Customize the Excel Instance
 
-class ExcelApp(xw.App):
-    """override xw.App default properties"""
-    calculation = 'manual'
-    display_alerts = False
-    enable_events = False
-    screen_updating = False
-    visible = False
+# Excel instance with xw.App default properties overridden
+def excel_app():
+    import xlwings as xw
+
+    class ExcelApp(xw.App):
+        """override xw.App default properties"""
+        calculation = 'manual'
+        display_alerts = False
+        enable_events = False
+        screen_updating = False
+        visible = False
+
+    return ExcelApp()
 
 # %%
 # User defined function definitions
@@ -239,7 +546,7 @@ def mult_numeric(a, b, c):
         return
 
 # Function to add header rows to LCA metric rows, select subset of LCA metrices, and calculate CO2e
-def fmt_GREET_LCI(df):
+def fmt_GREET_LCI(df, ob_units, always_calc_CO2_w_VOC_CO=True):
 
     harmonize_headers = {
 
@@ -509,9 +816,9 @@ def fmt_GREET_LCI(df):
 
     df.drop(columns=['LCA_metric_GREET'], inplace=True)
 
-    df = df.loc[~df['LCA_value'].isna(), :]
+    df = fmt_numeric(df, ['LCA_value'])
 
-    df['LCA_value'] = df['LCA_value'].astype('float')
+    df = df.loc[~df['LCA_value'].isna(), :].copy()
 
     df['LCA: Unit (denominator)'] = df['LCA: Unit (denominator)'].fillna(
         '-', inplace=False)
@@ -532,7 +839,7 @@ def fmt_GREET_LCI(df):
     if df_duplicates.shape[0] > 0:
         print("Warning: Note certain LCA metrices are duplicates. The duplicates arrise due to harmonizing LCA metrices. Duplicates with all data considered are already removed after file is read.")
         print(df_duplicates)
-    df = df.groupby(col_indices, dropna=False, sort=False).agg(
+    df = df.groupby(col_indices, dropna=False, sort=False, observed=True).agg(
         {'LCA_value': 'sum'}).reset_index()
 
     df = df.pivot(index=['Parameter_B', 'Stream_Flow', 'Stream_LCA', 'GREET1 sheet',
@@ -617,417 +924,666 @@ def ef_calc_co2e(df):
     
     return df
 
+# %%
+# Model run configuration and input data bundle
+
+class model_config:
+    """Run toggles of the model, defaulting to the declarations at the top of this script"""
+
+    def __init__(self,
+                 production_year=production_year,
+                 cost_year=cost_year,
+                 BT16_cost_year=BT16_cost_year,
+                 consider_coproduct_cost_credit=consider_coproduct_cost_credit,
+                 consider_coproduct_env_credit=consider_coproduct_env_credit,
+                 consider_variability_study=consider_variability_study,
+                 consider_which_variabilities=consider_which_variabilities,
+                 save_interim_files=save_interim_files,
+                 write_to_dashboard=write_to_dashboard,
+                 consider_scale_up_study=consider_scale_up_study,
+                 decarb_electric_grid=decarb_electric_grid,
+                 decarb_grid_scenario1=decarb_grid_scenario1,
+                 decarb_grid_scenario1_values=decarb_grid_scenario1_values,
+                 adjust_biopower_baseline=adjust_biopower_baseline,
+                 always_calc_CO2_w_VOC_CO=always_calc_CO2_w_VOC_CO,
+                 harmonize_CCS_fossil=harmonize_CCS_fossil,
+                 allocation_type=allocation_type,
+                 pathways_to_consider=pathways_to_consider,
+                 biopower_scenarios=biopower_scenarios,
+                 cases_to_avoid=cases_to_avoid,
+                 f_model=f_model,
+                 variability_batch_size=variability_batch_size,
+                 input_path_prefix=input_path_prefix,
+                 input_path_decarb_model=input_path_decarb_model,
+                 output_path_prefix=output_path_prefix):
+
+        self.production_year = list(production_year)
+        self.cost_year = cost_year
+        self.BT16_cost_year = BT16_cost_year
+        self.consider_coproduct_cost_credit = consider_coproduct_cost_credit
+        self.consider_coproduct_env_credit = consider_coproduct_env_credit
+        self.consider_variability_study = consider_variability_study
+        self.consider_which_variabilities = consider_which_variabilities
+        self.save_interim_files = save_interim_files
+        self.write_to_dashboard = write_to_dashboard
+        self.consider_scale_up_study = consider_scale_up_study
+        self.decarb_electric_grid = decarb_electric_grid
+        self.decarb_grid_scenario1 = decarb_grid_scenario1
+        self.decarb_grid_scenario1_values = list(decarb_grid_scenario1_values)
+        self.adjust_biopower_baseline = adjust_biopower_baseline
+        self.always_calc_CO2_w_VOC_CO = always_calc_CO2_w_VOC_CO
+        self.harmonize_CCS_fossil = harmonize_CCS_fossil
+        self.allocation_type = allocation_type
+        self.pathways_to_consider = list(pathways_to_consider)
+        self.biopower_scenarios = list(biopower_scenarios)
+        self.cases_to_avoid = list(cases_to_avoid)
+        self.f_model = f_model
+        self.variability_batch_size = variability_batch_size
+
+        self.input_path_prefix = input_path_prefix
+        self.input_path_decarb_model = input_path_decarb_model
+        self.output_path_prefix = output_path_prefix
+
+        self.input_path_model = input_path_prefix + '/model'
+        self.input_path_GREET = input_path_prefix + '/GREET'
+        self.input_path_EIA_price = input_path_prefix + '/EIA'
+        self.input_path_corr = input_path_prefix + '/correspondence_files'
+        self.input_path_units = input_path_prefix + '/Units'
+        self.input_path_BT16 = input_path_prefix + '/BT16'
+
+    # Returns the constructor arguments of the configuration
+    def params(self):
+        return {k: getattr(self, k) for k in inspect.signature(model_config).parameters}
+
+    # Returns a copy of the configuration with the given toggles changed
+    def copy(self, **kwargs):
+        params = self.params()
+        unknown = [k for k in kwargs if k not in params]
+        if len(unknown) > 0:
+            raise KeyError('Unknown model configuration parameters: ' + str(unknown))
+        params.update(kwargs)
+        return model_config(**params)
+
+
+class model_inputs:
+    """Data sets read from disk for model runs. Model stages do not modify them in place,
+    so one bundle can be shared by any number of runs"""
+
+    names = ['df_econ', 'pathway_names', 'EIA_price', 'ef', 'ob_units',
+             'corr_replaced_replacing_fuel', 'corr_fuel_replaced_GREET_pathway',
+             'corr_GGE_GREET_fuel_replaced', 'corr_GGE_GREET_fuel_replacing',
+             'corr_itemized_LCA', 'corr_replaced_mfsp',
+             'corr_params_variability', 'bm', 'decarb_elec_CI']
+
+    def __init__(self, df_econ, pathway_names, EIA_price, ef, ob_units,
+                 corr_replaced_replacing_fuel, corr_fuel_replaced_GREET_pathway,
+                 corr_GGE_GREET_fuel_replaced, corr_GGE_GREET_fuel_replacing,
+                 corr_itemized_LCA, corr_replaced_mfsp,
+                 corr_params_variability=None, bm=None, decarb_elec_CI=None):
+
+        self.df_econ = df_econ
+        self.pathway_names = pathway_names
+        self.EIA_price = EIA_price
+        self.ef = ef
+        self.ob_units = ob_units
+        self.corr_replaced_replacing_fuel = corr_replaced_replacing_fuel
+        self.corr_fuel_replaced_GREET_pathway = corr_fuel_replaced_GREET_pathway
+        self.corr_GGE_GREET_fuel_replaced = corr_GGE_GREET_fuel_replaced
+        self.corr_GGE_GREET_fuel_replacing = corr_GGE_GREET_fuel_replacing
+        self.corr_itemized_LCA = corr_itemized_LCA
+        self.corr_replaced_mfsp = corr_replaced_mfsp
+
+        # optional inputs, loaded only when the corresponding study is toggled
+        self.corr_params_variability = corr_params_variability
+        self.bm = bm
+        self.decarb_elec_CI = decarb_elec_CI
+
+        self._ef_index = None
+
+        # data sets read on first access, by name: (source file, function reading it)
+        self._sources = {}
+        # data sets read, in the order read
+        self._manifest = []
+
+    # Sorted key index of the emission factors, built on first use, see ef_index.lookup
+    @property
+    def ef_index(self):
+        if self._ef_index is None:
+            self._ef_index = ef_index(self.ef)
+        return self._ef_index
+
+    # Data sets registered with defer are read on first access
+    def __getattr__(self, name):
+        if not name.startswith('_') and name in vars(self).get('_sources', {}):
+            self.load([name])
+            return vars(self)[name]
+        raise AttributeError(name)
+
+    # Register a data set to be read from the source file f by read() on first access
+    def defer(self, name, f, read):
+        vars(self).pop(name, None)
+        self._sources[name] = (f, read)
+
+    # Add a data set read from the source file f in the given seconds to the run manifest
+    def record(self, name, f, seconds):
+        value = vars(self)[name]
+        shape = value.shape if isinstance(value, (pd.DataFrame, pd.Series)) else (None, None)
+        self._manifest.append({'input': name, 'file': f, 'read_s': seconds,
+                               'rows': shape[0], 'columns': shape[1] if len(shape) > 1 else 1})
+
+    # Read the data sets among names not read yet, on max_workers threads
+    def load(self, names, max_workers=0):
+        pending = [n for n in dict.fromkeys(names) if n in self._sources]
+        out = run_threads({n: partial(timed_read, self._sources[n][1]) for n in pending}, max_workers)
+        for n in pending:
+            f, _ = self._sources.pop(n)
+            setattr(self, n, out[n][0])
+            self.record(n, f, out[n][1])
+
+    # Names of the data sets not read yet
+    def deferred(self):
+        return list(self._sources.keys())
+
+    # Copy of the bundle with the given data sets replaced. Data sets not read yet are read on first
+    # access of the copy, and reads of the copy are added to the manifest of this bundle.
+    def copy(self, **values):
+        new = object.__new__(model_inputs)
+        vars(new).update(vars(self))
+        new._sources = {k: v for k, v in self._sources.items() if k not in values}
+        new._ef_index = None
+        for k, v in values.items():
+            setattr(new, k, v)
+        return new
+
+    # Table of the data sets read, with source file, read time and size
+    def manifest(self):
+        return pd.DataFrame(self._manifest, columns=['input', 'file', 'read_s', 'rows', 'columns'])
+
 
 # %%
 # Step: Load data file and select columns for computation
 
-init_time = datetime.now()
-
-df_econ = pd.read_excel(input_path_model + '/' + f_model, sheet_name=sheet_TEA, header=3, index_col=None,
-                        dtype={'Case/Scenario': str,
-                               'Parameter_A': str,
-                               'Parameter_B': str,
-                               'Stream_Flow': str,
-                               'Stream_LCA': str,
-                               'Energy_alloc_primary_fuel': str,
-                               'Flow: Unit (numerator)': str,
-                               'Flow: Unit (denominator)': str,
-                               'Flow': float,
-                               'Cost Item': str,
-                               'Cost: Unit (numerator)': str,
-                               'Cost: Unit (denominator)': str,
-                               'Unit Cost': float,
-                               'Operating Time: Unit': str,
-                               'Operating Time': float,
-                               'Operating Time (%)': float,
-                               'Total Cost: Unit (numerator)': str,
-                               'Total Cost: Unit (denominator)': str,
-                               'Total Cost': float,
-                               'Total Flow: Unit (numerator)': str,
-                               'Total Flow: Unit (denominator)': str,
-                               'Total Flow': float,
-                               'Cost Year': float},
-                        na_values=['-'])
-
-pathway_names = pd.read_excel(
-    input_path_model + '/' + f_model, sheet_name=sheet_name_lists, header=3, usecols='B:H')
-
-df_econ = df_econ[['Case/Scenario',
-                   'Parameter_A',
-                   'Parameter_B',
-                   'Stream_Flow',
-                   'Stream_LCA',
-                   'Energy_alloc_primary_fuel',
-                   'Flow: Unit (numerator)',
-                   'Flow: Unit (denominator)',
-                   'Flow',
-                   'Cost Item',
-                   'Cost: Unit (numerator)',
-                   'Cost: Unit (denominator)',
-                   'Unit Cost',
-                   'Operating Time: Unit',
-                   'Operating Time',
-                   'Operating Time (%)',
-                   'Total Cost: Unit (numerator)',
-                   'Total Cost: Unit (denominator)',
-                   'Total Cost',
-                   'Total Flow: Unit (numerator)',
-                   'Total Flow: Unit (denominator)',
-                   'Total Flow',
-                   'Cost Year']]
+# Types of the Db sheet columns
+db_dtypes = {
+    'Case/Scenario': str,
+    'Parameter_A': str,
+    'Parameter_B': str,
+    'Stream_Flow': str,
+    'Stream_LCA': str,
+    'Energy_alloc_primary_fuel': str,
+    'Flow: Unit (numerator)': str,
+    'Flow: Unit (denominator)': str,
+    'Flow': float,
+    'Cost Item': str,
+    'Cost: Unit (numerator)': str,
+    'Cost: Unit (denominator)': str,
+    'Unit Cost': float,
+    'Operating Time: Unit': str,
+    'Operating Time': float,
+    'Operating Time (%)': float,
+    'Total Cost: Unit (numerator)': str,
+    'Total Cost: Unit (denominator)': str,
+    'Total Cost': float,
+    'Total Flow: Unit (numerator)': str,
+    'Total Flow: Unit (denominator)': str,
+    'Total Flow': float,
+    'Cost Year': float
+}
 
-# Biopower pathways
-biopower_scenarios = [
+# Options of pd.read_excel for the sheets of the model workbook
+model_sheet_kwargs = {
+    sheet_TEA: {'header': 3, 'index_col': None, 'usecols': econ_columns, 'dtype': db_dtypes, 'na_values': ['-']},
+    sheet_name_lists: {'header': 3, 'usecols': 'B:H'},
+    sheet_param_variability: {'header': 3, 'index_col': None, 'usecols': 'A:G'},
+}
 
-    ###
-    'Baseline for Biopower, 100% coal, w/o CCS, 650 MWe',
-    'Baseline for Biopower, 100% coal, w/ CCS, 650 MWe',
 
-    'Biopower: 80% coal, w/o BECCS, 650 MWe',
-    'Biopower: 80% coal, w/ BECCS, 650 MWe',
+# Read the given sheets of the model workbook in one pass over the workbook, through the sheet cache
+# when one is given. Returns a dictionary of sheet name to data frame. Only the econ_columns, or the
+# given columns, of the Db sheet are parsed, and only the rows of the given pathways are returned.
+def read_model_sheets(config, sheet_names, cache=None, pathways=None, columns=None):
+    f = config.input_path_model + '/' + config.f_model
+    sheets = {sheet_name: model_sheet_kwargs[sheet_name] for sheet_name in sheet_names}
+    select = {sheet_TEA: {'columns': econ_columns if columns is None else columns,
+                          'isin': None if pathways is None else ('Case/Scenario', list(pathways))}}
+    return read_workbook(f, sheets, select=select) if cache is None else cache.read_sheets(f, sheets, select)
 
-    'Biopower: 100% biomass, w/o BECCS, 130 MWe',
-    'Biopower: 100% biomass, w/ BECCS, 130 MWe',
-    ###
-    # 'Biopower: 51% coal, w/ BECCS, 650 MWe',
-    # 'Biopower: 100% biomass, w/o BECCS, 650 MWe',
-    # 'Biopower: 100% biomass, w/ BECCS, 650 MWe',
-    # 'Biopower: 51% coal, w/o BECCS, 650 MWe',
 
-]
+# Read the Db sheet of the model workbook, for the given pathways and columns when given
+def read_db(config, cache=None, pathways=None, columns=None):
+    return read_model_sheets(config, [sheet_TEA], cache, pathways, columns)[sheet_TEA]
 
-# Select pathways to consider
-pathways_to_consider = [
 
-    ###
-    '2020, 2019 SOT High Octane Gasoline from Lignocellulosic Biomass via Syngas and Methanol/Dimethyl Ether Intermediates',
-    ###
+# Read the variability parameters sheet of the model workbook
+def read_var_p(config, cache=None):
+    return read_model_sheets(config, [sheet_param_variability], cache)[sheet_param_variability]
 
-    # Tan et al., 2016 pathways
-    ###
-    'Pathway 1A: Syngas to molybdenum disulfide (MoS2)-catalyzed alcohols followed by fuel production via alcohol condensation (Guerbet reaction), dehydration, oligomerization, and hydrogenation',
-    'Pathway 1B: Syngas fermentation to ethanol followed by fuel production via alcohol condensation (Guerbet reaction), dehydration, oligomerization, and hydrogenation',
-    'Pathway 2A: Syngas to rhodium (Rh)-catalyzed mixed oxygenates followed by fuel production via carbon coupling/deoxygenation (to isobutene), oligomerization, and hydrogenation',
-    'Pathway 2B: Syngas fermentation to ethanol followed by fuel production via carbon coupling/deoxygenation (to isobutene), oligomerization, and hydrogenation',
-    'Pathway FT: Syngas to liquid fuels via Fischer-Tropsch technology as a commercial benchmark for comparisons',
-    ###
 
-    # Decarb 2b pathways
-    # 'Thermochemical Research Pathway to High-Octane Gasoline Blendstock Through Methanol/Dimethyl Ether Intermediates',
-    # 'Cellulosic Ethanol',
+# Read the BT16 biomass availability data
+def read_BT16_availability(config, cache=None):
+    return read_excel(config.input_path_BT16 + '/' + f_BT16_availability,
+                      sheet_BT16_availability, cache,
+                      header=17, index_col=None,
+                      usecols="C:K")
 
-    ###
-    'Decarb 2b: Cellulosic Ethanol to renewable gasoline and jet fuels',
-    'Decarb 2b: Cellulosic Ethanol to renewable gasoline and jet fuels with CCS of fermentation offgas CO2',
-    'Decarb 2b: Cellulosic Ethanol to renewable gasoline and jet fuels with CCS of fermentation offgas and boiler vent streams CO2',
-    ###
 
-    # 'Decarb 2b: Cellulosic Ethanol to renewable gasoline and jet fuels_jet',
-    # 'Decarb 2b: Cellulosic Ethanol to renewable gasoline and jet fuels with CCS of fermentation offgas CO2_jet',
-    # 'Decarb 2b: Cellulosic Ethanol to renewable gasoline and jet fuels with CCS of fermentation offgas and boiler vent streams CO2_jet',
+# Read the electric grid CI rows of the Decarb Model 'EPS - CI' sheet. The sheet is streamed and
+# filtered while parsed, through the sheet cache when one is given, which keeps the filtered rows.
+def read_decarb_elec_CI(config, cache=None):
+    f = config.input_path_decarb_model + '/' + f_Decarb_Model
+    columns = list(decarb_grid_CI_filters) + decarb_grid_CI_columns
+    if cache is None:
+        return stream_sheet(f, sheet_decarb_CI, 3, decarb_grid_CI_filters, columns)
+    return cache.read_filtered(f, sheet_decarb_CI, 3, decarb_grid_CI_filters, columns)
 
-    ###
-    'Decarb 2b: Fischer-Tropsch SPK',
-    'Decarb 2b: Fischer-Tropsch SPK with CCS of FT flue gas CO2',
-    'Decarb 2b: Fischer-Tropsch SPK with CCS of all flue gases CO2',
-    'Decarb 2b: Ex-Situ CFP',
-    'Decarb 2b: Ex-Situ CFP with CCS of all flue gases CO2',
-    ###
 
-    # 'Gasification to Methanol',
-    # 'Gasoline from upgraded bio-oil from pyrolysis'
+# Read a workbook sheet, through the sheet cache when one is given
+def read_excel(f, sheet_name, cache=None, **read_kwargs):
+    if cache is None:
+        return read_workbook(f, {sheet_name: read_kwargs})[sheet_name]
+    return cache.read_excel(f, sheet_name, **read_kwargs)
 
-    # 2021 SOT pathways
-    ###
-    '2021 SOT: Biochemical design case, Acids pathway with burn lignin',
-    '2021 SOT: Biochemical design case, Acids pathway with convert lignin to BKA',
-    '2021 SOT: Biochemical design case, BDO pathway with burn lignin',
-    '2021 SOT: Biochemical design case, BDO pathway with convert lignin to BKA',
-    '2021 SOT: High octane gasoline from lignocellulosic biomass via syngas and methanol/dimethyl ether intermediates',
 
-    '2020 SOT: Ex-Situ CFP of lignocellulosic biomass to hydrocarbon fuels',
+# Run the given functions without arguments on a pool of max_workers threads, or one after the other
+# in this thread when max_workers is 0. Returns a dictionary of their outputs by the keys of tasks.
+def run_threads(tasks, max_workers):
+    if max_workers == 0:
+        return {k: task() for k, task in tasks.items()}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {k: executor.submit(task) for k, task in tasks.items()}
+        return {k: f.result() for k, f in futures.items()}
 
-    ###
 
+# Run read() and return its output along with the seconds taken
+def timed_read(read):
+    time_0 = time.perf_counter()
+    out = read()
+    return out, time.perf_counter() - time_0
 
-    # Marine pathways
-    ###
-    '2022, Marine biocrude via HTL from sludge with NH3 removal for 1000 MTPD sludge',
-    '2022, Marine biocrude via HTL from Manure with NH3 removal for 1000 MTPD Manure',
-    '2022, Partially upgraded marine fuel via HTL from sludge with NH3 removal for 1000 MTPD sludge',
-    '2022, Partially upgraded marine fuel via HTL from Manure with NH3 removal for 1000 MTPD Manure',
-    '2022, Fully upgraded marine fuel via HTL from sludge with NH3 removal for 1000 MTPD sludge',
-    '2022, Fully upgraded marine fuel via HTL from Manure with NH3 removal for 1000 MTPD Manure',
-    '2022, Marine fuel through Fast Pyrolysis of blended woody biomass',
-    '2022, Marine fuel through Catalytic Fast Pyrolysis with ZSM5 of blended woody biomass',
-    '2022, Marine fuel through Catalytic Fast Pyrolysis with Pt/TiO2 of blended woody biomass',
-    ###
 
-    # SAF, RD, RG via HTL of Sludge and Manure, and CFP of biomass (marine fuel comparison pathways)
-    ###
-    '2022 SOT: Sludge HTL to Biocrude upgraded to Hydrocarbons',
+# Keys of the LCI rows used by the flows of the given Db rows and by the replaced fuels
+def LCI_keys_used(df_econ, corr_fuel_replaced_GREET_pathway):
+    keys = ['Parameter_B', 'Stream_Flow', 'Stream_LCA']
+    return pd.concat([df_econ[keys], corr_fuel_replaced_GREET_pathway[keys]]).drop_duplicates()
 
-    ###
 
-    # SAF, RD, RG via CFP of biomass (marine fuel comparison pathways)
-    ###
-    '2023: Catalytic Fast Pyrolysis of woody biomass to SAF, renewable diesel, and renewable gasoline, 17% oxygen content',
-    '2023: Catalytic Fast Pyrolysis of woody biomass to SAF, renewable diesel, and renewable gasoline, 20% oxygen content',
-    '2023: Catalytic Fast Pyrolysis of woody biomass to SAF, renewable diesel, and renewable gasoline, 22% oxygen content',
-    ###
+# Production years of a configuration
+def production_years(config):
+    return list(range(config.production_year[0], config.production_year[-1] + 1))
 
 
-    # Biomass to Hydrogen
-    ###
-    'Biomass to Hydrogen',
-    'Biomass to Hydrogen with CCS, design case',
-    ###
+# Inputs read only when a study is toggled, by the toggle of the study. Inputs listed with None
+# are not used by the model stages, and inputs not listed are used by every run.
+optional_inputs = {
+    'corr_params_variability': 'consider_variability_study',
+    'bm': 'consider_scale_up_study',
+    'decarb_elec_CI': 'decarb_electric_grid',
+    'ef': None,
+    'corr_GGE_GREET_fuel_replacing': None,
+}
 
-    # '2013 Biochemical Design Case: Corn Stover-Derived Sugars to Diesel',
-    # '2015 Biochemical Catalysis Design Report',
-    # '2018 Biochemical Design Case: BDO Pathway',
-    # '2018 Biochemical Design Case: Organic Acids Pathway',
-    # '2018, 2018 SOT High Octane Gasoline from Lignocellulosic Biomass via Syngas and Methanol/Dimethyl Ether Intermediates',
-    # '2018, 2022 projection High Octane Gasoline from Lignocellulosic Biomass via Syngas and Methanol/Dimethyl Ether Intermediates',
 
-    # '2020, 2022 projection High Octane Gasoline from Lignocellulosic Biomass via Syngas and Methanol/Dimethyl Ether Intermediates',
-    # 'Biochemical 2019 SOT: Acids Pathway (Burn Lignin Case)',
-    # 'Biochemical 2019 SOT: Acids Pathway (Convert Lignin - "Base" Case)',
-    # 'Biochemical 2019 SOT: Acids Pathway (Convert Lignin - High)',
-    # 'Biochemical 2019 SOT: BDO Pathway (Burn Lignin Case)',
-    # 'Biochemical 2019 SOT: BDO Pathway (Convert Lignin - Base)',
-    # 'Biochemical 2019 SOT: BDO Pathway (Convert Lignin - High)',
-    # 'Biomass to Gasoline and Diesel Using Integrated Hydropyrolysis and Hydroconversion',
-    # 'Corn stover ETJ',
-    # 'Dry Mill (Corn) ETJ',
-    # 'Ex Situ CFP 2022 Target Case',
-    # 'Ex-Situ CFP 2019 SOT',
+# True when the model run of the configuration uses the input
+def input_needed(config, name):
+    if name not in optional_inputs:
+        return True
+    return optional_inputs[name] is not None and bool(getattr(config, optional_inputs[name]))
 
-    ###
-    'Ex-Situ Fixed Bed 2018 SOT (0.5 wt% Pt/TiO2 Catalyst)',
-    ###
 
-    # 'Ex-Situ Fixed Bed 2022 Projection',
-    # 'In-Situ CFP 2022 Target Case',
+# Names of the inputs used by the model run of the configuration
+def needed_inputs(config):
+    return [n for n in model_inputs.names if input_needed(config, n)]
 
-]
-pathways_to_consider = pathways_to_consider + biopower_scenarios
 
-df_econ = df_econ.loc[df_econ['Case/Scenario'].isin(
-    pathways_to_consider)].reset_index(drop=True)
+# Source file and read function of every input read after the Db sheet, by input name.
+# LCI_keys select the LCI rows read from the LCI store. When a units cache path is given, the unit
+# conversion object is loaded from the compiled object cached there.
+def input_registry(config, cache=None, LCI_store_path=None, EF_store_path=None, LCI_keys=None, units_cache_path=None):
 
-# When studying variability of unit cost on MFSP and MAC,
-# following pathways are avoided because detailed LCI are not available yet
-cases_to_avoid = [
-    # 'Cellulosic Ethanol',
-    # 'Cellulosic Ethanol with Jet Upgrading',
-    # 'Fischer-Tropsch SPK',
-    # 'Gasification to Methanol',
-    # 'Gasoline from upgraded bio-oil from pyrolysis'
-]
+    def corr(f, **read_kwargs):
+        return config.input_path_corr + '/' + f, partial(pd.read_csv, config.input_path_corr + '/' + f, **read_kwargs)
+
+    f_LCI = config.input_path_corr + '/' + f_corr_itemized_LCI
+    if LCI_store_path is None:
+        read_LCI_task = partial(pd.read_csv, f_LCI, dtype={8: 'str'}, header=0, index_col=0)
+    else:
+        read_LCI_task = partial(read_LCI, f_LCI, LCI_store_path, production_years(config), LCI_keys)
+
+    f_ef = config.input_path_GREET + '/' + f_GREET_efs
+    f_decarb = config.input_path_decarb_model + '/' + f_Decarb_Model
+
+    return {
+        'EIA_price': (config.input_path_EIA_price + '/' + f_EIA_price,
+                      partial(pd.read_csv, config.input_path_EIA_price + '/' + f_EIA_price, index_col=None)),
+        'ef': (f_ef, partial(read_EF_csv, f_ef) if EF_store_path is None else partial(read_EF, f_ef, EF_store_path)),
+        # Unit conversion class object
+        'ob_units': (config.input_path_units,
+                     partial(shared_model_units, config.input_path_units, config.input_path_GREET, config.input_path_corr,
+                             units_cache_path)),
+        # correspondence files
+        'corr_replaced_replacing_fuel': corr(f_corr_replaced_replacing_fuel, header=3, index_col=None),
+        'corr_GGE_GREET_fuel_replaced': corr(f_corr_GGE_GREET_fuel_replaced, header=3, index_col=None),
+        'corr_GGE_GREET_fuel_replacing': corr(f_corr_GGE_GREET_fuel_replacing, header=3, index_col=None),
+        'corr_itemized_LCA': (f_LCI, partial(drop_duplicate_rows, read_LCI_task)),
+        'corr_replaced_mfsp': corr(f_corr_replaced_EIA_mfsp, header=3, index_col=None),
+        # optional inputs
+        'corr_params_variability': (config.input_path_model + '/' + config.f_model, partial(read_var_p, config, cache)),
+        'bm': (config.input_path_BT16 + '/' + f_BT16_availability, partial(read_BT16_availability, config, cache)),
+        'decarb_elec_CI': (f_decarb, partial(read_decarb_elec_CI, config, cache)),
+    }
+
+
+# Output of read() with duplicate rows dropped
+def drop_duplicate_rows(read):
+    return read().drop_duplicates()
+
+
+# Function to read the input files of a model run. Inputs used by the run of the configuration are
+# read here, the others are read on first access of the input bundle, see optional_inputs. With
+# load_optional = True all inputs are read here. The run manifest of the bundle lists the inputs read.
+# Workbook sheets are read through the sheet cache when one is given. The sheets of the model
+# workbook are parsed in one pass, and independent files are read concurrently on max_workers threads.
+# Only the Db rows of config.pathways_to_consider are read. When an LCI store path is given, only
+# the LCI rows of the production years and of the flows of these pathways are read, from the store.
+# When an EF store path is given, the GREET emission factors are read from the store, and when a
+# units cache path is given, the unit conversion object is loaded from its compiled cache.
+def load_inputs(config, load_optional=False, cache=None, max_workers=None, LCI_store_path=None, EF_store_path=None,
+                units_cache_path=None):
+
+    if max_workers is None:
+        max_workers = input_load_workers
+
+    model_sheets = [sheet_TEA, sheet_name_lists]
+    if config.consider_variability_study or load_optional:
+        model_sheets.append(sheet_param_variability)
+
+    f_model_path = config.input_path_model + '/' + config.f_model
+    f_replaced_GREET = config.input_path_corr + '/' + f_corr_fuel_replaced_GREET_pathway
+
+    # the Db rows select the LCI rows read from the store, and are read first
+    first = run_threads({
+        'model_sheets': partial(timed_read, partial(read_model_sheets, config, model_sheets, cache, config.pathways_to_consider)),
+        'corr_fuel_replaced_GREET_pathway': partial(timed_read, partial(pd.read_csv, f_replaced_GREET, header=3, index_col=None)),
+    }, max_workers if LCI_store_path is None else 0)
+
+    sheets, sheets_s = first['model_sheets']
+    corr_fuel_replaced_GREET_pathway, corr_s = first['corr_fuel_replaced_GREET_pathway']
+
+    values = {n: None for n in model_inputs.names}
+    values.update(df_econ=sheets[sheet_TEA], pathway_names=sheets[sheet_name_lists],
+                  corr_fuel_replaced_GREET_pathway=corr_fuel_replaced_GREET_pathway,
+                  corr_params_variability=sheets.get(sheet_param_variability))
+    inputs = model_inputs(**values)
+    for n in ['df_econ', 'pathway_names'] + ([] if sheet_param_variability not in sheets else ['corr_params_variability']):
+        inputs.record(n, f_model_path, sheets_s)
+    inputs.record('corr_fuel_replaced_GREET_pathway', f_replaced_GREET, corr_s)
+
+    LCI_keys = None if LCI_store_path is None else LCI_keys_used(sheets[sheet_TEA], corr_fuel_replaced_GREET_pathway)
+    registry = input_registry(config, cache, LCI_store_path, EF_store_path, LCI_keys, units_cache_path)
+    for n, (f, read) in registry.items():
+        if vars(inputs).get(n) is None:
+            inputs.defer(n, f, read)
+
+    inputs.load([n for n in registry if load_optional or input_needed(config, n)], max_workers)
+    return inputs
+
+
+# Pathways and production years the inputs of a configuration are read for, production years
+# only matter when the LCI rows are read from the LCI store
+def input_selection(config, LCI_store_path=None):
+    return {'f_model': config.f_model, 'pathways_to_consider': sorted(config.pathways_to_consider),
+            'production_years': None if LCI_store_path is None else production_years(config)}
+
+
+# Function to write the inputs read into the bundle to an input bundle at bundle_path. Inputs
+# not read yet are left out, and are read from their files when a run of the bundle uses them.
+def bundle_inputs(config, inputs, bundle_path, LCI_store_path=None, version=None):
+    values = {n: vars(inputs)[n] for n in model_inputs.names if vars(inputs).get(n) is not None}
+    sources = inputs.manifest()['file'].tolist()
+    # the unit conversion object is built from files of several folders
+    if 'ob_units' in values:
+        sources += values['ob_units'].source_files()
+    return write_bundle(values, sources, input_selection(config, LCI_store_path), bundle_path, version)
+
+
+# True when the input bundle at bundle_path was read from the current input files, for all the
+# pathways and production years of the configuration
+def bundle_is_current(config, bundle_path, LCI_store_path=None):
+    manifest = read_manifest(bundle_path)
+    if manifest is None:
+        return False
+    bundled = manifest['selection']
+    selection = input_selection(config, LCI_store_path)
+    if bundled['f_model'] != selection['f_model'] or \
+            not set(selection['pathways_to_consider']) <= set(bundled['pathways_to_consider']):
+        return False
+    if (bundled['production_years'] is None) != (selection['production_years'] is None):
+        return False
+    if selection['production_years'] is not None and \
+            not set(selection['production_years']) <= set(bundled['production_years']):
+        return False
+    return sources_unchanged(manifest)
+
+
+# Function to read the inputs of a model run from the input bundle at bundle_path, with the files
+# of the bundle memory-mapped. Inputs used by the run but not in the bundle are read from their
+# files, and the others on first access, as in load_inputs. With verify = True, the bundle files
+# are checked against the hashes of the manifest first.
+def load_bundled_inputs(config, bundle_path, cache=None, LCI_store_path=None, EF_store_path=None, verify=False,
+                        units_cache_path=None):
+
+    manifest = read_manifest(bundle_path)
+    if verify:
+        bad = verify_bundle(bundle_path)
+        if len(bad) > 0:
+            raise ValueError('Input bundle data sets do not match the manifest: ' + str(bad))
+
+    print('Reading inputs from bundle ' + manifest['version'] + ' ..')
+    values = {n: timed_read(partial(read_bundle_table, bundle_path, manifest, n)) for n in manifest['tables']}
+    inputs = model_inputs(**{n: values[n][0] if n in values else None for n in model_inputs.names})
+    for n in values:
+        inputs.record(n, bundle_path + '/' + manifest['tables'][n]['file'], values[n][1])
+
+    LCI_keys = None if LCI_store_path is None else LCI_keys_used(inputs.df_econ, inputs.corr_fuel_replaced_GREET_pathway)
+    for n, (f, read) in input_registry(config, cache, LCI_store_path, EF_store_path, LCI_keys, units_cache_path).items():
+        if n not in values:
+            inputs.defer(n, f, read)
+
+    inputs.load(needed_inputs(config))
+    return inputs
+
+
+# Values of numeric input columns that stand for no value
+na_sentinels = ['-', '']
+
+
+# Function to convert numeric input columns to float64, with the sentinel values replaced by NaN,
+# so that later stages run on numeric arrays only
+def fmt_numeric(df, columns):
+    for colm in columns:
+        if df[colm].dtype != 'float64':
+            df[colm] = pd.to_numeric(df[colm].where(~df[colm].isin(na_sentinels)), errors='raise').astype('float64')
+    return df
+
+
+# Function to select the pathways studied in the run, with typed numeric columns
+def select_pathways(config, df_econ):
+
+    df_econ = df_econ.loc[df_econ['Case/Scenario'].isin(
+        config.pathways_to_consider)].reset_index(drop=True)
+
+    df_econ = fmt_numeric(df_econ, [colm for colm, dt in db_dtypes.items() if dt is float])
+
+    # Exclude cases to avoid if performing variability analysis
+    if config.consider_variability_study:
+        df_econ = df_econ.loc[~df_econ['Case/Scenario']
+                              .isin(config.cases_to_avoid)].reset_index(drop=True)
 
-# Exclude cases to avoid if performing variability analysis
-if consider_variability_study:
-    df_econ = df_econ.loc[~df_econ['Case/Scenario']
-                          .isin(cases_to_avoid)].reset_index(drop=True)
+    df_econ.loc[df_econ['Stream_Flow'].isna(), 'Stream_Flow'] = ''
 
-EIA_price = pd.read_csv(input_path_EIA_price + '/' +
-                        f_EIA_price, index_col=None)
+    return df_econ
 
-ef = pd.read_csv(input_path_GREET + '/' + f_GREET_efs,
-                 header=3, index_col=None).drop_duplicates()
 
-# Unit conversion class object
-ob_units = model_units(input_path_units, input_path_GREET, input_path_corr)
+# String dimension columns repeated on every row of the itemized tables, encoded as categoricals
+# from the start of a run to its outputs
+dimension_columns = ['Case/Scenario', 'Parameter_A', 'Parameter_B', 'Stream_Flow', 'Stream_LCA',
+                     'Cost Item', 'Energy_alloc_primary_fuel']
 
-# load correspondence files
-corr_replaced_replacing_fuel = pd.read_csv(
-    input_path_corr + '/' + f_corr_replaced_replacing_fuel, header=3, index_col=None)
-corr_fuel_replaced_GREET_pathway = pd.read_csv(
-    input_path_corr + '/' + f_corr_fuel_replaced_GREET_pathway, header=3, index_col=None)
-# corr_fuel_replacing_GREET_pathway = pd.read_csv(input_path_corr + '/' + f_corr_fuel_replacing_GREET_pathway, header=3, index_col=None)
-corr_GGE_GREET_fuel_replaced = pd.read_csv(
-    input_path_corr + '/' + f_corr_GGE_GREET_fuel_replaced, header=3, index_col=None)
-corr_GGE_GREET_fuel_replacing = pd.read_csv(
-    input_path_corr + '/' + f_corr_GGE_GREET_fuel_replacing, header=3, index_col=None)
 
-corr_itemized_LCA = pd.read_csv(
-    input_path_corr + '/' + f_corr_itemized_LCI, dtype={8: 'str'}, header=0, index_col=0)
-corr_itemized_LCA.drop_duplicates(inplace=True)
+# Function to encode the dimension columns of the given frames as categoricals. A column shares one
+# sorted set of categories across the frames, so that merges run on the integer codes, and sorts and
+# groupbys give the order of the strings.
+def encode_dimensions(*frames):
+    frames = [df.copy() for df in frames]
+    for colm in dimension_columns:
+        values = [df[colm] for df in frames if colm in df.columns]
+        if len(values) == 0:
+            continue
+        categories = pd.Index(pd.concat([v.astype(object) for v in values]).dropna().unique()).sort_values()
+        for df in frames:
+            if colm in df.columns:
+                df[colm] = pd.Categorical(df[colm].astype(object), categories=categories)
+    return tuple(frames)
 
-corr_replaced_mfsp = pd.read_csv(
-    input_path_corr + '/' + f_corr_replaced_EIA_mfsp, header=3, index_col=None)
 
-if consider_variability_study:
-    corr_params_variability = pd.read_excel(input_path_model + '/' + f_model,
-                                            sheet_name=sheet_param_variability,
-                                            header=3, index_col=None,
-                                            usecols="A:G")
+# Function to decode categorical columns to strings, for the outputs of a run. Dimension columns
+# turned to objects by concatenating categoricals with other values are typed as strings again.
+def decode_dimensions(df):
+    if df is None:
+        return df
+    cat_cols = [colm for colm in df.columns if isinstance(df[colm].dtype, pd.CategoricalDtype)]
+    obj_cols = [colm for colm in dimension_columns if colm in df.columns and df[colm].dtype == object]
+    if len(cat_cols) + len(obj_cols) > 0:
+        df = df.copy()
+        for colm in cat_cols:
+            df[colm] = df[colm].astype(df[colm].cat.categories.dtype)
+        for colm in obj_cols:
+            df[colm] = df[colm].infer_objects()
+    return df
+
 
 # %%
 
 # Step: Create Cost Item table
 
-df_econ.loc[df_econ['Stream_Flow'].isna(), 'Stream_Flow'] = ''
+def build_cost_items(df_econ):
 
-# Subset cost items to use for itemized MFSP calculation
-cost_items = df_econ.loc[df_econ['Parameter_B'].isin([
-    'Conversion: Input Supply Chains',
-    'Coproduct Credits',
-    'Avoided Ems Credits',
+    # Subset cost items to use for itemized MFSP calculation
+    cost_items = df_econ.loc[df_econ['Parameter_B'].isin([
+        'Conversion: Input Supply Chains',
+        'Coproduct Credits',
+        'Avoided Ems Credits',
+
+        'Fuel Use',  # Co-produced fuels marked as Fuel Use are used to calculate displacement credit in Hybrid approach
 
-    'Fuel Use',  # Co-produced fuels marked as Fuel Use are used to calculate displacement credit in Hybrid approach
+        'Fixed Costs',
+        'Capital Depreciation',
+        'Average Income Tax',
+        'Average Return on Investment',
 
-    'Fixed Costs',
-    'Capital Depreciation',
-    'Average Income Tax',
-    'Average Return on Investment',
+        'Cost by process steps']), :].copy()
 
-    'Cost by process steps']), :].copy()
+    # Check if cost_items have duplicates
+    tmpdf = cost_items.duplicated()
+    if sum(tmpdf):
+        print("Warning: Following duplicate rows in cost_items table. Investigate the cause of duplication ..")
+        tmpdf = cost_items[tmpdf]
+        print(tmpdf)
 
-# Check if cost_items have duplicates
-tmpdf = cost_items.duplicated()
-if sum(tmpdf):
-    print("Warning: Following duplicate rows in cost_items table. Investigate the cause of duplication ..")
-    tmpdf = cost_items[tmpdf]
-    print(tmpdf)
+        # Validated duplicates
+        # Natural gas for '2021 SOT BDO and Acids pathways'
+
+    return cost_items
 
-    # Validated duplicates
-    # Natural gas for '2021 SOT BDO and Acids pathways'
 
 # %%
 
 # Step: Create Biofuel Yield table
 
-# Separate biofuel yield flows
-biofuel_yield = df_econ.loc[df_econ['Parameter_B'] == 'Fuel Use',
-                            ['Case/Scenario', 'Stream_LCA', 'Total Flow: Unit (numerator)',
-                             'Total Flow: Unit (denominator)', 'Total Flow', 'Energy_alloc_primary_fuel']].reset_index(drop=True).copy()
-biofuel_yield.rename(columns={'Stream_LCA': 'Biofuel Stream_LCA',
-                              'Total Flow: Unit (numerator)': 'Biofuel Flow: Unit (numerator)',
-                              'Total Flow: Unit (denominator)': 'Biofuel Flow: Unit (denominator)',
-                              'Total Flow': 'Biofuel Flow'}, inplace=True)
-
-biofuel_yield_primary_out = biofuel_yield.loc[biofuel_yield['Energy_alloc_primary_fuel'].isin(['Y']), : ].reset_index(drop=True)
-
-# If energy allocation is to be implemented, filter by primary fuel flag
-# Pathway allocation is helpful for assessing CI of the production pathway
-
-if allocation_type == 'Pathway':  # to be checked, may not be required as it is similar to energy allocation
-    # For co-produced fuels, summarize the flow data to net hydrocarbon flow
-    biofuel_yield2 = biofuel_yield.groupby(['Case/Scenario', 'Biofuel Flow: Unit (numerator)',
-                                            'Biofuel Flow: Unit (denominator)']).agg({'Biofuel Flow': 'sum'}).reset_index()
-    biofuel_yield2['biofuel_yield_energy_alloc'] = 1
-
-elif allocation_type == 'Energy':  # to be checked
-    # For co-produced fuels, summarize the flow data to net hydrocarbon flow
-    biofuel_yield2 = biofuel_yield.groupby(['Case/Scenario', 'Biofuel Flow: Unit (numerator)',
-                                            'Biofuel Flow: Unit (denominator)']).agg({'Biofuel Flow': 'sum'}).reset_index()
-    biofuel_yield2['biofuel_yield_energy_alloc'] = 1
-
-elif allocation_type == 'Hybrid':
-    # Calculate energy allocation fraction per 'Fuel Use' product
-    biofuel_yield['biofuel_yield_energy_alloc'] = biofuel_yield['Biofuel Flow']/biofuel_yield.groupby(['Case/Scenario', 'Biofuel Flow: Unit (numerator)',
-                                                                                                       'Biofuel Flow: Unit (denominator)'])['Biofuel Flow'].transform('sum')
-
-    # filter and select primary fuel
-    biofuel_yield2 = biofuel_yield.loc[biofuel_yield['Energy_alloc_primary_fuel'].isin([
-                                                                                       'Y']), :]
-    # If two 'Fuel Use' are identified as primary product, they are aggregrated at this stage
-    biofuel_yield2 = biofuel_yield2.groupby(['Case/Scenario', 'Biofuel Flow: Unit (numerator)',
-                                          'Biofuel Flow: Unit (denominator)']).agg({'Biofuel Flow': 'sum',
-                                                                                       'biofuel_yield_energy_alloc': 'sum'}).reset_index()
-
-else:
-    print("Warning: unrecognized energy allocation type, please check parameter declaration.")
+def build_biofuel_yield(config, df_econ):
+
+    # Separate biofuel yield flows
+    biofuel_yield = df_econ.loc[df_econ['Parameter_B'] == 'Fuel Use',
+                                ['Case/Scenario', 'Stream_LCA', 'Total Flow: Unit (numerator)',
+                                 'Total Flow: Unit (denominator)', 'Total Flow', 'Energy_alloc_primary_fuel']].reset_index(drop=True).copy()
+    biofuel_yield.rename(columns={'Stream_LCA': 'Biofuel Stream_LCA',
+                                  'Total Flow: Unit (numerator)': 'Biofuel Flow: Unit (numerator)',
+                                  'Total Flow: Unit (denominator)': 'Biofuel Flow: Unit (denominator)',
+                                  'Total Flow': 'Biofuel Flow'}, inplace=True)
+
+    biofuel_yield_primary_out = biofuel_yield.loc[biofuel_yield['Energy_alloc_primary_fuel'].isin(['Y']), : ].reset_index(drop=True)
+
+    # If energy allocation is to be implemented, filter by primary fuel flag
+    # Pathway allocation is helpful for assessing CI of the production pathway
+
+    if config.allocation_type == 'Pathway':  # to be checked, may not be required as it is similar to energy allocation
+        # For co-produced fuels, summarize the flow data to net hydrocarbon flow
+        biofuel_yield2 = biofuel_yield.groupby(['Case/Scenario', 'Biofuel Flow: Unit (numerator)',
+                                                'Biofuel Flow: Unit (denominator)'], observed=True).agg({'Biofuel Flow': 'sum'}).reset_index()
+        biofuel_yield2['biofuel_yield_energy_alloc'] = 1
+
+    elif config.allocation_type == 'Energy':  # to be checked
+        # For co-produced fuels, summarize the flow data to net hydrocarbon flow
+        biofuel_yield2 = biofuel_yield.groupby(['Case/Scenario', 'Biofuel Flow: Unit (numerator)',
+                                                'Biofuel Flow: Unit (denominator)'], observed=True).agg({'Biofuel Flow': 'sum'}).reset_index()
+        biofuel_yield2['biofuel_yield_energy_alloc'] = 1
+
+    elif config.allocation_type == 'Hybrid':
+        # Calculate energy allocation fraction per 'Fuel Use' product
+        biofuel_yield['biofuel_yield_energy_alloc'] = biofuel_yield['Biofuel Flow']/biofuel_yield.groupby(['Case/Scenario', 'Biofuel Flow: Unit (numerator)',
+                                                                                                           'Biofuel Flow: Unit (denominator)'], observed=True)['Biofuel Flow'].transform('sum')
+
+        # filter and select primary fuel
+        biofuel_yield2 = biofuel_yield.loc[biofuel_yield['Energy_alloc_primary_fuel'].isin([
+                                                                                           'Y']), :]
+        # If two 'Fuel Use' are identified as primary product, they are aggregrated at this stage
+        biofuel_yield2 = biofuel_yield2.groupby(['Case/Scenario', 'Biofuel Flow: Unit (numerator)',
+                                              'Biofuel Flow: Unit (denominator)'], observed=True).agg({'Biofuel Flow': 'sum',
+                                                                                           'biofuel_yield_energy_alloc': 'sum'}).reset_index()
+
+    else:
+        print("Warning: unrecognized energy allocation type, please check parameter declaration.")
+        raise ValueError('Unrecognized allocation_type: ' + str(config.allocation_type))
+
+    return biofuel_yield, biofuel_yield2, biofuel_yield_primary_out
+
 
 # %%
 
 # Step: Merge biofuel flows with Cost Item table
 # For primary fuel products, their biofuel flow are mapped to singular flows rather than aggregrated 'fuel use' energy products
 # This separation helps to add T&D costs for primary product
-tmpdf = cost_items.loc[cost_items['Energy_alloc_primary_fuel'].isin(['Y']), : ]
-cost_items = cost_items.loc[~ (cost_items['Energy_alloc_primary_fuel'].isin(['Y']) ), : ]
-
-cost_items = pd.merge(cost_items, biofuel_yield2, how='left', on='Case/Scenario').reset_index(drop=True)
-tmpdf = pd.merge(tmpdf, biofuel_yield_primary_out[['Case/Scenario', 'Biofuel Stream_LCA', 'Biofuel Flow: Unit (numerator)',
-       'Biofuel Flow: Unit (denominator)', 'Biofuel Flow']], how='left', 
-                  left_on=['Case/Scenario', 'Stream_LCA'],
-                  right_on = ['Case/Scenario', 'Biofuel Stream_LCA']).reset_index(drop=True)
-cost_items =  pd.concat([cost_items, tmpdf], ignore_index=True).copy()
-cost_items.sort_values(by=['Case/Scenario', 'Parameter_B']).reset_index(drop=True, inplace=True)
-#cost_items.drop(columns=['Energy_alloc_primary_fuel_x', 'Biofuel Stream_LCA', 'Energy_alloc_primary_fuel_y'], inplace=True)
-
-if allocation_type == 'Energy':
-    pass
-
-# based on energy allocation choice, all components are allocated per 'Fuel Use' product
-elif allocation_type == 'Hybrid':
-    for colm in ['Flow', 'Total Cost', 'Total Flow']:
-        cost_items.loc[[isinstance(x, numbers.Number) for x in cost_items[colm]], colm] =\
-            cost_items.loc[[isinstance(x, numbers.Number) for x in cost_items[colm]], colm].multiply(
-            cost_items.loc[[isinstance(x, numbers.Number) for x in cost_items[colm]], 'biofuel_yield_energy_alloc'], axis='index')
-
-# %%
-# Step: calculate cost per variability of parameters
-
-# drop blanks and zeros
-cost_items = cost_items.query('`Total Cost` not in ["-", None, 0]').copy()
-
+def merge_biofuel_yield(config, cost_items, biofuel_yield2, biofuel_yield_primary_out):
 
-if consider_variability_study & (consider_which_variabilities == 'Cost_Item'):
+    tmpdf = cost_items.loc[cost_items['Energy_alloc_primary_fuel'].isin(['Y']), : ]
+    cost_items = cost_items.loc[~ (cost_items['Energy_alloc_primary_fuel'].isin(['Y']) ), : ]
 
-    # unit check
-    check_units = (cost_items['Flow: Unit (numerator)'] != cost_items['Cost: Unit (denominator)']) |\
-        (cost_items['Flow: Unit (denominator)']
-         != cost_items['Operating Time: Unit'])
-    cost_items = cost_items.loc[~check_units]
-    check_units = cost_items.loc[check_units, :]
-    if check_units.shape[0] > 0:
-        print("Warning: The following cost items need attention as the units are not harmonized ..")
-        print(check_units)
+    cost_items = pd.merge(cost_items, biofuel_yield2, how='left', on='Case/Scenario').reset_index(drop=True)
+    tmpdf = pd.merge(tmpdf, biofuel_yield_primary_out[['Case/Scenario', 'Biofuel Stream_LCA', 'Biofuel Flow: Unit (numerator)',
+           'Biofuel Flow: Unit (denominator)', 'Biofuel Flow']], how='left',
+                      left_on=['Case/Scenario', 'Stream_LCA'],
+                      right_on = ['Case/Scenario', 'Biofuel Stream_LCA']).reset_index(drop=True)
+    cost_items =  pd.concat([cost_items, tmpdf], ignore_index=True).copy()
+    cost_items.sort_values(by=['Case/Scenario', 'Parameter_B']).reset_index(drop=True, inplace=True)
+    #cost_items.drop(columns=['Energy_alloc_primary_fuel_x', 'Biofuel Stream_LCA', 'Energy_alloc_primary_fuel_y'], inplace=True)
 
-    var_params = corr_params_variability.loc[corr_params_variability['col_param'].isin(['Cost Item']), :].reset_index(drop=True)
+    if config.allocation_type == 'Energy':
+        pass
 
-    var_params_tbl = variability_table(var_params).reset_index(drop=True)
-    var_params_tbl['variability_id'] = var_params_tbl.index
+    # based on energy allocation choice, all components are allocated per 'Fuel Use' product
+    elif config.allocation_type == 'Hybrid':
+        for colm in ['Flow', 'Total Cost', 'Total Flow']:
+            cost_items[colm] = cost_items[colm] * cost_items['biofuel_yield_energy_alloc']
 
-    cost_items_temp = cost_items.copy()
+    return cost_items
 
-    cost_items_list = []    
-    for r in range(0, var_params_tbl.shape[0]):
-        cost_items_temp.loc[
-            cost_items_temp[var_params_tbl.loc[r, 'col_param']].isin(
-                [var_params_tbl.loc[r, 'param_name']]),
-            var_params_tbl.loc[r, 'col_val']] = var_params_tbl.loc[r, 'param_value']
-        cost_items_temp['variability_id'] = var_params_tbl.loc[r,'variability_id']
-        cost_items_list.append(cost_items_temp)
-    cost_items = pd.concat(cost_items_list, ignore_index=True)
-
-    cost_items = cost_items.merge(
-        var_params_tbl, how='left', on='variability_id').reset_index(drop=True)
 
+# %%
+# Step: calculate cost per variability of parameters
 
-if consider_scale_up_study:
-    
-    # Map biomass types based on feedstock
-    map_bm_types = {
-        'Coal to Power Plants': '', 
-        'Poplar': 'Woody', 
-        'Blended woody biomass': 'Woody',
-        'Forest Residue': 'Woody', 
-        'Switchgrass': 'Herbaceous',
-        'Sludge to Biorefinery for HTL': 'Wastewater sludge',
-        'Logging Residues for CFP, 2020 SOT': 'Woody',
-        'Clean Pine for CFP, 2020 SOT': 'Woody',
-        'Manure to Biorefinery for HTL': 'Manure'
-    }
+# Function to harmonize the BT16 biomass availability table for the scale-up study
+def fmt_BT16_availability(config, bm):
 
-    # Read data on biomass availability
-    bm = pd.read_excel(input_path_BT16 + '/' + f_BT16_availability,
-                    sheet_name=sheet_BT16_availability,
-                    header=17, index_col=None,
-                    usecols="C:K")
     bm = bm.loc[~bm['Aggregated'].isin(['Total']), : ]
     bm = bm.melt(['Aggregated'])
     bm.rename(columns={'Aggregated': 'bm_types', 'variable': 'bm_cost', 'value': 'qty_dry_bm'}, inplace=True)
@@ -1035,302 +1591,318 @@ if consider_scale_up_study:
     # Add unit cost and year columns
     bm['bm_cost: Unit (numerator)'] = 'USD'
     bm['bm_cost: Unit (denominator)'] = 'dt'
-    bm['bm_cost: USD year'] = BT16_cost_year
+    bm['bm_cost: USD year'] = config.BT16_cost_year
     bm['qty_dry_bm: Unit'] = 'MM dt'
 
     # Add cost of T&D and feedstock loss penalty
     bm['bm_cost'] += 40  # Reactor throat price
     bm['qty_dry_bm'] *= 0.7  # 30% penalty for feedstock loss
 
-    # Get unique biomass costs
-    unique_bm_costs = bm['bm_cost'].unique()
+    return bm
 
-    # Initialize cost_items DataFrame
-    tmp_cost_items = cost_items.copy()
-    cost_items = pd.DataFrame(columns=tmp_cost_items.columns.to_list() + ['bm_cost_id'])
 
-    # Map biomass types to feedstocks
-    feedstock_mask = tmp_cost_items['Parameter_A'] == 'Feedstock'
-    tmp_cost_items.loc[feedstock_mask, 'bm_types'] = tmp_cost_items.loc[feedstock_mask, 'Stream_LCA'].map(map_bm_types)
+def expand_cost_items(config, cost_items, corr_params_variability=None, bm=None):
 
-    # Expand cost_items for every feedstock cost
-    for c in unique_bm_costs:
-        # Apply feedstock cost where valid
-        valid_feedstocks = feedstock_mask & tmp_cost_items['bm_types'].notna() & (tmp_cost_items['bm_types'] != '')
-        
-        tmp_cost_items.loc[valid_feedstocks, 'Unit Cost'] = c
-        tmp_cost_items.loc[valid_feedstocks, 'Cost Year'] = BT16_cost_year
-        
-        # Harmonize unit (dt to dry lb)
-        tmp_cost_items.loc[valid_feedstocks, 'Unit Cost'] /= 2000
-        
-        # Recalculate total cost
-        total_cost_mask = valid_feedstocks & (tmp_cost_items['Flow'] != '-') & (tmp_cost_items['Operating Time'] != '-') & (tmp_cost_items['Unit Cost'] != '-')
-        tmp_cost_items.loc[total_cost_mask, 'Total Cost'] = (
-            tmp_cost_items.loc[total_cost_mask, 'Flow'] *
-            tmp_cost_items.loc[total_cost_mask, 'Operating Time'] *
-            tmp_cost_items.loc[total_cost_mask, 'Unit Cost']
+    # drop zeros
+    cost_items = cost_items.loc[cost_items['Total Cost'] != 0, :].copy()
+
+    if config.consider_variability_study & (config.consider_which_variabilities == 'Cost_Item'):
+
+        # unit check
+        check_units = (cost_items['Flow: Unit (numerator)'] != cost_items['Cost: Unit (denominator)']) |\
+            (cost_items['Flow: Unit (denominator)']
+             != cost_items['Operating Time: Unit'])
+        cost_items = cost_items.loc[~check_units]
+        check_units = cost_items.loc[check_units, :]
+        if check_units.shape[0] > 0:
+            print("Warning: The following cost items need attention as the units are not harmonized ..")
+            print(check_units)
+
+        var_params = corr_params_variability.loc[corr_params_variability['col_param'].isin(['Cost Item']), :].reset_index(drop=True)
+
+        var_params_tbl = variability_table(var_params).reset_index(drop=True)
+        var_params_tbl['variability_id'] = var_params_tbl.index
+
+        cost_items_list = []
+        for r in range(0, var_params_tbl.shape[0]):
+            cost_items_temp = cost_items.copy()
+            cost_items_temp.loc[
+                cost_items_temp[var_params_tbl.loc[r, 'col_param']].isin(
+                    [var_params_tbl.loc[r, 'param_name']]),
+                var_params_tbl.loc[r, 'col_val']] = var_params_tbl.loc[r, 'param_value']
+            cost_items_temp['variability_id'] = var_params_tbl.loc[r,'variability_id']
+            cost_items_list.append(cost_items_temp)
+        cost_items = pd.concat(cost_items_list, ignore_index=True)
+
+        cost_items = cost_items.merge(
+            var_params_tbl, how='left', on='variability_id').reset_index(drop=True)
+
+
+    if config.consider_scale_up_study:
+
+        # Get unique biomass costs
+        unique_bm_costs = bm['bm_cost'].unique()
+
+        # Initialize cost_items DataFrame
+        tmp_cost_items = cost_items.copy()
+        cost_items = pd.DataFrame(columns=tmp_cost_items.columns.to_list() + ['bm_cost_id'])
+
+        # Map biomass types to feedstocks
+        feedstock_mask = tmp_cost_items['Parameter_A'] == 'Feedstock'
+        tmp_cost_items.loc[feedstock_mask, 'bm_types'] = tmp_cost_items.loc[feedstock_mask, 'Stream_LCA'].map(map_bm_types)
+
+        # Expand cost_items for every feedstock cost
+        for c in unique_bm_costs:
+            # Apply feedstock cost where valid
+            valid_feedstocks = feedstock_mask & tmp_cost_items['bm_types'].notna() & (tmp_cost_items['bm_types'] != '')
+
+            tmp_cost_items.loc[valid_feedstocks, 'Unit Cost'] = c
+            tmp_cost_items.loc[valid_feedstocks, 'Cost Year'] = config.BT16_cost_year
+
+            # Harmonize unit (dt to dry lb)
+            tmp_cost_items.loc[valid_feedstocks, 'Unit Cost'] /= 2000
+
+            # Recalculate total cost
+            total_cost_mask = valid_feedstocks & tmp_cost_items[['Flow', 'Operating Time', 'Unit Cost']].notna().all(axis=1)
+            tmp_cost_items.loc[total_cost_mask, 'Total Cost'] = (
+                tmp_cost_items.loc[total_cost_mask, 'Flow'] *
+                tmp_cost_items.loc[total_cost_mask, 'Operating Time'] *
+                tmp_cost_items.loc[total_cost_mask, 'Unit Cost']
+            )
+
+            # Add identifier column
+            tmp_cost_items['bm_cost_id'] = c
+
+            # Accumulate results in a list to avoid multiple concat calls
+            if cost_items.empty:
+                cost_items = tmp_cost_items.copy()
+            else:
+                cost_items = pd.concat([cost_items, tmp_cost_items], ignore_index=True, sort=False)
+
+        # Reset index after concat and clean up
+        cost_items.reset_index(drop=True, inplace=True)
+
+
+    if config.consider_variability_study and (config.consider_which_variabilities == 'Cost_Item'):
+        # Calculate itemized MFSP
+
+        # Create a mask for valid rows where 'Flow', 'Operating Time', and 'Unit Cost' have values
+        valid_mask = cost_items[['Flow', 'Operating Time', 'Unit Cost']].notna().all(axis=1)
+
+        # Recalculate total cost for valid rows
+        cost_items.loc[valid_mask, 'Total Cost'] = (
+            cost_items.loc[valid_mask, 'Flow'] *
+            cost_items.loc[valid_mask, 'Operating Time'] *
+            cost_items.loc[valid_mask, 'Unit Cost']
         )
-        
-        # Add identifier column
-        tmp_cost_items['bm_cost_id'] = c
 
-        # Accumulate results in a list to avoid multiple concat calls
-        if cost_items.empty:
-            cost_items = tmp_cost_items.copy()
-        else:
-            cost_items = pd.concat([cost_items, tmp_cost_items], ignore_index=True, sort=False)
+    return cost_items
+
+
+# Correct for inflation to the year of study and set the production year(s)
+def adjust_inflation(config, cost_items):
+
+    print("Correcting inflation to the year of study..")
+
+    #cost_items['Cost Year'] = cost_items['Cost Year'].astype(int)
+    # Inflation row-wise
+    #cost_items['Adjusted Total Cost'] = cost_items.apply(
+    #    lambda row: cpi.inflate(row['Total Cost'], row['Cost Year'], to=cost_year),
+    #    axis=1
+    #)
+
+    import cpi
+
+    # revising inflation adjustment code to improve performance
+    cpi_to = cpi.get(config.cost_year)
+    cost_items['Cost Year'] = cost_items['Cost Year'].astype(int)
+    start_years = cost_items['Cost Year'].unique().astype(int)
+    cpi_start_dict = {year: cpi.get(year) for year in start_years}
+    cost_items['cpi_start'] = cost_items['Cost Year'].map(cpi_start_dict)
+    cost_items['Adjusted Total Cost'] = cost_items['Total Cost'] * (cpi_to / cost_items['cpi_start'])
+
+    # Record adjusted year
+    cost_items['Adjusted Cost Year'] = config.cost_year
+
+    # Set or expand LCI based on production year
+    if len(config.production_year) == 1:
+        cost_items['Production Year'] = config.production_year[0]
+    else:
+        # Create a list of all years in the range
+        years = list(range(config.production_year[0], config.production_year[1] + 1))
+
+        # Replicate the cost_items DataFrame for each year and assign the 'Production Year', keeping column types
+        cost_items = cost_items.loc[cost_items.index.repeat(len(years)), :].reset_index(drop=True)
+        cost_items['Production Year'] = np.tile(years, len(cost_items) // len(years))
 
-    # Reset index after concat and clean up
     cost_items.reset_index(drop=True, inplace=True)
 
+    return cost_items
 
-if consider_variability_study and (consider_which_variabilities == 'Cost_Item'):
-    # Calculate itemized MFSP
 
-    # Create a mask for valid rows where 'Flow', 'Operating Time', and 'Unit Cost' are not '-'
-    valid_mask = (cost_items['Flow'] != '-') & (cost_items['Operating Time'] != '-') & (cost_items['Unit Cost'] != '-')
+def calc_itemized_mfsp(config, cost_items, ob_units):
 
-    # Convert 'Flow', 'Operating Time', and 'Unit Cost' to numeric where valid
-    cost_items.loc[valid_mask, 'Flow'] = pd.to_numeric(cost_items.loc[valid_mask, 'Flow'])
-    cost_items.loc[valid_mask, 'Operating Time'] = pd.to_numeric(cost_items.loc[valid_mask, 'Operating Time'])
-    cost_items.loc[valid_mask, 'Unit Cost'] = pd.to_numeric(cost_items.loc[valid_mask, 'Unit Cost'])
+    print ("Calculating MFSP ..")
 
-    # Recalculate total cost for valid rows
-    cost_items.loc[valid_mask, 'Total Cost'] = (
-        cost_items.loc[valid_mask, 'Flow'] *
-        cost_items.loc[valid_mask, 'Operating Time'] *
-        cost_items.loc[valid_mask, 'Unit Cost']
-    )
+    # Calculate itemized MFSP
+    cost_items['Itemized MFSP'] = cost_items['Adjusted Total Cost'] / cost_items['Biofuel Flow']
+    cost_items['Itemized MFSP: Unit (numerator)'] = cost_items['Total Cost: Unit (numerator)']
+    cost_items['Itemized MFSP: Unit (denominator)'] = cost_items['Biofuel Flow: Unit (numerator)']
 
+    # Harmonize energy units, convert kWh to MJ
+    tmp_cost_items = cost_items[cost_items['Itemized MFSP: Unit (denominator)'] == 'kWh'].copy()
+    cost_items = cost_items[cost_items['Itemized MFSP: Unit (denominator)'] != 'kWh']
 
-print("Correcting inflation to the year of study..")
+    converted = ob_units.unit_convert_df(
+        tmp_cost_items[['Itemized MFSP: Unit (denominator)', 'Itemized MFSP']],
+        Unit='Itemized MFSP: Unit (denominator)',
+        Value='Itemized MFSP',
+        if_unit_numerator=False,
+        if_given_unit=True,
+        given_unit='MJ'
+    )
+    tmp_cost_items['Itemized MFSP: Unit (denominator)'] = converted['Itemized MFSP: Unit (denominator)']
+    tmp_cost_items['Itemized MFSP'] = converted['Itemized MFSP']
+    cost_items = pd.concat([cost_items, tmp_cost_items], ignore_index=True)
 
-# Correct for inflation to the year of study
+    # Identify non-harmonized units
+    ignored_cost_items = cost_items[(cost_items['Total Flow: Unit (numerator)'] != cost_items['Cost: Unit (denominator)']) &
+                                     ~(cost_items['Parameter_A'].isin(['Fixed Costs', 'Capital Depreciation', 'Average Income Tax', 'Average Return on Investment']))]
 
-#cost_items['Cost Year'] = cost_items['Cost Year'].astype(int)
-# Inflation row-wise
-#cost_items['Adjusted Total Cost'] = cost_items.apply(
-#    lambda row: cpi.inflate(row['Total Cost'], row['Cost Year'], to=cost_year),
-#    axis=1
-#)
+    if ignored_cost_items.shape[0] > 0:
+        print("Warning: The following cost items need attention as the units are not harmonized ..")
+        print(ignored_cost_items)
 
-# revising inflation adjustment code to improve performance
-cpi_to = cpi.get(cost_year)
-cost_items['Cost Year'] = cost_items['Cost Year'].astype(int)
-start_years = cost_items['Cost Year'].unique().astype(int)
-cpi_start_dict = {year: cpi.get(year) for year in start_years}
-cost_items['cpi_start'] = cost_items['Cost Year'].map(cpi_start_dict)
-cost_items['Adjusted Total Cost'] = cost_items['Total Cost'] * (cpi_to / cost_items['cpi_start'])
+    # Concatenate the energy unit-adjusted data and original data
+    cost_items = pd.concat([tmp_cost_items, cost_items]).reset_index(drop=True)
 
-# Record adjusted year
-cost_items['Adjusted Cost Year'] = cost_year
+    # For co-products, consider their cost as a credit to the MFSP
+    cost_items.loc[cost_items['Parameter_B'] == 'Coproduct Credits', 'Itemized MFSP'] *= -1
+    if config.allocation_type == 'Energy':
+        # In Energy allocation, no cost credit is considered for produced fuel (per MJ of fuels produced)
+        # Remove mapping of Fuel Use to T&D costs (already removed in database)
+        pass
 
-# Set or expand LCI based on production year
-if len(production_year) == 1:
-    cost_items['Production Year'] = production_year[0]
-else:
-    # Create a list of all years in the range
-    years = list(range(production_year[0], production_year[1] + 1))
-    
-    # Replicate the cost_items DataFrame for each year and assign the 'Production Year'
-    cost_items = pd.DataFrame(np.repeat(cost_items.values, len(years), axis=0), columns=cost_items.columns)
-    cost_items['Production Year'] = np.tile(years, len(cost_items) // len(years))
-    
-cost_items.reset_index(drop=True, inplace=True)
-
-print ("Calculating MFSP ..")
-
-# Calculate itemized MFSP
-cost_items['Itemized MFSP'] = cost_items['Adjusted Total Cost'].astype(float) / cost_items['Biofuel Flow'].astype(float)
-cost_items['Itemized MFSP: Unit (numerator)'] = cost_items['Total Cost: Unit (numerator)']
-cost_items['Itemized MFSP: Unit (denominator)'] = cost_items['Biofuel Flow: Unit (numerator)']
-
-# Harmonize energy units, convert kWh to MJ
-tmp_cost_items = cost_items[cost_items['Itemized MFSP: Unit (denominator)'] == 'kWh'].copy()
-cost_items = cost_items[cost_items['Itemized MFSP: Unit (denominator)'] != 'kWh']
-
-converted = ob_units.unit_convert_df(
-    tmp_cost_items[['Itemized MFSP: Unit (denominator)', 'Itemized MFSP']],
-    Unit='Itemized MFSP: Unit (denominator)',
-    Value='Itemized MFSP',
-    if_unit_numerator=False,
-    if_given_unit=True,
-    given_unit='MJ'
-)
-tmp_cost_items['Itemized MFSP: Unit (denominator)'] = converted['Itemized MFSP: Unit (denominator)']
-tmp_cost_items['Itemized MFSP'] = converted['Itemized MFSP']
-cost_items = pd.concat([cost_items, tmp_cost_items], ignore_index=True)
-
-# Identify non-harmonized units
-ignored_cost_items = cost_items[(cost_items['Total Flow: Unit (numerator)'] != cost_items['Cost: Unit (denominator)']) &
-                                 ~(cost_items['Parameter_A'].isin(['Fixed Costs', 'Capital Depreciation', 'Average Income Tax', 'Average Return on Investment']))]
-
-if ignored_cost_items.shape[0] > 0:
-    print("Warning: The following cost items need attention as the units are not harmonized ..")
-    print(ignored_cost_items)
-
-# Concatenate the energy unit-adjusted data and original data
-cost_items = pd.concat([tmp_cost_items, cost_items]).reset_index(drop=True)
-
-# For co-products, consider their cost as a credit to the MFSP
-cost_items.loc[cost_items['Parameter_B'] == 'Coproduct Credits', 'Itemized MFSP'] *= -1
-if allocation_type == 'Energy':
-    # In Energy allocation, no cost credit is considered for produced fuel (per MJ of fuels produced)
-    # Remove mapping of Fuel Use to T&D costs (already removed in database)
-    pass
-
-elif allocation_type == 'Hybrid':
-    # For 'Hybrid' allocation, fuel use items that are not primary fuel get a displacement credit
-    cost_items.loc[(cost_items['Parameter_B'] == 'Fuel Use') &
-                   (cost_items['Energy_alloc_primary_fuel'] != 'Y'), 'Itemized MFSP'] *= -1
+    elif config.allocation_type == 'Hybrid':
+        # For 'Hybrid' allocation, fuel use items that are not primary fuel get a displacement credit
+        cost_items.loc[(cost_items['Parameter_B'] == 'Fuel Use') &
+                       (cost_items['Energy_alloc_primary_fuel'] != 'Y'), 'Itemized MFSP'] *= -1
+
+    return cost_items
 
 
 # %%
 # Step: Calculate aggregrated Marginal Fuel Selling Price (MFSP)
 
-MFSP_agg = cost_items.copy()
-
-if not consider_coproduct_cost_credit:
-    MFSP_agg = MFSP_agg.loc[~MFSP_agg['Parameter_B'].isin(
-        ['Coproduct Credits']), :]
-
-if consider_variability_study and (consider_which_variabilities == 'Cost_Item'):
-    # Filter and group for variability study
-    MFSP_agg = MFSP_agg[['Case/Scenario',
-                         'Production Year',
-                         'Itemized MFSP: Unit (numerator)',
-                         'Itemized MFSP: Unit (denominator)',
-                         'Adjusted Cost Year',
-                         'Itemized MFSP',
-                         'variability_id',
-                         'col_param',
-                         'col_val',
-                         'param_name',
-                         'param_min',
-                         'param_max',
-                         'param_dist',
-                         'dist_option',
-                         'param_value']]
-    MFSP_agg = MFSP_agg[MFSP_agg['Itemized MFSP'].notna()]
-    MFSP_agg = MFSP_agg.groupby([
-        'Case/Scenario', 'Production Year', 'Itemized MFSP: Unit (numerator)', 
-        'Itemized MFSP: Unit (denominator)', 'Adjusted Cost Year', 'variability_id', 
-        'col_param', 'col_val', 'param_name', 'param_min', 'param_max', 'param_dist', 
-        'dist_option', 'param_value'
-    ])['Itemized MFSP'].sum().reset_index()
-
-elif consider_scale_up_study:
-    # Filter and group for scale-up study
-    MFSP_agg = MFSP_agg[['Case/Scenario',
-                         'Production Year',
-                         'Itemized MFSP: Unit (numerator)',
-                         'Itemized MFSP: Unit (denominator)',
-                         'Adjusted Cost Year',
-                         'Itemized MFSP',
-                         'bm_cost_id']]
-    MFSP_agg = MFSP_agg[MFSP_agg['Itemized MFSP'].notna()]
-    MFSP_agg = MFSP_agg.groupby([
-        'Case/Scenario', 'Production Year', 'Itemized MFSP: Unit (numerator)', 
-        'Itemized MFSP: Unit (denominator)', 'Adjusted Cost Year', 'bm_cost_id'
-    ])['Itemized MFSP'].sum().reset_index()
-
-else:
-    # Filter and group for general case (no study considered)
-    MFSP_agg = MFSP_agg[['Case/Scenario',
-                         'Production Year',
-                         'Itemized MFSP: Unit (numerator)',
-                         'Itemized MFSP: Unit (denominator)',
-                         'Adjusted Cost Year',
-                         'Itemized MFSP']]
-    MFSP_agg = MFSP_agg[MFSP_agg['Itemized MFSP'].notna()]
-    MFSP_agg = MFSP_agg.groupby([
-        'Case/Scenario', 'Production Year', 'Itemized MFSP: Unit (numerator)', 
-        'Itemized MFSP: Unit (denominator)', 'Adjusted Cost Year'
-    ])['Itemized MFSP'].sum().reset_index()
-
-# Rename columns to reflect MFSP replacing fuel
-MFSP_agg.rename(columns={
-    'Itemized MFSP': 'MFSP replacing fuel',
-    'Itemized MFSP: Unit (numerator)': 'MFSP replacing fuel: Unit (numerator)',
-    'Itemized MFSP: Unit (denominator)': 'MFSP replacing fuel: Unit (denominator)'
-}, inplace=True)
-
-# Merge with biofuel yield data to get Fuel Use column back
-MFSP_agg = pd.merge(biofuel_yield[['Case/Scenario', 'Biofuel Stream_LCA', 'Energy_alloc_primary_fuel']].drop_duplicates(),
-                    MFSP_agg, how='left', on='Case/Scenario').reset_index(drop=True)
+def aggregate_mfsp(config, cost_items, biofuel_yield):
+
+    MFSP_agg = cost_items.copy()
+
+    if not config.consider_coproduct_cost_credit:
+        MFSP_agg = MFSP_agg.loc[~MFSP_agg['Parameter_B'].isin(
+            ['Coproduct Credits']), :]
+
+    if config.consider_variability_study and (config.consider_which_variabilities == 'Cost_Item'):
+        # Filter and group for variability study
+        MFSP_agg = MFSP_agg[['Case/Scenario',
+                             'Production Year',
+                             'Itemized MFSP: Unit (numerator)',
+                             'Itemized MFSP: Unit (denominator)',
+                             'Adjusted Cost Year',
+                             'Itemized MFSP',
+                             'variability_id',
+                             'col_param',
+                             'col_val',
+                             'param_name',
+                             'param_min',
+                             'param_max',
+                             'param_dist',
+                             'dist_option',
+                             'param_value']]
+        MFSP_agg = MFSP_agg[MFSP_agg['Itemized MFSP'].notna()]
+        MFSP_agg = MFSP_agg.groupby([
+            'Case/Scenario', 'Production Year', 'Itemized MFSP: Unit (numerator)',
+            'Itemized MFSP: Unit (denominator)', 'Adjusted Cost Year', 'variability_id',
+            'col_param', 'col_val', 'param_name', 'param_min', 'param_max', 'param_dist',
+            'dist_option', 'param_value'
+        ], observed=True)['Itemized MFSP'].sum().reset_index()
+
+    elif config.consider_scale_up_study:
+        # Filter and group for scale-up study
+        MFSP_agg = MFSP_agg[['Case/Scenario',
+                             'Production Year',
+                             'Itemized MFSP: Unit (numerator)',
+                             'Itemized MFSP: Unit (denominator)',
+                             'Adjusted Cost Year',
+                             'Itemized MFSP',
+                             'bm_cost_id']]
+        MFSP_agg = MFSP_agg[MFSP_agg['Itemized MFSP'].notna()]
+        MFSP_agg = MFSP_agg.groupby([
+            'Case/Scenario', 'Production Year', 'Itemized MFSP: Unit (numerator)',
+            'Itemized MFSP: Unit (denominator)', 'Adjusted Cost Year', 'bm_cost_id'
+        ], observed=True)['Itemized MFSP'].sum().reset_index()
+
+    else:
+        # Filter and group for general case (no study considered)
+        MFSP_agg = MFSP_agg[['Case/Scenario',
+                             'Production Year',
+                             'Itemized MFSP: Unit (numerator)',
+                             'Itemized MFSP: Unit (denominator)',
+                             'Adjusted Cost Year',
+                             'Itemized MFSP']]
+        MFSP_agg = MFSP_agg[MFSP_agg['Itemized MFSP'].notna()]
+        MFSP_agg = MFSP_agg.groupby([
+            'Case/Scenario', 'Production Year', 'Itemized MFSP: Unit (numerator)',
+            'Itemized MFSP: Unit (denominator)', 'Adjusted Cost Year'
+        ], observed=True)['Itemized MFSP'].sum().reset_index()
+
+    # Rename columns to reflect MFSP replacing fuel
+    MFSP_agg.rename(columns={
+        'Itemized MFSP': 'MFSP replacing fuel',
+        'Itemized MFSP: Unit (numerator)': 'MFSP replacing fuel: Unit (numerator)',
+        'Itemized MFSP: Unit (denominator)': 'MFSP replacing fuel: Unit (denominator)'
+    }, inplace=True)
+
+    # Merge with biofuel yield data to get Fuel Use column back
+    MFSP_agg = pd.merge(biofuel_yield[['Case/Scenario', 'Biofuel Stream_LCA', 'Energy_alloc_primary_fuel']].drop_duplicates(),
+                        MFSP_agg, how='left', on='Case/Scenario').reset_index(drop=True)
+
+    return MFSP_agg
 
-# Save interim data tables
-if save_interim_files:
-    cost_items.to_csv(output_path_prefix + '/' + f_out_itemized_mfsp)
-    MFSP_agg.to_csv(output_path_prefix + '/' + f_out_agg_mfsp)
 
 # %%
 
 # Step: Expand LCIs based on TEA production year
 
-print ('Expand LCI and LCA calculation ..')
-
-# Filter relevant LCA items
-LCA_parameters = [
-    'Conversion: Input Supply Chains',
-    'Avoided Ems Credits',
-    'Conversion: Combustion Ems, Fossil',
-    'Conversion: Combustion Ems, Biogenic',
-    'Conversion: Non-Combustion Ems, Fossil',
-    'Conversion: Non-Combustion Ems, Biogenic',
-    'Coproduct Credits',
-    'Fuel Use',
-    'CCS Stream, Fossil',
-    'CCS Stream, Biogenic'
-]
+def expand_LCA_items(config, df_econ):
 
-LCA_columns = [
-    'Case/Scenario',
-    'Parameter_A',
-    'Parameter_B',
-    'Stream_Flow',
-    'Stream_LCA',
-    'Energy_alloc_primary_fuel',
-    'Flow: Unit (numerator)',
-    'Flow: Unit (denominator)',
-    'Flow',
-    'Operating Time: Unit',
-    'Operating Time',
-    'Operating Time (%)',
-    'Total Flow: Unit (numerator)',
-    'Total Flow: Unit (denominator)',
-    'Total Flow'
-]
+    print ('Expand LCI and LCA calculation ..')
 
-# Apply filter and column selection
-LCA_items = df_econ.loc[df_econ['Parameter_B'].isin(LCA_parameters), LCA_columns].reset_index(drop=True)
+    # Apply filter and column selection
+    LCA_items = df_econ.loc[df_econ['Parameter_B'].isin(LCA_parameters), LCA_columns].reset_index(drop=True)
 
+    if len(config.production_year) == 1:
+        LCA_items['Production Year'] = config.production_year[0]
+    else:
+        LCA_items = pd.concat(
+            [LCA_items.assign(**{'Production Year': yr}) for yr in range(config.production_year[0], config.production_year[1]+1)],
+            ignore_index=True
+        )
 
-if len(production_year) == 1:
-    LCA_items['Production Year'] = production_year[0]
-else:
-    LCA_items = pd.concat(
-        [LCA_items.assign(**{'Production Year': yr}) for yr in range(production_year[0], production_year[1]+1)],
-        ignore_index=True
-    )
+    return LCA_items
 
-# format LCI
-tempdf, corr_itemized_LCA = fmt_GREET_LCI(corr_itemized_LCA)
 
 # %%
 # Update carbon intensities as per scope of study
 
 # implementing carbon intensities of decarbonized electric grid
+def apply_decarb_grid_CI(config, decarb_elec_CI, LCA_items, corr_itemized_LCA, ob_units):
 
-if decarb_electric_grid:
-    decarb_elec_CI = pd.read_excel(input_path_decarb_model + '/' + f_Decarb_Model,
-                                   sheet_name='EPS - CI', header=3)
-
-    decarb_elec_CI = decarb_elec_CI.loc[(decarb_elec_CI['Case'] == 'Mitigation') &
-                                        (decarb_elec_CI['Mitigation Case'] == 'NREL Electric Power Decarb') &
-                                        (decarb_elec_CI['LCIA Method'] == 'AR4') &
-                                        (decarb_elec_CI['timeframe_years'] == 100), :]
+    # rows read with read_decarb_elec_CI are already filtered
+    keep = np.ones(decarb_elec_CI.shape[0], dtype=bool)
+    for colm, value in decarb_grid_CI_filters.items():
+        keep &= (decarb_elec_CI[colm] == value).values
+    decarb_elec_CI = decarb_elec_CI.loc[keep, :]
 
     decarb_elec_CI = decarb_elec_CI.groupby(['Year', 'Emissions Unit', 'Energy Unit'
                                              ]).agg({'LCIA_estimate': 'sum'}).reset_index()
@@ -1339,9 +1911,9 @@ if decarb_electric_grid:
         LCA_items['Production Year'].unique())].copy()
 
     # if artificial scaling of CI is enabled for sensitivity analysis
-    if decarb_grid_scenario1:
+    if config.decarb_grid_scenario1:
         tmpdf = pd.DataFrame({'Year': np.linspace(max(decarb_elec_CI['Year']), min(decarb_elec_CI['Year']), max(decarb_elec_CI['Year']) - min(decarb_elec_CI['Year'])+1),
-                               'LCA_value_replace': np.linspace(decarb_grid_scenario1_values[0], decarb_grid_scenario1_values[1], max(decarb_elec_CI['Year']) - min(decarb_elec_CI['Year'])+1)})
+                               'LCA_value_replace': np.linspace(config.decarb_grid_scenario1_values[0], config.decarb_grid_scenario1_values[1], max(decarb_elec_CI['Year']) - min(decarb_elec_CI['Year'])+1)})
         decarb_elec_CI = pd.merge(decarb_elec_CI, tmpdf, how='left', on=[
                                   'Year']).reset_index(drop=True)
         decarb_elec_CI.drop(columns=['LCIA_estimate'], inplace=True)
@@ -1378,105 +1950,113 @@ if decarb_electric_grid:
     corr_itemized_LCA = pd.concat(
         [corr_itemized_LCA, decarb_elec_CI], ignore_index=True)
 
+    return decarb_elec_CI, corr_itemized_LCA
+
 
 # %%
 # Merge itemized LCAs to LCIs
-LCA_items = pd.merge(LCA_items, corr_itemized_LCA, how='left',
-                     left_on=['Parameter_B', 'Stream_Flow',
-                              'Stream_LCA', 'Production Year'],
-                     right_on=['Parameter_B', 'Stream_Flow', 'Stream_LCA', 'Year']).reset_index(drop=True)
+def merge_LCA(config, LCA_items, corr_itemized_LCA, corr_params_variability=None, variability_ids=None):
 
-# Variability analysis for LCA parameters
-if consider_variability_study and (consider_which_variabilities == 'Stream_LCA'):
+    LCA_items = pd.merge(LCA_items, corr_itemized_LCA, how='left',
+                         left_on=['Parameter_B', 'Stream_Flow',
+                                  'Stream_LCA', 'Production Year'],
+                         right_on=['Parameter_B', 'Stream_Flow', 'Stream_LCA', 'Year']).reset_index(drop=True)
 
-    var_params = corr_params_variability.loc[
-        corr_params_variability['col_param'] == 'Stream_LCA'
-    ].reset_index(drop=True)
+    # Variability analysis for LCA parameters
+    if config.consider_variability_study and (config.consider_which_variabilities == 'Stream_LCA'):
 
-    var_params_tbl = variability_table(var_params).reset_index(drop=True)
-    var_params_tbl['variability_id'] = var_params_tbl.index
+        var_params = corr_params_variability.loc[
+            corr_params_variability['col_param'] == 'Stream_LCA'
+        ].reset_index(drop=True)
 
-    # Prepare a list to collect all modified versions
-    modified_LCA_items = []
+        var_params_tbl = variability_table(var_params).reset_index(drop=True)
+        var_params_tbl['variability_id'] = var_params_tbl.index
+        if variability_ids is not None:
+            var_params_tbl = var_params_tbl.loc[var_params_tbl['variability_id'].isin(variability_ids), :]
 
-    for _, row in var_params_tbl.iterrows():
-        temp = LCA_items.copy()
-        mask = temp[row['col_param']].isin([row['param_name']])
-        temp.loc[mask, row['col_val']] = row['param_value']
-        temp['variability_id'] = row['variability_id']
-        modified_LCA_items.append(temp)
+        # Prepare a list to collect all modified versions
+        modified_LCA_items = []
 
-    # Only one concat after the loop (MUCH faster)
-    LCA_items = pd.concat(modified_LCA_items, ignore_index=True)
+        for _, row in var_params_tbl.iterrows():
+            temp = LCA_items.copy()
+            mask = temp[row['col_param']].isin([row['param_name']])
+            temp.loc[mask, row['col_val']] = row['param_value']
+            temp['variability_id'] = row['variability_id']
+            modified_LCA_items.append(temp)
 
-    LCA_items = LCA_items.merge(
-        var_params_tbl, how='left', on='variability_id'
-    ).reset_index(drop=True)
+        # Only one concat after the loop (MUCH faster)
+        LCA_items = pd.concat(modified_LCA_items, ignore_index=True)
 
+        LCA_items = LCA_items.merge(
+            var_params_tbl, how='left', on='variability_id'
+        ).reset_index(drop=True)
 
-# harmonize units
-# converting material flow units to model standard units
-# Replace '-' with 0 and convert to numeric in one go (vectorized)
-LCA_items['Total Flow'] = pd.to_numeric(
-    LCA_items['Total Flow'].replace('-', 0)
-)
+    return LCA_items
 
-# Fill missing values
-LCA_items['Total Flow: Unit (numerator)'] = LCA_items['Total Flow: Unit (numerator)'].fillna('-')
 
-# Create a mask once
-mask = LCA_items['Total Flow: Unit (numerator)'] != '-'
+# harmonize units
+# converting material flow units to model standard units
+def harmonize_LCA_units(LCA_items, ob_units):
+
+    # Fill missing values
+    LCA_items['Total Flow: Unit (numerator)'] = LCA_items['Total Flow: Unit (numerator)'].fillna('-')
+
+    # Create a mask once
+    mask = LCA_items['Total Flow: Unit (numerator)'] != '-'
+
+    # Only call unit_convert_df once with the filtered rows
+    if mask.any():
+        converted = ob_units.unit_convert_df(
+            LCA_items.loc[mask, ['Total Flow: Unit (numerator)', 'Total Flow']],
+            Unit='Total Flow: Unit (numerator)',
+            Value='Total Flow',
+            if_unit_numerator=True,
+            if_given_category=False
+        )
+        LCA_items.loc[mask, ['Total Flow: Unit (numerator)', 'Total Flow']] = converted
 
-# Only call unit_convert_df once with the filtered rows
-if mask.any():
-    converted = ob_units.unit_convert_df(
-        LCA_items.loc[mask, ['Total Flow: Unit (numerator)', 'Total Flow']],
-        Unit='Total Flow: Unit (numerator)', 
-        Value='Total Flow',
-        if_unit_numerator=True,
-        if_given_category=False
-    )
-    LCA_items.loc[mask, ['Total Flow: Unit (numerator)', 'Total Flow']] = converted
+    # Check for non-harmonized units
+    non_harmonized_mask = LCA_items['Total Flow: Unit (numerator)'] != LCA_items['LCA: Unit (denominator)']
+    if non_harmonized_mask.any():
+        ignored_LCA_items = LCA_items.loc[non_harmonized_mask]
+        print("Warning: The following LCA items need attention as the units are not harmonized ..")
+        print(ignored_LCA_items)
 
-# Check for non-harmonized units
-non_harmonized_mask = LCA_items['Total Flow: Unit (numerator)'] != LCA_items['LCA: Unit (denominator)']
-if non_harmonized_mask.any():
-    ignored_LCA_items = LCA_items.loc[non_harmonized_mask]
-    print("Warning: The following LCA items need attention as the units are not harmonized ..")
-    print(ignored_LCA_items)
+    # Keep only harmonized items
+    LCA_items = LCA_items.loc[~non_harmonized_mask]
 
-# Keep only harmonized items
-LCA_items = LCA_items.loc[~non_harmonized_mask]
+    return LCA_items
 
 
 # %%
 # Step: Itemized LCA and CCS implementation
 
-# Calculate itemized LCA metric per year
-LCA_items['Total LCA'] = LCA_items['LCA_value'] * LCA_items['Total Flow']
-LCA_items['Total LCA: Unit (numerator)'] = LCA_items['LCA: Unit (numerator)']
-LCA_items['Total LCA: Unit (denominator)'] = LCA_items['Total Flow: Unit (denominator)']
+def calc_itemized_LCA(config, LCA_items, biofuel_yield2):
 
-# If co-product, credit LCA by displacement
-coproduct_mask = LCA_items['Parameter_B'] == 'Coproduct Credits'
-LCA_items.loc[coproduct_mask, 'Total LCA'] *= -1
+    # Calculate itemized LCA metric per year
+    LCA_items['Total LCA'] = LCA_items['LCA_value'] * LCA_items['Total Flow']
+    LCA_items['Total LCA: Unit (numerator)'] = LCA_items['LCA: Unit (numerator)']
+    LCA_items['Total LCA: Unit (denominator)'] = LCA_items['Total Flow: Unit (denominator)']
 
-# Merge biofuel yield data by 'Case/Scenario'
-LCA_items = LCA_items.merge(biofuel_yield2, how='left', on='Case/Scenario').reset_index(drop=True)
+    # If co-product, credit LCA by displacement
+    coproduct_mask = LCA_items['Parameter_B'] == 'Coproduct Credits'
+    LCA_items.loc[coproduct_mask, 'Total LCA'] *= -1
 
-# Allocation step
-if allocation_type == 'Energy':
-    pass  # Nothing to do
+    # Merge biofuel yield data by 'Case/Scenario'
+    LCA_items = LCA_items.merge(biofuel_yield2, how='left', on='Case/Scenario').reset_index(drop=True)
 
-elif allocation_type == 'Hybrid':
-    # Only for numeric columns
-    cols_to_allocate = ['Flow', 'Total Flow', 'Total LCA']
-    
-    # Prepare mask once for all columns (assuming consistent types)
-    numeric_mask = LCA_items[cols_to_allocate[0]].apply(lambda x: isinstance(x, numbers.Number))
+    # Allocation step
+    if config.allocation_type == 'Energy':
+        pass  # Nothing to do
+
+    elif config.allocation_type == 'Hybrid':
+        cols_to_allocate = ['Flow', 'Total Flow', 'Total LCA']
+
+        for col in cols_to_allocate:
+            LCA_items[col] = LCA_items[col] * LCA_items['biofuel_yield_energy_alloc']
+
+    return LCA_items
 
-    for col in cols_to_allocate:
-        LCA_items.loc[numeric_mask, col] *= LCA_items.loc[numeric_mask, 'biofuel_yield_energy_alloc']
 
 # %%
 
@@ -1485,7 +2065,11 @@ elif allocation_type == 'Hybrid':
 # If CCS_fossil_CO2 > combustion_fossil_CO2 show warning to users, to investigate source of the residual CO2 for CCS.
 # [combustion_fossil_CO2 - CCS_CO2] net emission of combustion_fossil_CO2 is accounted.
 # CCS_biogenic_CO2 is credited
-if harmonize_CCS_fossil:
+def harmonize_CCS(LCA_items):
+
+    # Under variability, CCS and combustion rows are merged within each variability point
+    var_cols = [c for c in variability_columns if c in LCA_items.columns]
+    keys = ['Case/Scenario', 'Production Year', 'Year'] + var_cols[:1]
 
     # Select Case/Scenario with CCS flow
     CCS_cases = LCA_items.query("Parameter_B == 'CCS Stream, Fossil' and Stream_Flow == 'Carbon Dioxide'")['Case/Scenario'].drop_duplicates()
@@ -1501,13 +2085,13 @@ if harmonize_CCS_fossil:
 
     # Merge combustion emissions if-any to CCS flows
     tmp_merge = pd.merge(
-    tmp_CCS[['Case/Scenario', 'Production Year', 'Year', 'Total LCA', 'Total LCA: Unit (numerator)', 'Total LCA: Unit (denominator)']],
-    tmp_combust[['Case/Scenario', 'Production Year', 'Year', 'Total LCA', 'Total LCA: Unit (numerator)', 'Total LCA: Unit (denominator)']],
-    on=['Case/Scenario', 'Production Year', 'Year'],
+    tmp_CCS[keys + ['Total LCA', 'Total LCA: Unit (numerator)', 'Total LCA: Unit (denominator)']],
+    tmp_combust[keys + ['Total LCA', 'Total LCA: Unit (numerator)', 'Total LCA: Unit (denominator)']],
+    on=keys,
     suffixes=('_CCS, fossil', '_combustion, fossil'),
     how='left'
     )
-    
+
     # Check Unit Consistency
     unit_mismatch = (
         (tmp_merge['Total LCA: Unit (numerator)_CCS, fossil'] != tmp_merge['Total LCA: Unit (numerator)_combustion, fossil']) |
@@ -1538,17 +2122,17 @@ if harmonize_CCS_fossil:
         print(negatives.to_string(index=False))
 
     tmp_combust = tmp_combust.merge(
-    tmp_merge[['Case/Scenario', 'Production Year', 'Year', 'Total LCA_combustion, fossil_net']],
+    tmp_merge[keys + ['Total LCA_combustion, fossil_net']],
     how='left',
-    on=['Case/Scenario', 'Production Year', 'Year']
+    on=keys
     )
     tmp_combust['Total LCA'] = tmp_combust['Total LCA_combustion, fossil_net']
 
     # Map net CCS values
     tmp_CCS = tmp_CCS.merge(
-        tmp_merge[['Case/Scenario', 'Production Year', 'Year', 'Total LCA_CCS, fossil_net']],
+        tmp_merge[keys + ['Total LCA_CCS, fossil_net']],
         how='left',
-        on=['Case/Scenario', 'Production Year', 'Year']
+        on=keys
     )
     tmp_CCS['Total LCA'] = tmp_CCS['Total LCA_CCS, fossil_net']
 
@@ -1568,282 +2152,301 @@ if harmonize_CCS_fossil:
         'Biofuel Flow: Unit (numerator)', 'Biofuel Flow: Unit (denominator)', 'Biofuel Flow'
     ]
 
-    tmp_LCA_items_updated = tmp_LCA_items_updated[columns_to_keep].copy()
+    tmp_LCA_items_updated = tmp_LCA_items_updated[columns_to_keep + var_cols].copy()
 
     # Final Concatenation
     LCA_items = pd.concat([LCA_items, tmp_LCA_items_updated], ignore_index=True)
 
-# %%
+    return LCA_items
 
-# Step: LCA Metric calculation, itemized and aggregrated
 
-# Calculate LCA metric per unit biofuel yield
-LCA_items['Total LCA'] /= LCA_items['Biofuel Flow']
-LCA_items['Total LCA: Unit (denominator)'] = LCA_items['Biofuel Flow: Unit (numerator)']
+# %%
 
-# Harmonize units: convert 'kWh' -> 'MJ'
-kWh_mask = LCA_items['Total LCA: Unit (denominator)'] == 'kWh'
-if kWh_mask.any():
-    tmp_LCA_items = LCA_items.loc[kWh_mask].copy()
-    LCA_items = LCA_items.loc[~kWh_mask].copy()
+# Step: LCA Metric calculation, itemized and aggregrated
 
-    tmp_LCA_items[['Total LCA: Unit (denominator)', 'Total LCA']] = ob_units.unit_convert_df(
-        tmp_LCA_items[['Total LCA: Unit (denominator)', 'Total LCA']],
-        Unit='Total LCA: Unit (denominator)',
-        Value='Total LCA',
-        if_unit_numerator=False,
-        if_given_unit=True,
-        given_unit='MJ'
-    )
+def aggregate_LCA(config, LCA_items, ob_units):
+
+    # Calculate LCA metric per unit biofuel yield
+    LCA_items['Total LCA'] /= LCA_items['Biofuel Flow']
+    LCA_items['Total LCA: Unit (denominator)'] = LCA_items['Biofuel Flow: Unit (numerator)']
+
+    # Harmonize units: convert 'kWh' -> 'MJ'
+    kWh_mask = LCA_items['Total LCA: Unit (denominator)'] == 'kWh'
+    if kWh_mask.any():
+        tmp_LCA_items = LCA_items.loc[kWh_mask].copy()
+        LCA_items = LCA_items.loc[~kWh_mask].copy()
+
+        tmp_LCA_items[['Total LCA: Unit (denominator)', 'Total LCA']] = ob_units.unit_convert_df(
+            tmp_LCA_items[['Total LCA: Unit (denominator)', 'Total LCA']],
+            Unit='Total LCA: Unit (denominator)',
+            Value='Total LCA',
+            if_unit_numerator=False,
+            if_given_unit=True,
+            given_unit='MJ'
+        )
 
-    # Re-combine
-    LCA_items = pd.concat([LCA_items, tmp_LCA_items], ignore_index=True)
+        # Re-combine
+        LCA_items = pd.concat([LCA_items, tmp_LCA_items], ignore_index=True)
 
-# Prepare for aggregation
-LCA_items_agg = LCA_items.copy()
+    # Prepare for aggregation
+    LCA_items_agg = LCA_items.copy()
 
-if not consider_coproduct_env_credit:
-    LCA_items_agg = LCA_items_agg[LCA_items_agg['Parameter_B'] != 'Coproduct Credits']
+    if not config.consider_coproduct_env_credit:
+        LCA_items_agg = LCA_items_agg[LCA_items_agg['Parameter_B'] != 'Coproduct Credits']
 
-# Aggregate Total LCA
-if consider_variability_study and consider_which_variabilities == 'Stream_LCA':
-    group_cols = [
-        'Case/Scenario', 'LCA_metric', 'Total LCA: Unit (numerator)', 'Total LCA: Unit (denominator)',
-        'Production Year', 'variability_id', 'col_param', 'col_val',
-        'param_name', 'param_min', 'param_max', 'param_dist', 'dist_option', 'param_value'
-    ]
-else:
-    group_cols = [
-        'Case/Scenario', 'LCA_metric', 'Total LCA: Unit (numerator)', 'Total LCA: Unit (denominator)',
-        'Production Year'
-    ]
+    # Aggregate Total LCA
+    if config.consider_variability_study and config.consider_which_variabilities == 'Stream_LCA':
+        group_cols = [
+            'Case/Scenario', 'LCA_metric', 'Total LCA: Unit (numerator)', 'Total LCA: Unit (denominator)',
+            'Production Year', 'variability_id', 'col_param', 'col_val',
+            'param_name', 'param_min', 'param_max', 'param_dist', 'dist_option', 'param_value'
+        ]
+    else:
+        group_cols = [
+            'Case/Scenario', 'LCA_metric', 'Total LCA: Unit (numerator)', 'Total LCA: Unit (denominator)',
+            'Production Year'
+        ]
 
-LCA_items_agg = LCA_items_agg.groupby(group_cols, as_index=False)['Total LCA'].sum()
+    LCA_items_agg = LCA_items_agg.groupby(group_cols, as_index=False, observed=True)['Total LCA'].sum()
 
-# Save interim outputs
-if save_interim_files:
-    LCA_items.to_csv(f"{output_path_prefix}/{f_out_itemized_LCA}", index=False)
-    LCA_items_agg.to_csv(f"{output_path_prefix}/{f_out_agg_LCA}", index=False)
+    return LCA_items, LCA_items_agg
 
 
 # %%
 
 # Step: Merge correspondence tables and GREET emission factors
 
-print ('Calculate MAC ..')
-
-# Merge aggregrated LCA metric to MFSP tables
-# Merge MFSP and LCA aggregated data
-MAC_df = pd.merge(
-    MFSP_agg.loc[MFSP_agg['Energy_alloc_primary_fuel'] == 'Y'],
-    LCA_items_agg,
-    on=['Case/Scenario', 'Production Year'],
-    how='inner'
-).reset_index(drop=True)
-
-# Map replaced fuels to replacing fuels
-MAC_df = MAC_df.merge(
-    corr_replaced_replacing_fuel,
-    on=['Case/Scenario', 'Biofuel Stream_LCA'],
-    how='left'
-)
+def merge_MAC(MFSP_agg, LCA_items_agg, corr_itemized_LCA, inputs):
 
-# Map replaced fuels to GREET pathways
-MAC_df = MAC_df.merge(
-    corr_fuel_replaced_GREET_pathway,
-    on='Replaced Fuel',
-    how='left'
-).rename(
-    columns={'GREET Pathway': 'GREET Pathway for replaced fuel'}
-)
-
-# Map replaced fuels to their CIs
-MAC_df = MAC_df.merge(
-    corr_itemized_LCA,
-    left_on=['Parameter_B', 'Stream_Flow', 'Stream_LCA', 'Production Year'],
-    right_on=['Parameter_B', 'Stream_Flow', 'Stream_LCA', 'Year'],
-    how='left'
-)
+    print ('Calculate MAC ..')
 
-# Clean up and rename columns
-MAC_df.drop(
-    columns=['Year', 'GREET1 sheet', 'Coproduct allocation method', 'GREET classification of coproduct'],
-    inplace=True
-)
+    # Merge aggregrated LCA metric to MFSP tables
+    # Merge MFSP and LCA aggregated data
+    MAC_df = pd.merge(
+        MFSP_agg.loc[MFSP_agg['Energy_alloc_primary_fuel'] == 'Y'],
+        LCA_items_agg,
+        on=['Case/Scenario', 'Production Year'],
+        how='inner'
+    ).reset_index(drop=True)
 
-MAC_df.rename(
-    columns={
-        'LCA: Unit (numerator)': 'CI replaced fuel: Unit (Numerator)',
-        'LCA: Unit (denominator)': 'CI replaced fuel: Unit (Denominator)',
-        'LCA_value': 'CI replaced fuel',
-        'LCA_metric_x': 'Metric_replacing fuel',
-        'LCA_metric_y': 'Metric_replaced fuel'
-    },
-    inplace=True
-)
+    # Map replaced fuels to replacing fuels
+    MAC_df = MAC_df.merge(
+        inputs.corr_replaced_replacing_fuel,
+        on=['Case/Scenario', 'Biofuel Stream_LCA'],
+        how='left'
+    )
 
-MAC_df.reset_index(drop=True, inplace=True)
+    # Map replaced fuels to GREET pathways
+    MAC_df = MAC_df.merge(
+        inputs.corr_fuel_replaced_GREET_pathway,
+        on='Replaced Fuel',
+        how='left'
+    ).rename(
+        columns={'GREET Pathway': 'GREET Pathway for replaced fuel'}
+    )
 
+    # Map replaced fuels to their CIs
+    MAC_df = MAC_df.merge(
+        corr_itemized_LCA,
+        left_on=['Parameter_B', 'Stream_Flow', 'Stream_LCA', 'Production Year'],
+        right_on=['Parameter_B', 'Stream_Flow', 'Stream_LCA', 'Year'],
+        how='left'
+    )
 
-"""
-# harmonize emission factors of conventional fuels to CO2e unit
-ef = ef_calc_co2e(ef)
-
-# Merge aggregrated LCA metric to MFSP tables
-MAC_df = pd.merge(MFSP_agg, LCA_items_agg, on=['Case/Scenario']).reset_index(drop=True)
-
-# map replaced fuels with replacing fuels
-MAC_df = pd.merge(MAC_df, corr_replaced_replacing_fuel, how = 'left', 
-               on=['Case/Scenario', 'Biofuel Stream_LCA', 'Feedstock']).reset_index(drop=True) 
-
-# map replaced fuels with GREET pathways
-MAC_df = pd.merge(MAC_df, corr_fuel_replaced_GREET_pathway, how='left', on=['Replaced Fuel']).reset_index(drop=True)
-MAC_df.rename(columns={'GREET Pathway' : 'GREET Pathway for replaced fuel'}, inplace=True)
-
-# map GREET carbon intensities for replaced fuels, considering Decarb Model reference case carbon intensities only
-MAC_df = pd.merge(MAC_df, ef.loc[ef['Case'] == 'Reference case', : ], how='left', 
-                  left_on=['GREET Pathway for replaced fuel', 'LCA_metric', 'Production Year'],
-                  right_on=['GREET Pathway', 'Formula', 'Year']).reset_index(drop=True)
-MAC_df.rename(columns={'Stream_LCA' : 'Stream_LCA_replaced fuel',
-                       'Formula' :'Formula_replaced fuel',
-                       'Unit (Numerator)' : 'CI replaced fuel: Unit (Numerator)',
-                       'Unit (Denominator)' : 'CI replaced fuel: Unit (Denominator)',
-                       'Case' : 'Case_replaced fuel',
-                       'Scope' : 'Scope_replaced fuel',
-                       'Reference case' : 'CI replaced fuel',
-                       'Elec0' : 'CI Elec0_replaced fuel'}, inplace=True)
-MAC_df.drop(['GREET Pathway'], axis=1, inplace=True)
-"""
+    # Clean up and rename columns
+    MAC_df.drop(
+        columns=['Year', 'GREET1 sheet', 'Coproduct allocation method', 'GREET classification of coproduct'],
+        inplace=True
+    )
 
-# Map MFSP of replaced fuels
-# Map replaced fuels to MFSP
-MAC_df = MAC_df.merge(
-    corr_replaced_mfsp,
-    on='Replaced Fuel',
-    how='left'
-)
+    MAC_df.rename(
+        columns={
+            'LCA: Unit (numerator)': 'CI replaced fuel: Unit (Numerator)',
+            'LCA: Unit (denominator)': 'CI replaced fuel: Unit (Denominator)',
+            'LCA_value': 'CI replaced fuel',
+            'LCA_metric_x': 'Metric_replacing fuel',
+            'LCA_metric_y': 'Metric_replaced fuel'
+        },
+        inplace=True
+    )
 
-# Map replaced fuels to EIA prices
-MAC_df = MAC_df.merge(
-    EIA_price[['Year', 'Value', 'Energy carrier', 'Cost basis', 'Unit']],
-    how='left',
-    left_on=['Production Year', 'Fuel_mapping_for_price'],
-    right_on=['Year', 'Energy carrier']
-)
-
-# Rename columns
-MAC_df.rename(
-    columns={
-        'Value': 'Cost_replaced fuel',
-        'Cost basis': 'Cost basis_replaced fuel'
-    },
-    inplace=True
-)
-
-# Split unit strings into numerator and denominator
-MAC_df[['Year_Cost_replaced fuel', 'Unit Cost_replaced fuel (Numerator)']] = (
-    MAC_df['Unit'].str.split(' ', n=1, expand=True)
-)
-
-MAC_df[['Cost replaced fuel: Unit (Numerator)', 'Cost replaced fuel: Unit (Denominator)']] = (
-    MAC_df['Unit Cost_replaced fuel (Numerator)'].str.split('/', n=1, expand=True)
-)
-
-# Drop unnecessary columns
-MAC_df.drop(
-    columns=['Unit Cost_replaced fuel (Numerator)', 'Energy carrier', 'Unit', 'Cost basis_replaced fuel'],
-    inplace=True
-)
-
-# Final reset index
-MAC_df.reset_index(drop=True, inplace=True)
+    MAC_df.reset_index(drop=True, inplace=True)
+
+
+    """
+    # harmonize emission factors of conventional fuels to CO2e unit
+    ef = ef_calc_co2e(ef)
+
+    # Merge aggregrated LCA metric to MFSP tables
+    MAC_df = pd.merge(MFSP_agg, LCA_items_agg, on=['Case/Scenario']).reset_index(drop=True)
+
+    # map replaced fuels with replacing fuels
+    MAC_df = pd.merge(MAC_df, corr_replaced_replacing_fuel, how = 'left',
+                   on=['Case/Scenario', 'Biofuel Stream_LCA', 'Feedstock']).reset_index(drop=True)
+
+    # map replaced fuels with GREET pathways
+    MAC_df = pd.merge(MAC_df, corr_fuel_replaced_GREET_pathway, how='left', on=['Replaced Fuel']).reset_index(drop=True)
+    MAC_df.rename(columns={'GREET Pathway' : 'GREET Pathway for replaced fuel'}, inplace=True)
+
+    # map GREET carbon intensities for replaced fuels, considering Decarb Model reference case carbon intensities only
+    MAC_df = pd.merge(MAC_df, ef.loc[ef['Case'] == 'Reference case', : ], how='left',
+                      left_on=['GREET Pathway for replaced fuel', 'LCA_metric', 'Production Year'],
+                      right_on=['GREET Pathway', 'Formula', 'Year']).reset_index(drop=True)
+    MAC_df.rename(columns={'Stream_LCA' : 'Stream_LCA_replaced fuel',
+                           'Formula' :'Formula_replaced fuel',
+                           'Unit (Numerator)' : 'CI replaced fuel: Unit (Numerator)',
+                           'Unit (Denominator)' : 'CI replaced fuel: Unit (Denominator)',
+                           'Case' : 'Case_replaced fuel',
+                           'Scope' : 'Scope_replaced fuel',
+                           'Reference case' : 'CI replaced fuel',
+                           'Elec0' : 'CI Elec0_replaced fuel'}, inplace=True)
+    MAC_df.drop(['GREET Pathway'], axis=1, inplace=True)
+    """
+
+    # Map MFSP of replaced fuels
+    # Map replaced fuels to MFSP
+    MAC_df = MAC_df.merge(
+        inputs.corr_replaced_mfsp,
+        on='Replaced Fuel',
+        how='left'
+    )
+
+    # Map replaced fuels to EIA prices
+    MAC_df = MAC_df.merge(
+        inputs.EIA_price[['Year', 'Value', 'Energy carrier', 'Cost basis', 'Unit']],
+        how='left',
+        left_on=['Production Year', 'Fuel_mapping_for_price'],
+        right_on=['Year', 'Energy carrier']
+    )
+
+    # Rename columns
+    MAC_df.rename(
+        columns={
+            'Value': 'Cost_replaced fuel',
+            'Cost basis': 'Cost basis_replaced fuel'
+        },
+        inplace=True
+    )
+
+    # Split unit strings into numerator and denominator
+    MAC_df[['Year_Cost_replaced fuel', 'Unit Cost_replaced fuel (Numerator)']] = (
+        MAC_df['Unit'].str.split(' ', n=1, expand=True)
+    )
+
+    MAC_df[['Cost replaced fuel: Unit (Numerator)', 'Cost replaced fuel: Unit (Denominator)']] = (
+        MAC_df['Unit Cost_replaced fuel (Numerator)'].str.split('/', n=1, expand=True)
+    )
+
+    # Drop unnecessary columns
+    MAC_df.drop(
+        columns=['Unit Cost_replaced fuel (Numerator)', 'Energy carrier', 'Unit', 'Cost basis_replaced fuel'],
+        inplace=True
+    )
+
+    # Final reset index
+    MAC_df.reset_index(drop=True, inplace=True)
+
+    return MAC_df
 
 
 # %%
 
 # Step: Correct inflation of replacing fuel cost
-# revising inflation adjustment code to improve performance
-cpi_to = cpi.get(cost_year)
-MAC_df['Year_Cost_replaced fuel']  = MAC_df['Year_Cost_replaced fuel'] .astype(int)
-start_years = MAC_df['Year_Cost_replaced fuel'].unique()
-cpi_start_dict = {year: cpi.get(year) for year in start_years}
-MAC_df['cpi_start'] = MAC_df['Year_Cost_replaced fuel'].map(cpi_start_dict)
-MAC_df['Adjusted Cost_replaced fuel'] = MAC_df['Cost_replaced fuel'] * (cpi_to / MAC_df['cpi_start'])
+def adjust_replaced_fuel_cost(config, MAC_df):
+
+    import cpi
+
+    # revising inflation adjustment code to improve performance
+    cpi_to = cpi.get(config.cost_year)
+    MAC_df['Year_Cost_replaced fuel']  = MAC_df['Year_Cost_replaced fuel'] .astype(int)
+    start_years = MAC_df['Year_Cost_replaced fuel'].unique()
+    cpi_start_dict = {year: cpi.get(year) for year in start_years}
+    MAC_df['cpi_start'] = MAC_df['Year_Cost_replaced fuel'].map(cpi_start_dict)
+    MAC_df['Adjusted Cost_replaced fuel'] = MAC_df['Cost_replaced fuel'] * (cpi_to / MAC_df['cpi_start'])
+
+    return MAC_df
 
 
 # %%
 
 # Step: Unit check and conversions
 
-# Unit check for Replaced Fuel
-
-# Unit convert for liquid fuels (fuels except unit of energy kWh)
-tmp_MAC_df = MAC_df.loc[(MAC_df['Cost replaced fuel: Unit (Denominator)'].isin(['kWh'])) |
-                        (MAC_df['Biofuel Stream_LCA'].isin(['Hydrogen'])), :].copy()
-MAC_df = MAC_df.loc[~((MAC_df['Cost replaced fuel: Unit (Denominator)'].isin(['kWh'])) |
-                      (MAC_df['Biofuel Stream_LCA'].isin(['Hydrogen']))), :]
-
-# Map Replaced fuel to 'GREET_Fuel', 'GREET_Fuel type' for conversion to unit of energy
-MAC_df = pd.merge(MAC_df, corr_GGE_GREET_fuel_replaced, how='left',
-                  left_on=['Replaced Fuel'],
-                  right_on=['B2B fuel name']).reset_index(drop=True)
-
-MAC_df = pd.merge(MAC_df, ob_units.hv_EIA[['GREET_Fuel', 'GREET_Fuel type', 'LHV', 'Unit']].drop_duplicates(),
-                  how='left',
-                  on=['GREET_Fuel', 'GREET_Fuel type']).reset_index(drop=True)
-MAC_df[['LHV_numerator', 'LHV_denominator']
-       ] = MAC_df['Unit'].str.split('/', n=1, expand=True)
-
-MAC_df.loc[MAC_df['Cost replaced fuel: Unit (Denominator)'] == MAC_df['LHV_denominator'], 'Adjusted Cost_replaced fuel'] =\
-    MAC_df.loc[MAC_df['Cost replaced fuel: Unit (Denominator)'] == MAC_df['LHV_denominator'], 'Adjusted Cost_replaced fuel'] /\
-    MAC_df.loc[MAC_df['Cost replaced fuel: Unit (Denominator)']
-               == MAC_df['LHV_denominator'], 'LHV']
-
-MAC_df.loc[MAC_df['Cost replaced fuel: Unit (Denominator)'] == MAC_df['LHV_denominator'], 'Cost replaced fuel: Unit (Denominator)'] =\
-    MAC_df.loc[MAC_df['Cost replaced fuel: Unit (Denominator)']
-               == MAC_df['LHV_denominator'], 'LHV_numerator']
-
-MAC_df[['Cost replaced fuel: Unit (Denominator)', 'Adjusted Cost_replaced fuel']] = \
-    ob_units.unit_convert_df(
-        MAC_df[[
+def convert_MAC_units(MAC_df, inputs):
+
+    ob_units = inputs.ob_units
+
+    # Unit check for Replaced Fuel
+
+    # Unit convert for liquid fuels (fuels except unit of energy kWh)
+    tmp_MAC_df = MAC_df.loc[(MAC_df['Cost replaced fuel: Unit (Denominator)'].isin(['kWh'])) |
+                            (MAC_df['Biofuel Stream_LCA'].isin(['Hydrogen'])), :].copy()
+    MAC_df = MAC_df.loc[~((MAC_df['Cost replaced fuel: Unit (Denominator)'].isin(['kWh'])) |
+                          (MAC_df['Biofuel Stream_LCA'].isin(['Hydrogen']))), :]
+
+    # Map Replaced fuel to 'GREET_Fuel', 'GREET_Fuel type' for conversion to unit of energy
+    MAC_df = pd.merge(MAC_df, inputs.corr_GGE_GREET_fuel_replaced, how='left',
+                      left_on=['Replaced Fuel'],
+                      right_on=['B2B fuel name']).reset_index(drop=True)
+
+    MAC_df = pd.merge(MAC_df, ob_units.hv_EIA[['GREET_Fuel', 'GREET_Fuel type', 'LHV', 'Unit']].drop_duplicates(),
+                      how='left',
+                      on=['GREET_Fuel', 'GREET_Fuel type']).reset_index(drop=True)
+    MAC_df[['LHV_numerator', 'LHV_denominator']
+           ] = MAC_df['Unit'].str.split('/', n=1, expand=True)
+
+    MAC_df.loc[MAC_df['Cost replaced fuel: Unit (Denominator)'] == MAC_df['LHV_denominator'], 'Adjusted Cost_replaced fuel'] =\
+        MAC_df.loc[MAC_df['Cost replaced fuel: Unit (Denominator)'] == MAC_df['LHV_denominator'], 'Adjusted Cost_replaced fuel'] /\
+        MAC_df.loc[MAC_df['Cost replaced fuel: Unit (Denominator)']
+                   == MAC_df['LHV_denominator'], 'LHV']
+
+    MAC_df.loc[MAC_df['Cost replaced fuel: Unit (Denominator)'] == MAC_df['LHV_denominator'], 'Cost replaced fuel: Unit (Denominator)'] =\
+        MAC_df.loc[MAC_df['Cost replaced fuel: Unit (Denominator)']
+                   == MAC_df['LHV_denominator'], 'LHV_numerator']
+
+    MAC_df[['Cost replaced fuel: Unit (Denominator)', 'Adjusted Cost_replaced fuel']] = \
+        ob_units.unit_convert_df(
+            MAC_df[[
+                'Cost replaced fuel: Unit (Denominator)', 'Adjusted Cost_replaced fuel']],
+            Unit='Cost replaced fuel: Unit (Denominator)',
+            Value='Adjusted Cost_replaced fuel',
+            if_unit_numerator=False,
+            if_given_unit=True,
+            given_unit='MJ').copy()
+    MAC_df['Adjusted Cost replaced fuel: Unit (Denominator)'] = 'MJ'
+
+    MAC_df.drop(columns=['B2B fuel name', 'GREET_Fuel', 'GREET_Fuel type', 'Fuel_mapping_for_price', 'LHV', 'Unit',
+                         'LHV_numerator', 'LHV_denominator'], inplace=True)
+
+    # convert kWh to MJ
+    tmp_MAC_df['Adjusted Cost replaced fuel: Unit (Denominator)'] = tmp_MAC_df[
+        'Cost replaced fuel: Unit (Denominator)']
+    tmp_MAC_df[['Adjusted Cost replaced fuel: Unit (Denominator)', 'Adjusted Cost_replaced fuel']] = \
+        ob_units.unit_convert_df(
+        tmp_MAC_df[[
             'Cost replaced fuel: Unit (Denominator)', 'Adjusted Cost_replaced fuel']],
         Unit='Cost replaced fuel: Unit (Denominator)',
         Value='Adjusted Cost_replaced fuel',
         if_unit_numerator=False,
         if_given_unit=True,
         given_unit='MJ').copy()
-MAC_df['Adjusted Cost replaced fuel: Unit (Denominator)'] = 'MJ'
+    tmp_MAC_df['Adjusted Cost replaced fuel: Unit (Numerator)'] = 'USD'
 
-MAC_df.drop(columns=['B2B fuel name', 'GREET_Fuel', 'GREET_Fuel type', 'Fuel_mapping_for_price', 'LHV', 'Unit',
-                     'LHV_numerator', 'LHV_denominator'], inplace=True)
-
-# convert kWh to MJ
-tmp_MAC_df['Adjusted Cost replaced fuel: Unit (Denominator)'] = tmp_MAC_df[
-    'Cost replaced fuel: Unit (Denominator)']
-tmp_MAC_df[['Adjusted Cost replaced fuel: Unit (Denominator)', 'Adjusted Cost_replaced fuel']] = \
-    ob_units.unit_convert_df(
-    tmp_MAC_df[[
-        'Cost replaced fuel: Unit (Denominator)', 'Adjusted Cost_replaced fuel']],
-    Unit='Cost replaced fuel: Unit (Denominator)',
-    Value='Adjusted Cost_replaced fuel',
-    if_unit_numerator=False,
-    if_given_unit=True,
-    given_unit='MJ').copy()
-tmp_MAC_df['Adjusted Cost replaced fuel: Unit (Numerator)'] = 'USD'
+    # Concatenate the data frames
+    MAC_df = pd.concat([tmp_MAC_df, MAC_df]).reset_index(drop=True).copy()
 
-# Concatenate the data frames
-MAC_df = pd.concat([tmp_MAC_df, MAC_df]).reset_index(drop=True).copy()
+    MAC_df['Adjusted Cost replaced fuel: Unit (Numerator)'] = 'USD'
 
-MAC_df['Adjusted Cost replaced fuel: Unit (Numerator)'] = 'USD'
+    return MAC_df
 
 
 # %%
 # Step: when decarbonized electric grid is considered, reference CI is updated for biopower pathways
 
-if decarb_electric_grid:
+def apply_decarb_grid_biopower(config, MAC_df, decarb_elec_CI):
+
     biopower_sc = MAC_df.loc[MAC_df['Case/Scenario']
-                             .isin(biopower_scenarios), :]
-    MAC_df = MAC_df.loc[~(MAC_df['Case/Scenario'].isin(biopower_scenarios)), :]
+                             .isin(config.biopower_scenarios), :]
+    MAC_df = MAC_df.loc[~(MAC_df['Case/Scenario'].isin(config.biopower_scenarios)), :]
     tmpdf = decarb_elec_CI.loc[decarb_elec_CI['Parameter_B'] == 'Coproduct Credits',
                                 ['Year',
                                  'LCA: Unit (numerator)',
@@ -1873,16 +2476,20 @@ if decarb_electric_grid:
     # Concatenate the data frames
     MAC_df = pd.concat([biopower_sc, MAC_df]).reset_index(drop=True).copy()
 
+    return MAC_df
+
+
 # %%
 # Step: baseline check for MAC calculations
 
 # For biopower scenarios, the 'Baseline for Biopower, 100% coal, w/o CCS, 650 MWe' Case/Scenario is considered
 # for baseline MFSP and LCA
-if adjust_biopower_baseline:
+def adjust_biopower_MAC_baseline(MAC_df):
+
     biopower_baseline = MAC_df.loc[MAC_df['Case/Scenario'].isin(['Baseline for Biopower, 100% coal, w/o CCS, 650 MWe',
                                                                  'Baseline for Biopower, 100% coal, w/ CCS, 650 MWe']), :]
     MAC_df = MAC_df.loc[~(MAC_df['Case/Scenario'].isin(['Baseline for Biopower, 100% coal, w/o CCS, 650 MWe',
-                                                        'Baseline for Biopower, 100% coal, w/ CCS, 650 MWe'])), :]
+                                                        'Baseline for Biopower, 100% coal, w/ CCS, 650 MWe'])), :].copy()
 
     MAC_df['baseline Case/Scenario'] = ''
     MAC_df.loc[MAC_df['Case/Scenario'].isin(['Biopower: 80% coal, w/o BECCS, 650 MWe',
@@ -1894,9 +2501,9 @@ if adjust_biopower_baseline:
 
     biopower_baseline = biopower_baseline[[
         'Case/Scenario', 'Production Year', 'Year', 'MFSP replacing fuel', 'Total LCA']]
-    biopower_baseline.rename(columns={'Case/Scenario': 'baseline Case/Scenario',
-                                      'MFSP replacing fuel': 'Adjusted Cost_replaced fuel_baseline',
-                                      'Total LCA': 'CI replaced fuel_baseline'}, inplace=True)
+    biopower_baseline = biopower_baseline.rename(columns={'Case/Scenario': 'baseline Case/Scenario',
+                                                          'MFSP replacing fuel': 'Adjusted Cost_replaced fuel_baseline',
+                                                          'Total LCA': 'CI replaced fuel_baseline'})
 
     MAC_df = MAC_df.merge(biopower_baseline, how='left',
                           on=['baseline Case/Scenario', 'Production Year', 'Year']).reset_index(drop=True)
@@ -1912,32 +2519,33 @@ if adjust_biopower_baseline:
     MAC_df.drop(columns=['baseline Case/Scenario', 'Adjusted Cost_replaced fuel_baseline',
                 'CI replaced fuel_baseline'], inplace=True)
 
+    return MAC_df
+
 
 # %%
 # Step: Calculate MAC by Cost Items
 
-# MAC = (MFSP_biofuel - MFSP_ref) / (CI_ref - CI_biofuel)
-# Unit: ($/MJ - $/MJ) / (g/MJ - g/MJ) = $/g
-MAC_df['MAC_calculated'] = (MAC_df['MFSP replacing fuel'] - MAC_df['Adjusted Cost_replaced fuel']) / \
-                           (MAC_df['CI replaced fuel'] - MAC_df['Total LCA'])
-MAC_df['MAC_calculated: Unit (numerator)'] = MAC_df['MFSP replacing fuel: Unit (numerator)']
-MAC_df['MAC_calculated: Unit (denominator)'] = MAC_df['Total LCA: Unit (numerator)']
-MAC_df['MAC_calculated'] = MAC_df['MAC_calculated'] * \
-    1E6  # unit: $/MT CO2 avoided
-MAC_df['MAC_calculated: Unit (denominator)'] = 'MT'
-
-MAC_df['CI of replaced fuel higher'] = MAC_df['CI replaced fuel'] > MAC_df['Total LCA']
-MAC_df['Cost of replaced fuel higher'] = MAC_df['Adjusted Cost_replaced fuel'] > MAC_df['MFSP replacing fuel']
-MAC_df['Percent CI reduciton'] = (
-    (MAC_df['CI replaced fuel'] - MAC_df['Total LCA']) / MAC_df['CI replaced fuel']) * 100
-MAC_df['Percent MFSP increase'] = (
-    (MAC_df['MFSP replacing fuel'] - MAC_df['Adjusted Cost_replaced fuel']) / MAC_df['Adjusted Cost_replaced fuel']) * 100
+def calc_MAC(MAC_df):
 
-# Save interim data tables
-if save_interim_files == True:
-    MAC_df.to_csv(output_path_prefix + '/' + f_out_MAC)
+    # MAC = (MFSP_biofuel - MFSP_ref) / (CI_ref - CI_biofuel)
+    # Unit: ($/MJ - $/MJ) / (g/MJ - g/MJ) = $/g
+    MAC_df['MAC_calculated'] = (MAC_df['MFSP replacing fuel'] - MAC_df['Adjusted Cost_replaced fuel']) / \
+                               (MAC_df['CI replaced fuel'] - MAC_df['Total LCA'])
+    MAC_df['MAC_calculated: Unit (numerator)'] = MAC_df['MFSP replacing fuel: Unit (numerator)']
+    MAC_df['MAC_calculated: Unit (denominator)'] = MAC_df['Total LCA: Unit (numerator)']
+    MAC_df['MAC_calculated'] = MAC_df['MAC_calculated'] * \
+        1E6  # unit: $/MT CO2 avoided
+    MAC_df['MAC_calculated: Unit (denominator)'] = 'MT'
+
+    MAC_df['CI of replaced fuel higher'] = MAC_df['CI replaced fuel'] > MAC_df['Total LCA']
+    MAC_df['Cost of replaced fuel higher'] = MAC_df['Adjusted Cost_replaced fuel'] > MAC_df['MFSP replacing fuel']
+    MAC_df['Percent CI reduciton'] = (
+        (MAC_df['CI replaced fuel'] - MAC_df['Total LCA']) / MAC_df['CI replaced fuel']) * 100
+    MAC_df['Percent MFSP increase'] = (
+        (MAC_df['MFSP replacing fuel'] - MAC_df['Adjusted Cost_replaced fuel']) / MAC_df['Adjusted Cost_replaced fuel']) * 100
+
+    return MAC_df
 
-print('    Elapsed time: ' + str(datetime.now() - init_time))
 
 #%%
 
@@ -1947,41 +2555,41 @@ print('    Elapsed time: ' + str(datetime.now() - init_time))
 # Map feedstock availability (dry tons/year)
 # Calculate net GHG reduction and net cost increase
 
-if consider_scale_up_study:
+def calc_scale_up(MAC_df, cost_items, bm):
 
     # calculate CI reduction (g GHG/MJ) and MFSP increase ($/MJ)
     scale_up = MAC_df.copy()
-    
+
     scale_up['CI_reduction'] = MAC_df['CI replaced fuel'] - MAC_df['Total LCA']
     scale_up['MFSP_increase'] = MAC_df['MFSP replacing fuel'] - MAC_df['Adjusted Cost_replaced fuel']
-    
+
     # Map and merge feedstock and fuel product flow rates (dry lb/hr, MJ/hr -> dry lb/MJ)
-    tmpdf_feedstock = cost_items.loc[cost_items['Parameter_A'].isin(['Feedstock']), 
+    tmpdf_feedstock = cost_items.loc[cost_items['Parameter_A'].isin(['Feedstock']),
                    ['Case/Scenario', 'Stream_Flow', 'Stream_LCA', 'bm_cost_id',
                     'Flow: Unit (numerator)', 'Flow: Unit (denominator)', 'Flow']].drop_duplicates().reset_index(drop=True)
     tmpdf_feedstock.rename(columns={
         'Flow' : 'feedstock_Flow',
         'Stream_Flow' : 'feedstock_Stream_Flow',
         'Stream_LCA' : 'feedstock_Stream_LCA',
-        'Flow: Unit (numerator)' : 'feedstock_Flow: Unit (numerator)', 
+        'Flow: Unit (numerator)' : 'feedstock_Flow: Unit (numerator)',
         'Flow: Unit (denominator)' : 'feedstock_Flow: Unit (denominator)'}, inplace=True)
-    
-    tmpdf_product = cost_items.loc[cost_items['Parameter_A'].isin(['Final Product']), 
+
+    tmpdf_product = cost_items.loc[cost_items['Parameter_A'].isin(['Final Product']),
                    ['Case/Scenario', 'Stream_Flow', 'Stream_LCA', 'bm_cost_id',
                     'Flow: Unit (numerator)', 'Flow: Unit (denominator)', 'Flow']].drop_duplicates().reset_index(drop=True)
     # aggregating energy products
-    tmpdf_product = tmpdf_product.groupby(['Case/Scenario', 'bm_cost_id', 'Flow: Unit (numerator)', 'Flow: Unit (denominator)']).agg({'Flow':'sum'}).reset_index()
+    tmpdf_product = tmpdf_product.groupby(['Case/Scenario', 'bm_cost_id', 'Flow: Unit (numerator)', 'Flow: Unit (denominator)'], observed=True).agg({'Flow':'sum'}).reset_index()
     tmpdf_product.rename(columns={
         'Flow' : 'product_Flow',
         'Flow: Unit (numerator)' : 'product_Flow: Unit (numerator)',
         'Flow: Unit (denominator)' : 'product_Flow: Unit (denominator)'}, inplace=True)
-    
+
     # merge feedstock and product flows
     tmpdf = tmpdf_feedstock.merge(tmpdf_product, how='left', on=['Case/Scenario', 'bm_cost_id']).reset_index(drop=True)
     tmpdf['feedstock_per_product'] = tmpdf['feedstock_Flow'] / tmpdf['product_Flow']
     tmpdf['feedstock_per_product: Unit (numerator)'] = tmpdf['feedstock_Flow: Unit (numerator)']
     tmpdf['feedstock_per_product: Unit (denominator)'] = tmpdf['product_Flow: Unit (numerator)']
-    
+
     # Calculate total GHG and USD per feedstock flow rate
     scale_up = scale_up.merge(tmpdf, how = 'left', on=['Case/Scenario', 'bm_cost_id']).reset_index(drop=True)
     scale_up['GHG_reduction_per_feedstock_flow'] = scale_up['CI_reduction'] / scale_up['feedstock_per_product']
@@ -1990,45 +2598,538 @@ if consider_scale_up_study:
     scale_up['GHG_reduction_per_feedstock_flow: Unit (denominator)'] = scale_up['feedstock_per_product: Unit (numerator)']
     scale_up['cost_increase_per_feedstock_flow: Unit (numerator)'] = scale_up['MFSP replacing fuel: Unit (numerator)']
     scale_up['cost_increase_per_feedstock_flow: Unit (denominator)'] = scale_up['feedstock_per_product: Unit (numerator)']
-    
+
     # Map feedstock availability (dry tons/year)
-    
-    # Map biomass to feedstocks  
+
+    # Map biomass to feedstocks
     scale_up['bm_types'] = scale_up['feedstock_Stream_LCA'].map(map_bm_types)
-    
+
     # match to scale_up for all availability costs
-    scale_up = scale_up.merge(bm, how='left', 
+    scale_up = scale_up.merge(bm, how='left',
                               left_on = ['bm_types', 'bm_cost_id'],
                               right_on = ['bm_types', 'bm_cost']).reset_index(drop=True)
-    
+
     # Calculate net GHG reduction and net cost increase
     scale_up['net_GHG_reduction'] = scale_up['GHG_reduction_per_feedstock_flow'] * scale_up['qty_dry_bm'] * 1E6 / 1E12 * 2204.6226 # dry ton to dry lb of biomass; grams GHG to million metric ton GHG
     scale_up['net_cost_increase'] = scale_up['cost_increase_per_feedstock_flow'] * scale_up['qty_dry_bm'] * 1E6 / 1E9 * 2204.6226 # dry ton to dry lb; USD to Billion USD
-    scale_up['net_GHG_reduction: Unit'] = 'MM mt' # scale_up['GHG_reduction_per_feedstock_flow: Unit (numerator)'] 
+    scale_up['net_GHG_reduction: Unit'] = 'MM mt' # scale_up['GHG_reduction_per_feedstock_flow: Unit (numerator)']
     scale_up['net_cost_increase: Unit'] = 'B USD' #scale_up['cost_increase_per_feedstock_flow: Unit (denominator)']
-    
+
     # Total fuel produced
-    
+
     # Convert kWh to MJ
     scale_up.loc[scale_up['feedstock_per_product: Unit (denominator)'].isin(['kWh']), 'feedstock_per_product'] =\
         scale_up.loc[scale_up['feedstock_per_product: Unit (denominator)'].isin(['kWh']), 'feedstock_per_product'] / 3.6 # lb/kWh -> lb/MJ, 1 kWh = 3.6 MJ
-    
+
     scale_up.loc[scale_up['feedstock_per_product: Unit (denominator)'].isin(['kWh']), 'feedstock_per_product: Unit (denominator)'] = 'MJ'
-        
+
     scale_up.loc[scale_up['qty_dry_bm: Unit'].isin(['MM dt']), 'net_primary_fuel_produced'] =\
         1/(scale_up.loc[scale_up['qty_dry_bm: Unit'].isin(['MM dt']), 'feedstock_per_product']*0.0005) * \
         scale_up.loc[scale_up['qty_dry_bm: Unit'].isin(['MM dt']), 'qty_dry_bm'] /1E3 # MJ/dt * MM dt = Tera Joules -> Peta Joules
-    
+
     scale_up.loc[scale_up['qty_dry_bm: Unit'].isin(['MM dt']), 'net_primary_fuel_produced: Unit'] = 'PJ'
-    
+
+    return scale_up
+
+
+# %%
+# Model run
+
+# Save interim data tables
+def save_interim(config, results):
+
+    results['cost_items'].to_csv(config.output_path_prefix + '/' + f_out_itemized_mfsp)
+    results['MFSP_agg'].to_csv(config.output_path_prefix + '/' + f_out_agg_mfsp)
+    results['LCA_items'].to_csv(f"{config.output_path_prefix}/{f_out_itemized_LCA}", index=False)
+    results['LCA_items_agg'].to_csv(f"{config.output_path_prefix}/{f_out_agg_LCA}", index=False)
+    results['MAC_df'].to_csv(config.output_path_prefix + '/' + f_out_MAC)
+
+
+# LCA stages from the merge of LCA items to LCIs up to the aggregation, for all variability
+# points or for the given variability_ids
+def calc_LCA(config, LCA_items, corr_itemized_LCA, corr_params_variability, biofuel_yield2, ob_units,
+             run, variability_ids=None):
+    LCA_items = run(merge_LCA, config, LCA_items, corr_itemized_LCA, corr_params_variability, variability_ids)
+    LCA_items = run(harmonize_LCA_units, LCA_items, ob_units)
+    LCA_items = run(calc_itemized_LCA, config, LCA_items, biofuel_yield2)
+    if config.harmonize_CCS_fossil:
+        LCA_items = run(harmonize_CCS, LCA_items)
+    return run(aggregate_LCA, config, LCA_items, ob_units)
+
+
+# Delete the checkpoint folders under checkpoint_path other than keep whose files were all written
+# more than retention_days ago. Folders of runs in progress, written to since, are kept.
+def remove_stale_checkpoints(checkpoint_path, keep, retention_days=checkpoint_retention_days):
+    cutoff = time.time() - retention_days * 86400
+    for d in os.listdir(checkpoint_path):
+        path = checkpoint_path + '/' + d
+        if d == keep or not os.path.isdir(path):
+            continue
+        mtimes = [os.path.getmtime(path)] + [os.path.getmtime(path + '/' + f) for f in os.listdir(path)]
+        if max(mtimes) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+# LCA stages of a Stream_LCA variability study run in batches of config.variability_batch_size
+# variability points. Each completed batch is saved under checkpoint_path, and read back
+# instead of being recomputed when the run is repeated with the same inputs, toggles and stage code.
+def calc_LCA_batches(config, LCA_items, corr_itemized_LCA, corr_params_variability, biofuel_yield2, ob_units,
+                     checkpoint_path, run):
+
+    batch_size = config.variability_batch_size
+    var_params = corr_params_variability.loc[corr_params_variability['col_param'] == 'Stream_LCA'].reset_index(drop=True)
+    n_var = variability_table(var_params).shape[0]
+    batches = [list(range(i, min(i + batch_size, n_var))) for i in range(0, n_var, batch_size)]
+
+    # the code of the LCA stages and of the unit conversions is part of the key, so that batches
+    # computed by earlier code are not resumed
+    params = {k: v for k, v in config.params().items() if k not in snapshot_config_exclude}
+    key = hash_object([params, LCA_items, corr_itemized_LCA, corr_params_variability, biofuel_yield2, ob_units,
+                       batch_size, code_digest(calc_LCA), code_digest(type(ob_units).unit_convert_df)])
+    path = checkpoint_path + '/' + key
+    os.makedirs(path, exist_ok=True)
+
+    LCA_items_list = []
+    LCA_items_agg_list = []
+    for b, ids in enumerate(batches):
+        f = path + '/batch_' + str(b) + '.pkl'
+        if os.path.isfile(f):
+            print('Resuming variability batch ' + str(b + 1) + ' of ' + str(len(batches)) + ' from checkpoint ..')
+            with open(f, 'rb') as fh:
+                batch_items, batch_agg = pickle.load(fh)
+        else:
+            print('Running variability batch ' + str(b + 1) + ' of ' + str(len(batches)) + ' ..')
+            batch_items, batch_agg = calc_LCA(config, LCA_items, corr_itemized_LCA, corr_params_variability,
+                                              biofuel_yield2, ob_units, run, ids)
+            # written under a temporary name first, a batch file is complete once it exists
+            with open(f + '.tmp', 'wb') as fh:
+                pickle.dump((batch_items, batch_agg), fh, protocol=4)
+            os.replace(f + '.tmp', f)
+        LCA_items_list.append(batch_items)
+        LCA_items_agg_list.append(batch_agg)
+
+    LCA_items = pd.concat(LCA_items_list, ignore_index=True)
+    LCA_items_agg = pd.concat(LCA_items_agg_list, ignore_index=True)
+
+    # checkpoints of other inputs or toggles are only cleared once this run is complete
+    remove_stale_checkpoints(checkpoint_path, key)
+
+    # same row order as the aggregation of all variability points at once
+    group_cols = [c for c in LCA_items_agg.columns if c != 'Total LCA']
+    LCA_items_agg = LCA_items_agg.sort_values(group_cols, kind='stable').reset_index(drop=True)
+
+    return LCA_items, LCA_items_agg
+
+
+# Function to run the model for a configuration on already loaded inputs. Returns a dictionary
+# of the result tables: cost_items, MFSP_agg, LCA_items, LCA_items_agg and MAC_df, along with
+# scale_up, decarb_elec_CI and the formatted corr_itemized_LCA used by the dashboard write.
+# When a stage_cache is given, stages whose inputs and toggles are unchanged are read from the cache.
+# When a stage_profiler is given, time, memory and frame sizes of every stage are recorded.
+# When a checkpoint_path is given, Stream_LCA variabilities are run in checkpointed batches.
+def run_model(config, inputs, cache=None, profiler=None, checkpoint_path=None):
+
+    if config.consider_variability_study and inputs.corr_params_variability is None:
+        raise ValueError('Variability study is toggled but the input bundle has no variability parameters, please load inputs with the same configuration ..')
+    if config.consider_scale_up_study and inputs.bm is None:
+        raise ValueError('Scale-up study is toggled but the input bundle has no BT16 availability data, please load inputs with the same configuration ..')
+    if config.decarb_electric_grid and inputs.decarb_elec_CI is None:
+        raise ValueError('Decarb electric grid is toggled but the input bundle has no Decarb Model CI data, please load inputs with the same configuration ..')
+
+    ob_units = inputs.ob_units
+    # variability parameters are only read when the study is toggled
+    corr_params_variability = inputs.corr_params_variability if config.consider_variability_study else None
+
+    # stages run directly, or through the stage cache
+    if cache is not None:
+        cache.reset()
+        run = cache.run
+    else:
+        def run(func, *args):
+            return func(*args)
+    if profiler is not None:
+        run = profiler.wrap(run)
+
+    df_econ = run(select_pathways, config, inputs.df_econ)
+    df_econ, corr_itemized_LCA = run(encode_dimensions, df_econ, inputs.corr_itemized_LCA)
+
+    bm = None
+    if config.consider_scale_up_study:
+        bm = run(fmt_BT16_availability, config, inputs.bm)
+
+    # TEA: cost items and MFSP
+    cost_items = run(build_cost_items, df_econ)
+    biofuel_yield, biofuel_yield2, biofuel_yield_primary_out = run(build_biofuel_yield, config, df_econ)
+    cost_items = run(merge_biofuel_yield, config, cost_items, biofuel_yield2, biofuel_yield_primary_out)
+    cost_items = run(expand_cost_items, config, cost_items, corr_params_variability, bm)
+    cost_items = run(adjust_inflation, config, cost_items)
+    cost_items = run(calc_itemized_mfsp, config, cost_items, ob_units)
+    MFSP_agg = run(aggregate_mfsp, config, cost_items, biofuel_yield)
+
+    # LCA: itemized and aggregated carbon intensities
+    LCA_items = run(expand_LCA_items, config, df_econ)
+    tempdf, corr_itemized_LCA = run(fmt_GREET_LCI, corr_itemized_LCA, ob_units, config.always_calc_CO2_w_VOC_CO)
+
+    decarb_elec_CI = None
+    if config.decarb_electric_grid:
+        decarb_elec_CI, corr_itemized_LCA = run(apply_decarb_grid_CI, config, inputs.decarb_elec_CI, LCA_items, corr_itemized_LCA, ob_units)
+
+    if checkpoint_path is not None and config.consider_variability_study and \
+            config.consider_which_variabilities == 'Stream_LCA':
+        LCA_items, LCA_items_agg = calc_LCA_batches(config, LCA_items, corr_itemized_LCA, corr_params_variability,
+                                                    biofuel_yield2, ob_units, checkpoint_path, run)
+    else:
+        LCA_items, LCA_items_agg = calc_LCA(config, LCA_items, corr_itemized_LCA, corr_params_variability,
+                                            biofuel_yield2, ob_units, run)
+
+    # MAC
+    MAC_df = run(merge_MAC, MFSP_agg, LCA_items_agg, corr_itemized_LCA, inputs)
+    MAC_df = run(adjust_replaced_fuel_cost, config, MAC_df)
+    MAC_df = run(convert_MAC_units, MAC_df, inputs)
+    if config.decarb_electric_grid:
+        MAC_df = run(apply_decarb_grid_biopower, config, MAC_df, decarb_elec_CI)
+    if config.adjust_biopower_baseline:
+        MAC_df = run(adjust_biopower_MAC_baseline, MAC_df)
+    MAC_df = run(calc_MAC, MAC_df)
+
+    scale_up = None
+    if config.consider_scale_up_study:
+        scale_up = run(calc_scale_up, MAC_df, cost_items, bm)
+
+    results = {'cost_items': cost_items,
+               'MFSP_agg': MFSP_agg,
+               'LCA_items': LCA_items,
+               'LCA_items_agg': LCA_items_agg,
+               'MAC_df': MAC_df,
+               'scale_up': scale_up,
+               'decarb_elec_CI': decarb_elec_CI,
+               'corr_itemized_LCA': corr_itemized_LCA}
+    results = {k: decode_dimensions(v) for k, v in results.items()}
+
+    if config.save_interim_files:
+        save_interim(config, results)
+
+    return results
+
+
+# %%
+# Dry-run planning of the row expansion and memory of a model run
+
+# columns of the LCI identifying the formatted LCI rows merged to an LCA item
+LCI_key_columns = ['Parameter_B', 'Stream_Flow', 'Stream_LCA', 'GREET1 sheet', 'Coproduct allocation method',
+                   'GREET classification of coproduct', 'Year']
+
+# approximate column counts of the expanded frames
+plan_columns = {'cost_items': 35, 'MFSP_agg': 8, 'LCA_items': 40, 'LCA_items_agg': 15, 'MAC_df': 47}
+
+# bytes per cell of numeric and object columns, and of cells converted by astype(str) for the dashboard
+plan_bytes_per_cell = 8
+plan_bytes_per_str_cell = 60
+
+
+# Read only the key columns of the LCI, enough to plan the LCA merge
+def read_LCI_keys(config, LCI_store_path=None):
+    if LCI_store_path is not None:
+        return read_LCI(config.input_path_corr + '/' + f_corr_itemized_LCI, LCI_store_path,
+                        columns=LCI_key_columns).reset_index(drop=True)
+    return pd.read_csv(config.input_path_corr + '/' + f_corr_itemized_LCI, usecols=LCI_key_columns)
+
+
+# Number of rows of the variability table of a parameter type
+def n_variability_points(config, corr_params_variability, which, col_param):
+    if not (config.consider_variability_study and config.consider_which_variabilities == which):
+        return 1
+    var_params = corr_params_variability.loc[corr_params_variability['col_param'] == col_param, :].reset_index(drop=True)
+    return max(1, variability_table(var_params).shape[0])
+
+
+# Function to predict the rows and memory of the expanded frames of a model run from the Db rows,
+# the variability parameters and the LCI keys, without running the expansions. Returns a table of
+# the frames, with the estimated peak memory of the run in its last row.
+def plan_expansion(config, df_econ, corr_params_variability, LCI_keys, bm=None):
+
+    df_econ = select_pathways(config, df_econ)
+    n_cases = df_econ['Case/Scenario'].nunique()
+    years = config.production_year if len(config.production_year) == 1 else \
+        list(range(config.production_year[0], config.production_year[1] + 1))
+    n_years = len(years)
+
+    K_cost = n_variability_points(config, corr_params_variability, 'Cost_Item', 'Cost Item')
+    K_LCA = n_variability_points(config, corr_params_variability, 'Stream_LCA', 'Stream_LCA')
+    B = 1
+    if config.consider_scale_up_study:
+        B = fmt_BT16_availability(config, bm)['bm_cost'].nunique()
+
+    # TEA rows
+    cost_items = build_cost_items(df_econ)
+    cost_items = cost_items.query('`Total Cost` not in ["-", None, 0]')
+    n_cost = cost_items.shape[0] * B * K_cost * n_years
+    n_fuels = df_econ.loc[df_econ['Parameter_B'] == 'Fuel Use', :].shape[0]
+    n_MFSP = n_fuels * B * K_cost * n_years
+
+    # LCA rows, each LCA item merges to every formatted LCI row of its flow and year
+    LCA_items = expand_LCA_items(config.copy(production_year=[years[0]]), df_econ)
+    LCI_rows = LCI_keys.drop_duplicates().groupby(['Parameter_B', 'Stream_Flow', 'Stream_LCA'], observed=True).size() / \
+        max(1, LCI_keys['Year'].nunique())
+    mult = LCA_items.set_index(['Parameter_B', 'Stream_Flow', 'Stream_LCA']).index.map(LCI_rows)
+    mult = np.maximum(np.nan_to_num(np.asarray(mult, dtype=float), nan=1.), 1.)
+    n_LCA = mult.sum() * n_years * K_LCA
+
+    # CCS harmonization merges CCS and combustion rows of a pathway, year and variability point with each other
+    if config.harmonize_CCS_fossil:
+        ccs = LCA_items.assign(mult=mult).groupby('Case/Scenario', observed=True).apply(
+            lambda g: pd.Series({'c': g.loc[g['Parameter_B'] == 'CCS Stream, Fossil', 'mult'].sum(),
+                                 'b': g.loc[g['Parameter_B'] == 'Conversion: Combustion Ems, Fossil', 'mult'].sum()}))
+        ccs = ccs.loc[ccs['c'] > 0, :]
+        m = ccs['c'] * np.maximum(ccs['b'], 1)
+        n_LCA += ((ccs['b'] + ccs['c']) * (m - 1)).sum() * n_years * K_LCA
+
+    n_LCA_agg = n_cases * n_years * K_LCA
+    n_MAC = n_LCA_agg * K_cost * B
+
+    plan = pd.DataFrame({'frame': ['df_econ', 'cost_items', 'MFSP_agg', 'LCA_items', 'LCA_items_agg', 'MAC_df'],
+                         'rows': [df_econ.shape[0], n_cost, n_MFSP, n_LCA, n_LCA_agg, n_MAC],
+                         'cols': [df_econ.shape[1], plan_columns['cost_items'], plan_columns['MFSP_agg'],
+                                  plan_columns['LCA_items'], plan_columns['LCA_items_agg'], plan_columns['MAC_df']]})
+    plan['rows'] = plan['rows'].astype('int64')
+    plan['est_GB'] = plan['rows'] * plan['cols'] * plan_bytes_per_cell / 1E9
+
+    # dashboard write converts the itemized tables to text
+    if config.write_to_dashboard:
+        tmpdf = plan.loc[plan['frame'].isin(['cost_items', 'LCA_items']), :].copy()
+        tmpdf['frame'] = tmpdf['frame'] + ' (astype str)'
+        tmpdf['est_GB'] = tmpdf['rows'] * tmpdf['cols'] * plan_bytes_per_str_cell / 1E9
+        plan = pd.concat([plan, tmpdf], ignore_index=True)
+
+    # results are held together, with a working copy of the largest frame in merges and concatenations
+    peak = plan.loc[~plan['frame'].str.contains('astype'), 'est_GB'].sum() + plan['est_GB'].max()
+    plan = pd.concat([plan, pd.DataFrame([{'frame': 'peak', 'rows': np.nan, 'cols': np.nan, 'est_GB': peak}])],
+                     ignore_index=True)
+    plan[['rows', 'cols']] = plan[['rows', 'cols']].astype('Int64')
+    return plan
+
+
+# Refuse a run whose estimated peak memory exceeds the budget, suggesting the number of chunks to run.
+# With refuse = False, a warning is printed instead.
+def check_memory_budget(plan, memory_budget_GB, refuse=True):
+    peak = plan.loc[plan['frame'] == 'peak', 'est_GB'].iloc[0]
+    if peak <= memory_budget_GB:
+        return
+    n_chunks = int(np.ceil(peak / memory_budget_GB))
+    message = 'Estimated peak memory of ' + '{:.1f}'.format(peak) + ' GB exceeds the budget of ' + \
+              str(memory_budget_GB) + ' GB. Consider running in ' + str(n_chunks) + \
+              ' chunks: pathways in partitions (run_model_parallel), production years or variability parameters in batches ..'
+    if refuse:
+        raise MemoryError(message)
+    print('Warning: ' + message)
+
+
+# %%
+# Incremental model run, recomputing only pathways whose Db rows changed since the last run
+
+# result tables holding rows per pathway, spliced on incremental runs
+pathway_tables = ['cost_items', 'MFSP_agg', 'LCA_items', 'LCA_items_agg', 'MAC_df', 'scale_up']
+
+# toggles not affecting model results, or handled per pathway, excluded from the snapshot key
+snapshot_config_exclude = ['pathways_to_consider', 'save_interim_files', 'write_to_dashboard',
+                           'f_model', 'variability_batch_size', 'input_path_prefix', 'input_path_decarb_model',
+                           'output_path_prefix']
+
+
+# Hash of the Db rows of each pathway
+def pathway_digests(df_econ):
+    row_hash = pd.util.hash_pandas_object(df_econ, index=False).values
+    digests = {}
+    for case, idx in df_econ.groupby('Case/Scenario', sort=False, observed=True).indices.items():
+        digests[case] = hashlib.sha1(row_hash[idx].tobytes()).hexdigest()
+    return digests
+
+
+# Hash of the run configuration and of the inputs used by the run other than the Db sheet
+def snapshot_key(config, inputs):
+    params = {k: v for k, v in config.params().items() if k not in snapshot_config_exclude}
+    bundle = {k: getattr(inputs, k) for k in needed_inputs(config) if k != 'df_econ'}
+    return hash_object([params, bundle])
+
+
+def write_snapshot(snapshot_path, key, digests, results):
+    os.makedirs(snapshot_path, exist_ok=True)
+    tables = []
+    for k, v in results.items():
+        if v is not None:
+            v.to_pickle(snapshot_path + '/' + k + '.pkl')
+            tables.append(k)
+    # meta file is written last, the snapshot is only valid once all tables are on disk
+    with open(snapshot_path + '/snapshot.json', 'w') as fh:
+        json.dump({'key': key, 'pathways': digests, 'tables': tables}, fh)
+
+
+def read_snapshot(snapshot_path):
+    if not os.path.isfile(snapshot_path + '/snapshot.json'):
+        return None, None
+    with open(snapshot_path + '/snapshot.json') as fh:
+        meta = json.load(fh)
+    results = {k: None for k in pathway_tables + ['decarb_elec_CI', 'corr_itemized_LCA']}
+    for k in meta['tables']:
+        results[k] = pd.read_pickle(snapshot_path + '/' + k + '.pkl')
+    return meta, results
+
+
+# Function to run the model recomputing only the pathways whose Db rows changed since the snapshot
+# of the last run. Results of unchanged pathways are taken from the snapshot. When the configuration
+# or any other input changed, or there is no snapshot, the model is run for all pathways.
+def run_model_incremental(config, inputs, snapshot_path, cache=None, profiler=None):
+
+    df_econ = select_pathways(config, inputs.df_econ)
+    digests = pathway_digests(df_econ)
+    key = snapshot_key(config, inputs)
+
+    meta, last = read_snapshot(snapshot_path)
+
+    if meta is None or meta['key'] != key:
+        print('Incremental run: no matching snapshot, running all pathways ..')
+        results = run_model(config.copy(save_interim_files=False), inputs, cache, profiler)
+        write_snapshot(snapshot_path, key, digests, results)
+        if config.save_interim_files:
+            save_interim(config, results)
+        return results
+
+    changed = [case for case, d in digests.items() if meta['pathways'].get(case) != d]
+    removed = [case for case in meta['pathways'] if case not in digests]
+
+    # biopower scenarios are adjusted to their baselines, so they are recomputed together
+    if config.adjust_biopower_baseline and any(case in config.biopower_scenarios for case in changed + removed):
+        changed = changed + [case for case in digests if case in config.biopower_scenarios and case not in changed]
+
+    print('Incremental run: recomputing ' + str(len(changed)) + ' of ' + str(len(digests)) + ' pathways ..')
+
+    if len(changed) + len(removed) == 0:
+        if config.save_interim_files:
+            save_interim(config, last)
+        return last
+
+    results = dict(last)
+    if len(changed) > 0:
+        new = run_model(config.copy(pathways_to_consider=changed, save_interim_files=False), inputs, cache, profiler)
+        results['decarb_elec_CI'] = new['decarb_elec_CI']
+        results['corr_itemized_LCA'] = new['corr_itemized_LCA']
+    else:
+        new = {k: None for k in pathway_tables}
+
+    # splice recomputed pathways into the last results, ordered as the pathways in df_econ
+    case_order = {case: i for i, case in enumerate(digests)}
+    for k in pathway_tables:
+        if last[k] is None and new[k] is None:
+            continue
+        frames = []
+        if last[k] is not None:
+            frames.append(last[k].loc[~last[k]['Case/Scenario'].isin(changed + removed)])
+        if new[k] is not None:
+            frames.append(new[k])
+        tbl = pd.concat(frames, ignore_index=True)
+        order = np.argsort(tbl['Case/Scenario'].map(case_order).values, kind='stable')
+        results[k] = tbl.iloc[order].reset_index(drop=True)
+
+    write_snapshot(snapshot_path, key, digests, results)
+
+    if config.save_interim_files:
+        save_interim(config, results)
+
+    return results
+
+
+# %%
+# Parallel model run, with pathways partitioned over worker processes
+
+# Split pathways into contiguous partitions of about equal number of Db rows. Biopower scenarios
+# are kept in one partition when they are adjusted to their baselines.
+def partition_pathways(config, df_econ, n_partitions):
+    rows = df_econ.groupby('Case/Scenario', sort=False, observed=True).size()
+    units = [[case] for case in rows.index if not (config.adjust_biopower_baseline and case in config.biopower_scenarios)]
+    biopower = [case for case in rows.index if config.adjust_biopower_baseline and case in config.biopower_scenarios]
+    if len(biopower) > 0:
+        units.append(biopower)
+
+    n_partitions = max(1, min(n_partitions, len(units)))
+    target = rows.sum() / n_partitions
+    partitions = [[]]
+    size = 0
+    for u in units:
+        if size >= target * len(partitions) and len(partitions) < n_partitions:
+            partitions.append([])
+        partitions[-1] += u
+        size += rows[u].sum()
+    return [p for p in partitions if len(p) > 0]
+
+
+# Input bundle restricted to the Db rows of the given pathways, and to the LCI rows of the
+# flows of these pathways and of the replaced fuels
+def partition_inputs(inputs, cases):
+    keys = ['Parameter_B', 'Stream_Flow', 'Stream_LCA']
+    df_econ = inputs.df_econ.loc[inputs.df_econ['Case/Scenario'].isin(cases), :]
+    used = LCI_keys_used(df_econ, inputs.corr_fuel_replaced_GREET_pathway)
+    LCI = inputs.corr_itemized_LCA.merge(used, how='left', on=keys, indicator=True)
+    LCI = inputs.corr_itemized_LCA.loc[(LCI['_merge'] == 'both').values, :]
+
+    return inputs.copy(df_econ=df_econ, corr_itemized_LCA=LCI)
+
+
+# Function to run the model with pathways partitioned over max_workers processes. Every partition
+# runs all stages, as the stages only combine rows within a pathway, and the result tables of the
+# partitions are concatenated in the order of the pathways.
+def run_model_parallel(config, inputs, max_workers=None):
+
+    if max_workers is None:
+        max_workers = os.cpu_count()
+
+    df_econ = select_pathways(config, inputs.df_econ)
+    partitions = partition_pathways(config, df_econ, max_workers)
+
+    # inputs not read yet are read once here rather than in every worker
+    inputs.load(needed_inputs(config))
+
+    print('Parallel run: ' + str(df_econ['Case/Scenario'].nunique()) + ' pathways in ' +
+          str(len(partitions)) + ' partitions ..')
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(run_model,
+                                   config.copy(pathways_to_consider=cases, save_interim_files=False),
+                                   partition_inputs(inputs, cases))
+                   for cases in partitions]
+        parts = [f.result() for f in futures]
+
+    results = {}
+    for k in pathway_tables:
+        frames = [r[k] for r in parts if r[k] is not None]
+        results[k] = pd.concat(frames, ignore_index=True) if len(frames) > 0 else None
+    results['decarb_elec_CI'] = parts[0]['decarb_elec_CI']
+    results['corr_itemized_LCA'] = pd.concat([r['corr_itemized_LCA'] for r in parts],
+                                             ignore_index=True).drop_duplicates().reset_index(drop=True)
+
+    if config.save_interim_files:
+        save_interim(config, results)
+
+    return results
+
+
 # %%
 # write data to the model dashboard tabs
 
-if write_to_dashboard:
+def write_dashboard(config, inputs, results):
+
     print('Writing to Dashboard ..')
 
-    pathway_names.rename(
-        columns={'process|feedstock|product yield': 'Pathway Short Form'}, inplace=True)
+    cost_items = results['cost_items']
+    MFSP_agg = results['MFSP_agg']
+    LCA_items = results['LCA_items']
+    LCA_items_agg = results['LCA_items_agg']
+    MAC_df = results['MAC_df']
+    scale_up = results['scale_up']
+    decarb_elec_CI = results['decarb_elec_CI']
+    corr_itemized_LCA = results['corr_itemized_LCA']
+
+    pathway_names = inputs.pathway_names.rename(
+        columns={'process|feedstock|product yield': 'Pathway Short Form'})
     LCA_items = pd.merge(LCA_items, pathway_names[['Case/Scenario', 'Pathway Short Form']],
                          how='left', on='Case/Scenario').reset_index(drop=True)
     cost_items = pd.merge(cost_items, pathway_names[['Case/Scenario', 'Pathway Short Form']],
@@ -2039,19 +3140,21 @@ if write_to_dashboard:
                         how='left', on='Case/Scenario').reset_index(drop=True)
     MAC_df = pd.merge(MAC_df, pathway_names[['Case/Scenario', 'Pathway Short Form']],
                       how='left', on='Case/Scenario').reset_index(drop=True)
-    if consider_scale_up_study:
+    if config.consider_scale_up_study:
         scale_up = pd.merge(scale_up, pathway_names[['Case/Scenario', 'Pathway Short Form']],
                           how='left', on='Case/Scenario').reset_index(drop=True)
 
-    # with ExcelApp() as app:
+    import xlwings as xw
+
+    # with excel_app() as app:
     with xw.App(visible=False) as app:
 
-        wb = xw.Book(input_path_model + '/' + f_model)
+        wb = xw.Book(config.input_path_model + '/' + config.f_model)
         wb.app.calculation = 'manual'
         wb.app.screen_updating = False
         # wb.app.raw_value = True
 
-        if consider_scale_up_study:
+        if config.consider_scale_up_study:
             sheet_1 = wb.sheets['scale_up']
             sheet_1.range(str(4) + ':1048576').clear_contents()
             sheet_1['A4'].options(index=False, chunksize=10000).value =\
@@ -2095,7 +3198,7 @@ if write_to_dashboard:
                            'net_primary_fuel_produced: Unit'
                     ]]
 
-        elif consider_variability_study & (consider_which_variabilities == 'Cost_Item'):
+        elif config.consider_variability_study & (config.consider_which_variabilities == 'Cost_Item'):
             
             sheet_1 = wb.sheets['lca']
             sheet_1.range(str(4) + ':1048576').clear_contents()
@@ -2277,11 +3380,11 @@ if write_to_dashboard:
                             ]]
             else:
                 print(f"⚠️ DataFrame too big for Excel ({len(cost_items)} rows). Writing to parquet instead: dashboard_mfsp_itm_var.parquet")                
-                cost_items.to_parquet(input_path_model + "/" + "dashboard_mfsp_itm_var.parquet", index=False)
+                cost_items.to_parquet(config.input_path_model + "/" + "dashboard_mfsp_itm_var.parquet", index=False)
                 print(f"✅ Parquet file saved: dashboard_mfsp_itm_var.parquet")
             
             
-        elif consider_variability_study & (consider_which_variabilities == 'Stream_LCA'):
+        elif config.consider_variability_study & (config.consider_which_variabilities == 'Stream_LCA'):
 
             print ('writing to sheet lca_var')
             sheet_1 = wb.sheets['lca_var']
@@ -2418,7 +3521,7 @@ if write_to_dashboard:
                             ]]
             else:
                 print(f"⚠️ DataFrame too big for Excel ({len(LCA_items)} rows). Writing to Parquet instead: dashboard_LCA_items.parquet")                
-                LCA_items.to_parquet(input_path_model + "/" + "dashboard_LCA_items.parquet", index=False)
+                LCA_items.to_parquet(config.input_path_model + "/" + "dashboard_LCA_items.parquet", index=False)
                 print(f"✅ Parquet file saved: dashboard_LCA_items.parquet")
 
             print ('writing to sheet mfsp_itm')
@@ -2608,7 +3711,7 @@ if write_to_dashboard:
                             ]]
 
         # Write out electric grid CI at every run
-        if decarb_electric_grid:            
+        if config.decarb_electric_grid:            
             # sheet_1 = wb.sheets['EPS_CI']
             wb.sheets['EPS_CI'].range(str(4) + ':1048576').clear_contents()
             wb.sheets['EPS_CI']['A4'].options(index=False, chunksize=10000).value =\
@@ -2640,7 +3743,79 @@ if write_to_dashboard:
         wb.close()
 
 
-print('    Elapsed time: ' + str(datetime.now() - init_time))
+# %%
+# Run the model with the parameters declared above
+
+if __name__ == '__main__':
+
+    config = model_config()
+
+    profiler = None
+    tracking = nullcontext()
+    if profile_stages or '--profile' in sys.argv:
+        profiler = stage_profiler()
+        tracking = profiler.track(model_units, 'unit_convert_df')
+
+    # stages outside run_model are profiled as well
+    def run(func, *args):
+        return func(*args) if profiler is None else profiler.run(func, *args)
+
+    sheets = sheet_cache(sheet_cache_path) if use_sheet_cache else None
+    LCI_store = LCI_store_path if use_LCI_store else None
+    EF_store = EF_store_path if use_EF_store else None
+
+    if dry_run or '--dry-run' in sys.argv:
+        var_p = read_var_p(config, sheets) if config.consider_variability_study else None
+        bm = read_BT16_availability(config, sheets) if config.consider_scale_up_study else None
+        plan = plan_expansion(config, read_db(config, sheets, config.pathways_to_consider), var_p,
+                              read_LCI_keys(config, LCI_store), bm)
+        print(plan.to_string(index=False, float_format='{:.3f}'.format))
+        check_memory_budget(plan, memory_budget_GB)
+        sys.exit(0)
+
+    init_time = datetime.now()
+
+    with tracking:
+
+        if use_input_bundle and bundle_is_current(config, input_bundle_path, LCI_store):
+            inputs = run(load_bundled_inputs, config, input_bundle_path, sheets, LCI_store, EF_store,
+                         units_cache_path=units_cache_path)
+        else:
+            inputs = run(load_inputs, config, False, sheets, None, LCI_store, EF_store, units_cache_path)
+            if use_input_bundle:
+                bundle_inputs(config, inputs, input_bundle_path, LCI_store, input_bundle_version)
+
+        check_memory_budget(plan_expansion(config, inputs.df_econ,
+                                           inputs.corr_params_variability if config.consider_variability_study else None,
+                                           inputs.corr_itemized_LCA[LCI_key_columns],
+                                           inputs.bm if config.consider_scale_up_study else None), memory_budget_GB,
+                            refuse_over_budget_runs)
+
+        cache = None
+        if use_stage_cache:
+            cache = stage_cache(stage_cache_path)
+
+        if use_incremental_run:
+            results = run_model_incremental(config, inputs, snapshot_path, cache, profiler)
+        elif parallel_workers > 0:
+            results = run_model_parallel(config, inputs, parallel_workers)
+        else:
+            results = run_model(config, inputs, cache, profiler,
+                                checkpoint_path if use_variability_checkpoints else None)
+
+        print('    Elapsed time: ' + str(datetime.now() - init_time))
+
+        if config.write_to_dashboard:
+            run(write_dashboard, config, inputs, results)
+
+        print('    Elapsed time: ' + str(datetime.now() - init_time))
+
+    inputs.manifest().to_csv(config.output_path_prefix + '/' + f_out_manifest, index=False)
+
+    if profiler is not None:
+        profiler.save(config.output_path_prefix + '/' + f_out_profile)
+        if '--profile' in sys.argv:
+            print(profiler.summary().to_string(float_format='{:.2f}'.format))
 
 # %%
 
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright © 2025, UChicago Argonne, LLC
+The full description is available in the LICENSE file at location:
+    https://github.com/Saurajyoti/BestBiomassUse/blob/master/LICENSE
+
+@Project: Best Use of Biomass
+@Title: Per-stage profiling of model runs
+@Authors: Saurajyoti Kar
+@Contact: skar@anl.gov
+@Affiliation: Argonne National Laboratory
+
+"""
+
+"""
+The stage profiler records, for every model stage run through it, the wall
+time, CPU time, the increase of the peak resident memory of the process and
+the rows and columns of the data frames going in and out of the stage. Methods
+called from within stages, such as the unit conversions, can be tracked as well
+to see their share of the run. The profile is written to CSV and JSON files.
+
+"""
+
+import json
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+
+# Peak resident memory of the process in bytes, None when it can not be measured
+def peak_rss():
+    try:
+        import psutil
+        mi = psutil.Process().memory_info()
+        if hasattr(mi, 'peak_wset'):  # Windows
+            return mi.peak_wset
+    except ImportError:
+        pass
+    try:
+        import resource
+        import sys
+        r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return r if sys.platform == 'darwin' else r * 1024
+    except ImportError:
+        return None
+
+
+# Total rows and columns of the data frames among objs
+def frame_size(objs):
+    frames = [o for o in objs if isinstance(o, (pd.DataFrame, pd.Series))]
+    rows = sum(f.shape[0] for f in frames)
+    cols = sum(f.shape[1] if isinstance(f, pd.DataFrame) else 1 for f in frames)
+    return rows, cols
+
+
+class stage_profiler:
+    """Records wall time, CPU time, peak memory increase and frame sizes of model stages"""
+
+    def __init__(self):
+        self.records = []
+
+    # Run func(*args) through runner, recording the stage profile
+    def run(self, func, *args, runner=None):
+        rows_in, cols_in = frame_size(args)
+        rss_0 = peak_rss()
+        wall_0 = time.perf_counter()
+        cpu_0 = time.process_time()
+
+        out = func(*args) if runner is None else runner(func, *args)
+
+        wall = time.perf_counter() - wall_0
+        cpu = time.process_time() - cpu_0
+        rss_1 = peak_rss()
+        rows_out, cols_out = frame_size(out if isinstance(out, tuple) else (out,))
+        self.records.append({
+            'stage': func.__name__,
+            'calls': 1,
+            'wall_s': wall,
+            'cpu_s': cpu,
+            'peak_rss_delta_MB': None if rss_0 is None else (rss_1 - rss_0) / 2**20,
+            'rows_in': rows_in,
+            'cols_in': cols_in,
+            'rows_out': rows_out,
+            'cols_out': cols_out})
+        return out
+
+    # Returns a stage runner with the same call signature as runner, recording the stage profiles
+    def wrap(self, runner):
+        def run(func, *args):
+            return self.run(func, *args, runner=runner)
+        return run
+
+    # Track all calls of a method of a class while in the context, recorded as one row with the
+    # number of calls. Time spent in tracked methods is also included in the stages calling them.
+    @contextmanager
+    def track(self, cls, name):
+        method = getattr(cls, name)
+        rec = {'stage': cls.__name__ + '.' + name, 'calls': 0, 'wall_s': 0., 'cpu_s': 0.,
+               'peak_rss_delta_MB': None, 'rows_in': 0, 'cols_in': None, 'rows_out': None, 'cols_out': None}
+
+        def tracked(*args, **kwargs):
+            wall_0 = time.perf_counter()
+            cpu_0 = time.process_time()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                rec['calls'] += 1
+                rec['wall_s'] += time.perf_counter() - wall_0
+                rec['cpu_s'] += time.process_time() - cpu_0
+                rec['rows_in'] += frame_size(args)[0]
+
+        setattr(cls, name, tracked)
+        try:
+            yield rec
+        finally:
+            setattr(cls, name, method)
+            self.records.append(rec)
+
+    def to_frame(self):
+        return pd.DataFrame(self.records, columns=['stage', 'calls', 'wall_s', 'cpu_s', 'peak_rss_delta_MB',
+                                                   'rows_in', 'cols_in', 'rows_out', 'cols_out'])
+
+    # Write the profile to <path_prefix>.csv and <path_prefix>.json
+    def save(self, path_prefix):
+        self.to_frame().to_csv(path_prefix + '.csv', index=False)
+        with open(path_prefix + '.json', 'w') as fh:
+            json.dump(self.records, fh, indent=1)
+
+    # Summary table of stages by wall time, with the share of the total of the stages
+    def summary(self):
+        df = self.to_frame()
+        df['wall_%'] = 100 * df['wall_s'] / df.loc[df['stage'].str.find('.') < 0, 'wall_s'].sum()
+        return df.sort_values('wall_s', ascending=False).reset_index(drop=True)
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright © 2025, UChicago Argonne, LLC
+The full description is available in the LICENSE file at location:
+    https://github.com/Saurajyoti/BestBiomassUse/blob/master/LICENSE
+
+@Project: Best Use of Biomass
+@Title: Scenario sweep over main_2 model toggles
+@Authors: Saurajyoti Kar
+@Contact: skar@anl.gov
+@Affiliation: Argonne National Laboratory
+
+"""
+
+"""
+Runs the main_2 model for a list, or the product, of toggle settings. The
+inputs are read once and shared with the worker processes, which run the
+scenarios in parallel. The result tables of all scenarios are written to one
+file per table, keyed by scenario id and the toggle values of the scenario.
+
+"""
+
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import main_2
+
+# Toggle values swept when the script is run, all combinations are run
+sweep_toggles = {
+    'allocation_type': ['Energy', 'Hybrid'],
+    'consider_coproduct_cost_credit': [True, False],
+    'consider_coproduct_env_credit': [True, False],
+    'decarb_electric_grid': [False, True],
+    'harmonize_CCS_fossil': [True, False],
+    'adjust_biopower_baseline': [False, True],
+}
+
+# Result tables written for every scenario
+sweep_tables = ['MFSP_agg', 'LCA_items_agg', 'MAC_df', 'scale_up']
+
+# Inputs shared by the scenarios run in a worker process
+_sweep_inputs = None
+
+
+# List of scenarios, one dictionary of toggle values for every combination of the given values
+def toggle_matrix(toggles):
+    names = list(toggles.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*toggles.values())]
+
+
+# Configuration with the optional inputs needed by any of the scenarios toggled on
+def loading_config(config, scenarios):
+    return config.copy(**{t: any(sc.get(t, getattr(config, t)) for sc in scenarios)
+                          for t in ['consider_variability_study', 'consider_scale_up_study', 'decarb_electric_grid']})
+
+
+def _init_worker(inputs):
+    global _sweep_inputs
+    _sweep_inputs = inputs
+
+
+def _run_scenario(config):
+    results = main_2.run_model(config, _sweep_inputs)
+    return {k: results[k] for k in sweep_tables}
+
+
+# Key columns of a scenario, list toggle values are written as text
+def scenario_keys(scenario_id, scenario):
+    keys = {'scenario_id': scenario_id}
+    for k, v in scenario.items():
+        keys[k] = str(v) if isinstance(v, (list, tuple)) else v
+    return keys
+
+
+# Function to run the model for every scenario, in max_workers processes or in this process
+# when max_workers is 0. Returns a dictionary of the result tables of all scenarios, with the
+# scenario keys prepended, and writes them to the output folder when f_out_path is given.
+def run_sweep(config, inputs, scenarios, max_workers=None, f_out_path=None):
+
+    configs = [config.copy(**sc, save_interim_files=False, write_to_dashboard=False) for sc in scenarios]
+
+    print('Scenario sweep: running ' + str(len(configs)) + ' scenarios ..')
+
+    # inputs not read yet are read once here rather than in every worker
+    inputs.load([n for c in configs for n in main_2.needed_inputs(c)])
+
+    if max_workers == 0:
+        _init_worker(inputs)
+        parts = [_run_scenario(c) for c in configs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(inputs,)) as executor:
+            parts = list(executor.map(_run_scenario, configs))
+
+    results = {}
+    for k in sweep_tables:
+        frames = []
+        for i, (sc, r) in enumerate(zip(scenarios, parts)):
+            if r[k] is None:
+                continue
+            keys = scenario_keys(i, sc)
+            frames.append(pd.concat([pd.DataFrame(keys, index=r[k].index), r[k]], axis=1))
+        results[k] = pd.concat(frames, ignore_index=True) if len(frames) > 0 else None
+
+    if f_out_path is not None:
+        os.makedirs(f_out_path, exist_ok=True)
+        pd.DataFrame([scenario_keys(i, sc) for i, sc in enumerate(scenarios)]).to_csv(
+            f_out_path + '/sweep_scenarios.csv', index=False)
+        for k, df in results.items():
+            if df is not None:
+                df.to_parquet(f_out_path + '/sweep_' + k + '.parquet', index=False)
+        print('Scenario sweep: results written to ' + f_out_path)
+
+    return results
+
+
+if __name__ == '__main__':
+
+    config = main_2.model_config()
+    scenarios = toggle_matrix(sweep_toggles)
+
+    sheets = main_2.sheet_cache(main_2.sheet_cache_path) if main_2.use_sheet_cache else None
+    LCI_store = main_2.LCI_store_path if main_2.use_LCI_store else None
+    EF_store = main_2.EF_store_path if main_2.use_EF_store else None
+    inputs = main_2.load_inputs(loading_config(config, scenarios), False, sheets, None, LCI_store, EF_store,
+                                main_2.units_cache_path)
+
+    run_sweep(config, inputs, scenarios, f_out_path=config.output_path_prefix + '/sweep')
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright © 2025, UChicago Argonne, LLC
+The full description is available in the LICENSE file at location:
+    https://github.com/Saurajyoti/BestBiomassUse/blob/master/LICENSE
+
+@Project: Best Use of Biomass
+@Title: Columnar cache of workbook sheets read by the model
+@Authors: Saurajyoti Kar
+@Contact: skar@anl.gov
+@Affiliation: Argonne National Laboratory
+
+"""
+
+"""
+Parsing sheets of large Excel workbooks is the slowest step of loading the
+model inputs. The sheet cache converts a sheet to a parquet file the first time
+it is read, and serves later reads from the parquet file as long as the
+workbook is unchanged. A cached sheet is keyed by the workbook name, the sheet
+name and the read options. It is valid while the size and modification time of
+the workbook match the ones stored with it; when they differ, the workbook is
+hashed and the cached sheet is still used if the contents are unchanged.
+
+Sheets not in the cache are parsed in one pass over the workbook, with the
+calamine engine when python-calamine is installed.
+
+Columns and rows of a sheet can be selected on read. Selections are not part of
+the key: the whole sheet is cached, and selections are pushed down to the
+parquet read of cached sheets, so only the selected columns are decoded and
+rows are filtered before conversion to a data frame.
+
+Large sheets of which a model run needs a few rows can instead be streamed:
+the rows are read one at a time from the read-only workbook and filtered while
+the sheet is parsed, and only the filtered rows are cached, keyed by the
+filters.
+
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+
+import pandas as pd
+
+# Rust based Excel reader, much faster than openpyxl, used when installed
+excel_engine = 'calamine' if importlib.util.find_spec('python_calamine') is not None else None
+
+
+# SHA1 hash of the contents of a file
+def hash_file(f, block_size=2**20):
+    h = hashlib.sha1()
+    with open(f, 'rb') as fh:
+        for block in iter(lambda: fh.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+# Select columns, and rows with values of the isin = (column, values) pair among values
+def select_frame(df, columns=None, isin=None):
+    if isin is not None:
+        df = df.loc[df[isin[0]].isin(isin[1]), :].reset_index(drop=True)
+    if columns is not None:
+        df = df[columns]
+    return df
+
+
+# Read several sheets of the workbook f, opening and parsing the workbook once.
+# sheets is a dictionary of sheet name to the pd.read_excel options of the sheet, and select an
+# optional dictionary of sheet name to the select_frame options of the sheet.
+def read_workbook(f, sheets, engine=excel_engine, select=None):
+    select = {} if select is None else select
+    with pd.ExcelFile(f, engine=engine) as xl:
+        return {sheet_name: select_frame(xl.parse(sheet_name, **read_kwargs), **select.get(sheet_name, {}))
+                for sheet_name, read_kwargs in sheets.items()}
+
+
+# Value of a cell as read by pd.read_excel, whole numbers as integers and empty cells as NaN
+def _cell_value(v):
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    return float('nan') if v is None or v == '' else v
+
+
+# Rows of a sheet of the workbook f as lists of cell values, converted to python one row at a time.
+# calamine starts rows at the first used column, rows are padded to start at column A.
+def iter_sheet_rows(f, sheet_name, engine=excel_engine):
+    if engine == 'calamine':
+        from python_calamine import CalamineWorkbook
+        sheet = CalamineWorkbook.from_path(f).get_sheet_by_name(sheet_name)
+        pad = [''] * (0 if sheet.start is None else sheet.start[1])
+        for row in sheet.iter_rows():
+            yield pad + row
+    else:
+        import openpyxl
+        wb = openpyxl.load_workbook(f, read_only=True, data_only=True)
+        try:
+            yield from wb[sheet_name].iter_rows(values_only=True)
+        finally:
+            wb.close()
+
+
+# Stream the rows below the header row of a sheet of the workbook f, keeping the rows whose values
+# equal the values of filters, a dictionary of column name to value, and the given columns. Rows
+# are filtered as they are converted from the workbook, so only the kept rows are held as python
+# objects. The frame read matches pd.read_excel of the sheet with the same header, filtered to the
+# same rows and columns.
+def stream_sheet(f, sheet_name, header=0, filters=None, columns=None, engine=excel_engine):
+    filters = {} if filters is None else filters
+    rows = iter_sheet_rows(f, sheet_name, engine)
+    try:
+        for _ in range(header):
+            next(rows, None)
+        names = ['Unnamed: ' + str(i) if v is None or v == '' else _cell_value(v) for i, v in enumerate(next(rows, ()))]
+        columns = names if columns is None else columns
+        missing = [c for c in list(filters) + list(columns) if c not in names]
+        if len(missing) > 0:
+            raise KeyError('Columns not in sheet ' + str(sheet_name) + ' of ' + os.path.basename(f) + ': ' + str(missing))
+        tests = [(names.index(c), v) for c, v in filters.items()]
+        keep = [names.index(c) for c in columns]
+        data = []
+        for row in rows:
+            if all(i < len(row) and _cell_value(row[i]) == v for i, v in tests):
+                data.append([_cell_value(row[i]) if i < len(row) else float('nan') for i in keep])
+    finally:
+        rows.close()
+    return pd.DataFrame(data, columns=columns).infer_objects()
+
+
+class sheet_cache:
+    """Parquet cache of workbook sheets keyed by workbook size, modification time and hash"""
+
+    def __init__(self, cache_path, verbose=True):
+        self.cache_path = cache_path
+        self.verbose = verbose
+        os.makedirs(cache_path, exist_ok=True)
+        self.hits = []
+        self.misses = []
+
+    # Key of a sheet read, from the workbook name, sheet name and read options
+    def key(self, f, sheet_name, read_kwargs):
+        parts = [os.path.basename(f), str(sheet_name)] + [k + '=' + repr(read_kwargs[k]) for k in sorted(read_kwargs)]
+        return hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+    # Stored meta data of a key when the workbook f is unchanged since the sheet was cached, else None
+    def _valid_meta(self, f, key):
+        f_meta = self.cache_path + '/' + key + '.json'
+        if not os.path.isfile(f_meta):
+            return None
+        with open(f_meta) as fh:
+            meta = json.load(fh)
+        st = os.stat(f)
+        if meta['size'] == st.st_size and meta['mtime_ns'] == st.st_mtime_ns:
+            return meta
+        if meta['size'] != st.st_size or meta['sha1'] != hash_file(f):
+            return None
+        # workbook saved again without changes
+        meta['mtime_ns'] = st.st_mtime_ns
+        with open(f_meta, 'w') as fh:
+            json.dump(meta, fh)
+        return meta
+
+    def _write(self, f, key, df):
+        st = os.stat(f)
+        df.to_parquet(self.cache_path + '/' + key + '.parquet')
+        # parquet infers types of object columns, original types are restored on read
+        meta = {'file': os.path.basename(f), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha1': hash_file(f),
+                'columns': [str(c) for c in df.columns], 'dtypes': [str(dt) for dt in df.dtypes]}
+        # meta file is written last, a key is only valid once its sheet is on disk
+        with open(self.cache_path + '/' + key + '.json', 'w') as fh:
+            json.dump(meta, fh)
+
+    def _read(self, key, meta, columns=None, isin=None):
+        filters = None if isin is None or len(isin[1]) == 0 else [(isin[0], 'in', list(isin[1]))]
+        df = pd.read_parquet(self.cache_path + '/' + key + '.parquet', columns=columns, filters=filters)
+        if isin is not None:
+            # an empty list of values can not be typed in a parquet filter
+            df = df.iloc[:0] if len(isin[1]) == 0 else df
+            df = df.reset_index(drop=True)
+        dtypes = dict(zip(meta['columns'], meta['dtypes']))
+        for i, c in enumerate(df.columns):
+            if str(df.dtypes.iloc[i]) != dtypes[str(c)]:
+                df.isetitem(i, df.iloc[:, i].astype(dtypes[str(c)]))
+        return df
+
+    # Read several sheets of the workbook f, from the cache when the workbook is unchanged. The sheets
+    # not in the cache are parsed in one pass over the workbook, see read_workbook for the options.
+    def read_sheets(self, f, sheets, select=None):
+        select = {} if select is None else select
+        out = {}
+        missing = {}
+        for sheet_name, read_kwargs in sheets.items():
+            key = self.key(f, sheet_name, read_kwargs)
+            meta = self._valid_meta(f, key)
+            if meta is None:
+                missing[sheet_name] = read_kwargs
+                continue
+            self.hits.append(sheet_name)
+            if self.verbose:
+                print('Sheet cache: reading ' + os.path.basename(f) + ' [' + str(sheet_name) + '] from cache ..')
+            out[sheet_name] = self._read(key, meta, **select.get(sheet_name, {}))
+
+        if len(missing) > 0:
+            for sheet_name, df in read_workbook(f, missing).items():
+                self._write(f, self.key(f, sheet_name, missing[sheet_name]), df)
+                self.misses.append(sheet_name)
+                out[sheet_name] = select_frame(df, **select.get(sheet_name, {}))
+
+        return {sheet_name: out[sheet_name] for sheet_name in sheets}
+
+    # Stream the rows of a sheet matching filters with stream_sheet, or read them from the cache when
+    # the workbook is unchanged
+    def read_filtered(self, f, sheet_name, header=0, filters=None, columns=None):
+        key = self.key(f, sheet_name, {'header': header, 'filters': filters, 'columns': columns, 'stream': True})
+        meta = self._valid_meta(f, key)
+        if meta is not None:
+            self.hits.append(sheet_name)
+            if self.verbose:
+                print('Sheet cache: reading filtered ' + os.path.basename(f) + ' [' + str(sheet_name) + '] from cache ..')
+            return self._read(key, meta)
+        df = stream_sheet(f, sheet_name, header, filters, columns)
+        self._write(f, key, df)
+        self.misses.append(sheet_name)
+        return df
+
+    # Read a sheet of the workbook f, or from the cache when the workbook is unchanged
+    def read_excel(self, f, sheet_name, columns=None, isin=None, **read_kwargs):
+        return self.read_sheets(f, {sheet_name: read_kwargs}, {sheet_name: {'columns': columns, 'isin': isin}})[sheet_name]
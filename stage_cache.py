@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright © 2025, UChicago Argonne, LLC
+The full description is available in the LICENSE file at location:
+    https://github.com/Saurajyoti/BestBiomassUse/blob/master/LICENSE
+
+@Project: Best Use of Biomass
+@Title: Content-addressed cache of model stage outputs
+@Authors: Saurajyoti Kar
+@Contact: skar@anl.gov
+@Affiliation: Argonne National Laboratory
+
+"""
+
+"""
+Each model stage is a function of data frames and run toggles. The stage cache
+keys a stage run by a hash of the stage code, the toggles the stage refers to
+and the contents of its input data, and stores the stage output as parquet
+files under the cache folder. When the key of a stage is unchanged on a re-run,
+the output is read back instead of being recomputed.
+
+Outputs of cached stages are keyed by the key of the stage that produced them,
+so frames passed along the pipeline are hashed only once.
+
+"""
+
+import hashlib
+import inspect
+import json
+import numbers
+import os
+import pickle
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+# Hash the contents of a data frame or series, including its index and column labels
+def hash_frame(df):
+    h = hashlib.sha1()
+    h.update(type(df).__name__.encode())
+    if isinstance(df, pd.DataFrame):
+        h.update(repr(list(df.columns)).encode())
+        h.update(repr([str(dt) for dt in df.dtypes]).encode())
+    else:
+        h.update(repr((df.name, str(df.dtype))).encode())
+    h.update(repr(list(df.index.names)).encode())
+    if df.shape[0] > 0:
+        try:
+            h.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+        except TypeError:
+            # unhashable cell values, e.g. lists
+            h.update(pickle.dumps(df, protocol=4))
+    return h.hexdigest()
+
+
+# Hash of any python object. Data frames are hashed by content, other objects by their attributes.
+# Hashes of frames and objects are remembered in memo by object identity.
+def hash_object(obj, memo=None):
+    if obj is None or isinstance(obj, (str, bool, numbers.Number, np.generic)):
+        return repr(obj)
+    if isinstance(obj, (list, tuple, set)):
+        items = sorted(obj, key=repr) if isinstance(obj, set) else obj
+        return hashlib.sha1(repr([hash_object(v, memo) for v in items]).encode()).hexdigest()
+    if isinstance(obj, dict):
+        return hashlib.sha1(repr([(repr(k), hash_object(v, memo)) for k, v in obj.items()]).encode()).hexdigest()
+    if memo is not None and id(obj) in memo and memo[id(obj)][0] is obj:
+        return memo[id(obj)][1]
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        d = hash_frame(obj)
+    elif isinstance(obj, np.ndarray):
+        d = hashlib.sha1(repr((obj.dtype.str, obj.shape)).encode() + np.ascontiguousarray(obj).tobytes()).hexdigest()
+    elif hasattr(obj, '__dict__'):
+        d = type(obj).__name__ + ':' + hash_object(vars(obj), memo)
+    else:
+        d = hashlib.sha1(pickle.dumps(obj, protocol=4)).hexdigest()
+    if memo is not None:
+        memo[id(obj)] = (obj, d)
+    return d
+
+
+# Hash of the source file of the module defining func, or of the source of func when it has no
+# file, so that code edits change the hash. Hashes are remembered in memo by module name.
+def code_digest(func, memo=None):
+    mod = func.__module__
+    if memo is not None and mod in memo:
+        return memo[mod]
+    h = hashlib.sha1()
+    f = getattr(sys.modules.get(mod), '__file__', None)
+    if f is not None and os.path.isfile(f):
+        with open(f, 'rb') as fh:
+            h.update(fh.read())
+    else:
+        h.update(inspect.getsource(func).encode())
+    if memo is not None:
+        memo[mod] = h.hexdigest()
+    return h.hexdigest()
+
+
+class stage_cache:
+    """Parquet cache of stage outputs keyed by content hashes of stage inputs"""
+
+    def __init__(self, cache_path, verbose=True):
+        self.cache_path = cache_path
+        self.verbose = verbose
+        os.makedirs(cache_path, exist_ok=True)
+        self.hits = []
+        self.misses = []
+        self._digests = {}
+        self._code_digests = {}
+
+    # Clear the hashes remembered from earlier runs, as input frames may be edited between runs
+    def reset(self):
+        self.hits = []
+        self.misses = []
+        self._digests = {}
+
+    # Hash of the source file of the module defining a stage, so that code edits invalidate the cache
+    def _code_digest(self, func):
+        return code_digest(func, self._code_digests)
+
+    # Hash of any stage argument, hashes of data frames are remembered for the duration of a run.
+    # With attrs, only the given attributes of the object are hashed.
+    def digest(self, obj, attrs=None):
+        if attrs is not None:
+            return type(obj).__name__ + ':' + hash_object({k: getattr(obj, k) for k in attrs}, self._digests)
+        return hash_object(obj, self._digests)
+
+    # Attributes of an argument object referred to in the stage code, e.g. config.production_year.
+    # Objects whose methods are called by the stage, such as the unit conversion object, are hashed whole.
+    def _referred_attrs(self, func, name, obj):
+        if isinstance(obj, (pd.DataFrame, pd.Series, np.ndarray, list, tuple, set, dict)) or not hasattr(obj, '__dict__'):
+            return None
+        attrs = sorted(set(re.findall(r'\b' + name + r'\.(\w+)', inspect.getsource(func))))
+        # attributes read on first access, such as inputs not read yet, are hashed as well
+        lazy = getattr(obj, '_sources', {})
+        if len(attrs) == 0 or any(a not in vars(obj) and a not in lazy for a in attrs):
+            return None
+        return attrs
+
+    # Cache key of a stage call
+    def key(self, func, *args):
+        params = list(inspect.signature(func).parameters)
+        parts = [func.__name__, self._code_digest(func)]
+        for name, arg in zip(params, args):
+            parts.append(name + '=' + self.digest(arg, self._referred_attrs(func, name, arg)))
+        return hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+    def _stage_path(self, func):
+        return self.cache_path + '/' + func.__name__
+
+    def _write(self, func, key, out):
+        path = self._stage_path(func)
+        os.makedirs(path, exist_ok=True)
+        outs = list(out) if isinstance(out, tuple) else [out]
+        meta = {'tuple': isinstance(out, tuple), 'items': []}
+        for i, o in enumerate(outs):
+            f = key + '_' + str(i)
+            if o is None:
+                meta['items'].append({'type': 'none'})
+                continue
+            if not isinstance(o, pd.DataFrame):
+                raise ValueError('Stage ' + func.__name__ + ' returned a ' + type(o).__name__ + ', only data frames can be cached ..')
+            try:
+                o.to_parquet(path + '/' + f + '.parquet')
+                # parquet infers types of object columns, original types are restored on read
+                meta['items'].append({'type': 'parquet', 'file': f + '.parquet',
+                                      'dtypes': [str(dt) for dt in o.dtypes]})
+            except Exception:
+                # mixed type object columns can not be written to parquet
+                o.to_pickle(path + '/' + f + '.pkl')
+                meta['items'].append({'type': 'pickle', 'file': f + '.pkl'})
+        # meta file is written last, a key is only valid once all its outputs are on disk
+        with open(path + '/' + key + '.json', 'w') as fh:
+            json.dump(meta, fh)
+
+    def _read(self, func, key):
+        path = self._stage_path(func)
+        with open(path + '/' + key + '.json') as fh:
+            meta = json.load(fh)
+        outs = []
+        for item in meta['items']:
+            if item['type'] == 'none':
+                outs.append(None)
+            elif item['type'] == 'parquet':
+                df = pd.read_parquet(path + '/' + item['file'])
+                for i, dt in enumerate(item['dtypes']):
+                    if str(df.dtypes.iloc[i]) != dt:
+                        df.isetitem(i, df.iloc[:, i].astype(dt))
+                outs.append(df)
+            else:
+                outs.append(pd.read_pickle(path + '/' + item['file']))
+        return tuple(outs) if meta['tuple'] else outs[0]
+
+    # Run a stage, or read its output from the cache when its key is unchanged
+    def run(self, func, *args):
+        key = self.key(func, *args)
+        if os.path.isfile(self._stage_path(func) + '/' + key + '.json'):
+            out = self._read(func, key)
+            self.hits.append(func.__name__)
+            if self.verbose:
+                print('Stage cache: reusing ' + func.__name__ + ' ..')
+        else:
+            out = func(*args)
+            self._write(func, key, out)
+            self.misses.append(func.__name__)
+
+        outs = out if isinstance(out, tuple) else (out,)
+        for i, o in enumerate(outs):
+            if o is not None:
+                self._digests[id(o)] = (o, key + ':' + str(i))
+        return out
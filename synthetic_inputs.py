@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright © 2025, UChicago Argonne, LLC
+The full description is available in the LICENSE file at location:
+    https://github.com/Saurajyoti/BestBiomassUse/blob/master/LICENSE
+
+@Project: Best Use of Biomass
+@Title: Synthetic model inputs for benchmarking
+@Authors: Saurajyoti Kar
+@Contact: skar@anl.gov
+@Affiliation: Argonne National Laboratory
+
+"""
+
+"""
+Generators of synthetic Db sheet, temporal GREET LCI and var_p tables matching
+the schema of the MCCAM workbook and the LCI correspondence file, scaled by the
+number of pathways, production years, variability points and LCI rows. The
+synthetic pathways map to the replaced fuel and GREET pathways present in the
+correspondence files of the repository.
+
+"""
+
+import numpy as np
+import pandas as pd
+
+# template rows of a synthetic pathway:
+# Parameter_A, Parameter_B, Stream_Flow, Stream_LCA, primary fuel flag, flow unit, flow, cost item, unit cost
+pathway_template = [
+    ('Final Product', 'Fuel Use', 'Renewable Gasoline', 'Renewable Gasoline', 'Y', 'MJ', 50000., '-', np.nan),
+    ('Final Product', 'Fuel Use', 'Renewable Diesel', 'Renewable Diesel', '', 'MJ', 20000., '-', np.nan),
+    ('Feedstock', 'Conversion: Input Supply Chains', 'Blended woody biomass', 'Blended woody biomass', '', 'lb', 80000., 'Blended woody biomass', 0.04),
+    ('Utilities', 'Conversion: Input Supply Chains', 'Electricity', 'Stationary Use: U.S. Mix', '', 'kWh', 900., 'Electricity', 0.07),
+    ('Utilities', 'Conversion: Input Supply Chains', 'Natural Gas (feedstock and fuel)', 'Natural Gas as Stationary Fuel', '', 'MMBtu', 12., 'Natural Gas', 4.5),
+    ('Emissions', 'Conversion: Combustion Ems, Fossil', 'Natural Gas (combustion)', 'Small Industrial Boiler (10-100 mmBtu/hr input)', '', 'MMBtu', 12., '-', np.nan),
+    ('Emissions', 'CCS Stream, Fossil', 'Carbon Dioxide', 'Carbon Dioxide', '', 'g', -300000., '-', np.nan),
+    ('Coproducts', 'Coproduct Credits', 'Electricity', 'Stationary Use: U.S. Mix', '', 'kWh', 150., 'Electricity', 0.06),
+    ('Fixed Costs', 'Fixed Costs', '', '-', '', '-', np.nan, 'Fixed operating costs', np.nan),
+    ('Capital Depreciation', 'Capital Depreciation', '', '-', '', '-', np.nan, 'Capital depreciation', np.nan),
+]
+
+# LCI keys referenced by the pathway template, with GREET unit
+LCI_keys = [
+    ('Fuel Use', 'Renewable Gasoline', 'Renewable Gasoline', 'g/MJ'),
+    ('Fuel Use', 'Renewable Diesel', 'Renewable Diesel', 'g/MJ'),
+    ('Conversion: Input Supply Chains', 'Blended woody biomass', 'Blended woody biomass', 'g/g'),
+    ('Conversion: Input Supply Chains', 'Electricity', 'Stationary Use: U.S. Mix', 'g/mmBtu'),
+    ('Conversion: Input Supply Chains', 'Natural Gas (feedstock and fuel)', 'Natural Gas as Stationary Fuel', 'g/mmBtu'),
+    ('Conversion: Combustion Ems, Fossil', 'Natural Gas (combustion)', 'Small Industrial Boiler (10-100 mmBtu/hr input)', 'g/mmBtu'),
+    ('CCS Stream, Fossil', 'Carbon Dioxide', 'Carbon Dioxide', 'g/g'),
+    ('Coproduct Credits', 'Electricity', 'Stationary Use: U.S. Mix', 'g/mmBtu'),
+    ('Replaced Fuel', 'Gasoline Vehicle (well to wheels)', 'Gasoline Vehicle: Gasoline', 'g/mmBtu'),
+]
+
+# GREET LCA metrics and their base values per unit of flow
+LCI_metrics = {'VOC': 0.01, 'CO': 0.05, 'NOx': 0.05, 'BC': 0.001, 'OC': 0.001, 'CH4': 0.1, 'N2O': 0.001, 'CO2': 70., 'CO2 (w/ C in VOC & CO)': 70.2, 'Biogenic CH4': 0.}
+
+operating_time = 7884.
+
+
+# Name of the i-th synthetic pathway, as long as the names of the workbook
+def synthetic_case_name(i):
+    return ('Synthetic pathway ' + str(i).zfill(4) +
+            ': lignocellulosic biomass to renewable gasoline and diesel blendstocks via '
+            'catalytic upgrading with heat integration and CCS of flue gas CO2')
+
+
+# Db sheet rows of n_pathways synthetic pathways, as read by main_2.load_inputs
+def synthetic_db(n_pathways, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(n_pathways):
+        case = synthetic_case_name(i)
+        scale = rng.uniform(0.5, 2.)
+        for (par_A, par_B, s_flow, s_LCA, primary, unit, flow, cost_item, unit_cost) in pathway_template:
+            flow = flow * scale
+            total_flow = flow * operating_time
+            if par_B in ['Fixed Costs', 'Capital Depreciation']:
+                total_cost = rng.uniform(1E6, 5E7)
+            elif np.isnan(unit_cost):
+                total_cost = np.nan
+            else:
+                total_cost = flow * operating_time * unit_cost
+            rows.append({
+                'Case/Scenario': case,
+                'Parameter_A': par_A,
+                'Parameter_B': par_B,
+                'Stream_Flow': s_flow,
+                'Stream_LCA': s_LCA,
+                'Energy_alloc_primary_fuel': primary,
+                'Flow: Unit (numerator)': unit,
+                'Flow: Unit (denominator)': 'hr',
+                'Flow': flow,
+                'Cost Item': cost_item,
+                'Cost: Unit (numerator)': 'USD',
+                'Cost: Unit (denominator)': unit,
+                'Unit Cost': unit_cost,
+                'Operating Time: Unit': 'hr',
+                'Operating Time': operating_time,
+                'Operating Time (%)': 0.9,
+                'Total Cost: Unit (numerator)': 'USD',
+                'Total Cost: Unit (denominator)': 'yr',
+                'Total Cost': total_cost,
+                'Total Flow: Unit (numerator)': unit,
+                'Total Flow: Unit (denominator)': 'yr',
+                'Total Flow': total_flow,
+                'Cost Year': float(rng.integers(2014, 2021)),
+            })
+    return pd.DataFrame(rows)
+
+
+# Rows of the temporal GREET LCI: one header and one row per metric for every key and year.
+# Filler keys, never referenced by the Db sheet, are added until n_rows is reached.
+def synthetic_LCI(years, n_rows=None, seed=0):
+    rng = np.random.default_rng(seed)
+    keys = list(LCI_keys)
+    rows_per_key = (len(LCI_metrics) + 1) * len(years)
+    if n_rows is not None:
+        n_filler = max(0, int(np.ceil(n_rows / rows_per_key)) - len(keys))
+        keys += [('Conversion: Input Supply Chains', 'Filler flow ' + str(i), 'Filler LCI ' + str(i), 'g/mmBtu')
+                 for i in range(n_filler)]
+    rows = []
+    for yr in years:
+        for (par_B, s_flow, s_LCA, unit) in keys:
+            base = {'Parameter_B': par_B, 'Stream_Flow': s_flow, 'Stream_LCA': s_LCA,
+                    'GREET1 sheet': 'Synthetic', 'Coproduct allocation method': 'primary product',
+                    'GREET classification of coproduct': np.nan, 'notes': np.nan, 'Year': yr}
+            rows.append({**base, 'GREET row names_level1': 'Total emissions: grams/mmBtu of fuel throughput',
+                         'values_level1': np.nan, 'Unit': np.nan})
+            for metric, val in LCI_metrics.items():
+                rows.append({**base, 'GREET row names_level1': '     ' + metric,
+                             'values_level1': str(val * rng.uniform(0.8, 1.2) * (1 - 0.01 * (yr - years[0]))),
+                             'Unit': unit})
+    return pd.DataFrame(rows)
+
+
+# var_p sheet with one variability parameter of k_points linear steps, for Stream_LCA or Cost_Item variabilities
+def synthetic_var_p(k_points, col_param='Stream_LCA'):
+    if col_param == 'Stream_LCA':
+        param_name, col_val, param_min = 'Stationary Use: U.S. Mix', 'LCA_value', 0.
+    else:
+        col_param, param_name, col_val, param_min = 'Cost Item', 'Electricity', 'Unit Cost', 0.01
+    return pd.DataFrame({'col_param': [col_param], 'col_val': [col_val], 'param_name': [param_name],
+                         'param_min': [param_min], 'param_max': [param_min + (k_points - 1) * 1.],
+                         'param_dist': ['linear'], 'dist_option': [1.]})
+
+
+# Correspondence of the synthetic pathways to the replaced fuel, and the lists sheet
+def synthetic_corr_replaced_replacing_fuel(cases):
+    return pd.DataFrame({'Case/Scenario': cases,
+                         'Biofuel Stream_LCA': 'Renewable Gasoline',
+                         'Replaced Fuel': 'Motor Gasoline'})
+
+
+def synthetic_pathway_names(cases):
+    return pd.DataFrame({'Case/Scenario': cases,
+                         'process|feedstock|product yield': 'synthetic'})
@@ -21,6 +21,19 @@ declares the unit conventions used in calculations in the model. Pre-defining
 the unit conventions facilitates to change needed units at one place and be consistent
 across all calculations of the models.
 
+The unit conversion class derives the conversion factors between all units of a
+unit category from the pairs listed in the Unit Conversion table, chaining the
+listed factors and their inverses. Listed factors that disagree with their reverse
+or with other rows of the table are reported, and not chained. Pairs not listed in the table are converted
+with the derived factors, which can be cached to a folder and are derived again
+when the table changes. Values of compound units, held as numerator and
+denominator unit columns, are converted to a target compound unit such as
+'USD/MJ' in one call.
+
+load_model_units pickles the constructed object to a cache folder, and loads it
+from there while its input files and this module are unchanged. shared_model_units
+keeps one object per set of input folders for all callers in the process.
+
 """
     
 """
@@ -31,25 +44,126 @@ sources:
 
 """
 
+import hashlib
+import importlib.util
+import os
+import pickle
+import threading
 import pandas as pd 
 import numpy as np
 import sys
 
+from sheet_cache import hash_file
+from stage_cache import code_digest
+
+# Rust based Excel reader, much faster than openpyxl, used when installed
+excel_engine = 'calamine' if importlib.util.find_spec('python_calamine') is not None else None
+
+f_unit_closure = 'unit_closure.npz'
+
+f_units_compiled = 'model_units.pkl'
+
+# Input files of the unit conversion object, by input folder
+f_unit_convert = 'Unit Conversion.xlsx'
+f_tool_units = 'B2B_tool_unit_conventions.csv'
+f_GREET_HV = 'GREETheatingValues.csv'
+f_corr_EF_GREET_EIA = 'corr_EF_GREET_EIA.csv'
+
+# Unit conversion objects shared in the process, by input folders and options
+_shared_units = {}
+_shared_units_lock = threading.Lock()
+
+
+# Relative tolerance of the agreement of a listed conversion factor with its reverse and with the
+# factor derived along other chains of conversions
+unit_closure_rtol = 1E-3
+
+
+# Conversion factors from unit s to all units along the shortest chains of the edges, NaN where
+# the units are not connected
+def _chain_factors(edges, s):
+    factor = np.full(len(edges), np.nan)
+    factor[s] = 1.
+    queue = [s]
+    for u in queue:
+        for v, m in edges[u].items():
+            if np.isnan(factor[v]):
+                factor[v] = factor[u] * m
+                queue.append(v)
+    return factor
+
+
+# Edges of the listed factors and their inverses, listed factors of both directions take precedence
+def _closure_edges(rows, n):
+    edges = [{} for _ in range(n)]
+    for _, f, t, m in rows:
+        if m != 0:
+            edges[t][f] = 1 / m
+    for _, f, t, m in rows:
+        edges[f][t] = m
+    return edges
+
+
+# Transitive closure of the conversion factors of the units of one category. pairs lists the
+# Convert_From, Convert_To and Multiply_By of the category. The units are connected by the listed
+# factors and their inverses, and every unit is converted to the units it reaches along the
+# shortest chain of conversions, so listed pairs keep their listed factor.
+# Listed factors are checked first: a row is inconsistent when its factor disagrees, within rtol,
+# with the factor of the reverse pair, or of the same pair listed again, or with 1 between a unit
+# and itself, or with the factor derived along other chains of the remaining rows. Inconsistent
+# rows are not chained, so units reached only through them are not converted.
+# Returns the sorted units, the matrix of factors converting the unit of a column to the unit of
+# a row, NaN where the units are not connected, and the positions in pairs of the inconsistent rows.
+def unit_closure(pairs, rtol = unit_closure_rtol):
+    units = np.sort(np.asarray(pd.concat([pairs['Convert_From'], pairs['Convert_To']]).dropna().unique(), dtype = str))
+    pos = {u: i for i, u in enumerate(units)}
+    rows = [(k, pos[f], pos[t], float(m)) for k, (f, t, m) in enumerate(zip(pairs['Convert_From'], pairs['Convert_To'], pairs['Multiply_By']))
+            if f in pos and t in pos and np.isfinite(m)]
+
+    def agree(a, b):
+        return np.isclose(a, b, rtol = rtol, atol = 0)
+
+    listed = {}
+    for k, f, t, m in rows:
+        listed.setdefault((f, t), []).append(m)
+    bad = set()
+    for k, f, t, m in rows:
+        if f == t:
+            ok = agree(m, 1.)
+        else:
+            ok = all(agree(m, m2) for m2 in listed[(f, t)]) and all(agree(m * m2, 1.) for m2 in listed.get((t, f), []))
+        if not ok:
+            bad.add(k)
+
+    # every remaining listed factor against the factor derived without the rows of its pair
+    rows = [r for r in rows if r[0] not in bad]
+    for k, f, t, m in rows:
+        if f != t:
+            other = _chain_factors(_closure_edges([r for r in rows if {r[1], r[2]} != {f, t}], len(units)), f)[t]
+            if not np.isnan(other) and not agree(m, other):
+                bad.add(k)
+
+    edges = _closure_edges([r for r in rows if r[0] not in bad], len(units))
+    factor = np.column_stack([_chain_factors(edges, s) for s in range(len(units))]) if len(units) > 0 \
+        else np.full((0, 0), np.nan)
+    return units, factor, np.array(sorted(bad), dtype = np.int64)
+
 
 #%%
 
 class model_units:
     
-    def __init__(self, input_path_units, input_path_GREET, input_path_corr, verbose = True, class_object_for = 'EERE_Tool'):               
+    def __init__(self, input_path_units, input_path_GREET, input_path_corr, verbose = True, class_object_for = 'EERE_Tool',
+                 closure_cache_path = None):               
         
         self.input_path_units = input_path_units
         self.input_path_GREET = input_path_GREET
         self.input_path_corr = input_path_corr
         
-        self.f_unit_convert = 'Unit Conversion.xlsx'
-        self.f_tool_units = 'B2B_tool_unit_conventions.csv'
-        self.f_GREET_HV = 'GREETheatingValues.csv'
-        self.f_corr_EF_GREET_EIA = 'corr_EF_GREET_EIA.csv'
+        self.f_unit_convert = f_unit_convert
+        self.f_tool_units = f_tool_units
+        self.f_GREET_HV = f_GREET_HV
+        self.f_corr_EF_GREET_EIA = f_corr_EF_GREET_EIA
         
         self.return_to_unit = 'return_to_unit'
         self.verbose = verbose
@@ -57,13 +171,16 @@ class model_units:
         sheet_physical = 'physical'
         sheet_feedstock = 'feedstock'
               
-        physical = pd.read_excel(self.input_path_units + '\\' + self.f_unit_convert, sheet_name = sheet_physical)
-        feedstock = pd.read_excel(self.input_path_units + '\\' + self.f_unit_convert, sheet_name = sheet_feedstock)
-        eere_tool_units = pd.read_csv(self.input_path_units + '\\' + self.f_tool_units)
+        # both sheets are parsed in one pass over the workbook
+        sheets = pd.read_excel(self.input_path_units + '/' + self.f_unit_convert, sheet_name = [sheet_physical, sheet_feedstock],
+                               engine = excel_engine)
+        physical = sheets[sheet_physical]
+        feedstock = sheets[sheet_feedstock]
+        eere_tool_units = pd.read_csv(self.input_path_units + '/' + self.f_tool_units)
         
-        hv = pd.read_csv(self.input_path_GREET + '\\' + self.f_GREET_HV)
+        hv = pd.read_csv(self.input_path_GREET + '/' + self.f_GREET_HV)
                
-        corr_EF_GREET_EIA = pd.read_csv(self.input_path_corr + '\\' + self.f_corr_EF_GREET_EIA)
+        corr_EF_GREET_EIA = pd.read_csv(self.input_path_corr + '/' + self.f_corr_EF_GREET_EIA)
         
         self.df_units = pd.concat([physical, feedstock])
         
@@ -85,6 +202,10 @@ class model_units:
         self.dict_units_from = self.df_units.set_index('Convert_From').to_dict()['Category']
         self.dict_units = self.df_units.set_index('unit_conv').to_dict()['Multiply_By']
         self.eere_tool_units = eere_tool_units.set_index('Category').to_dict()['Unit']
+        
+        # Conversion factors between all units of a category, also of pairs not in the table
+        self.closure_cache_path = closure_cache_path
+        self.setup_unit_closure()
                 
         self.hv_EIA = pd.merge(corr_EF_GREET_EIA, hv, how='left', on=['GREET_Fuel', 'GREET_Fuel type'])        
         
@@ -133,52 +254,140 @@ class model_units:
     def unit_convert (self, convert):
         if convert in self.dict_units:
             return self.dict_units[convert]
+        parts = convert.split('_per_')
+        factor = self.closure_factor(parts[:1], parts[1:]) if len(parts) == 2 else [np.nan]
+        if not np.isnan(factor[0]):
+            return factor[0]
         else:
             print('Note: the requested unit conversion value is not found, now returning 1 as multiplier. \
                   Please check the Unit Conversion table to revise and maintain consistency.')
             return 1
     
-    # The caller function to convert unit for a data frame. The column names should be 'Unit' and 'Value'
+    # The caller function to convert unit for a data frame. The column names should be 'Unit' and 'Value'.
+    # The conversion keys and factors are looked up once per unique unit of the frame, and the values
+    # are converted with one multiply or divide by the factors of the unit codes of the rows.
     def unit_convert_df (self, df, 
                          Unit = 'Unit', Value = 'Value', 
                          if_unit_numerator = 'True', # True if unit to be changed is in numerator, False if unit to be changed is in denominator
                          if_given_unit = False, given_unit = '',  # convert to lower case
                          if_given_category = False, unit_category = 'None'):
         
-        df = df.copy()
-        #df[Unit] = self.conv_to_lower_list(df[Unit])
-        df[Unit] = df[Unit].str.lower()
+        # codes of the rows into the unique units, missing units are kept as a unique value
+        codes, uniques = pd.factorize(df[Unit], use_na_sentinel = False)
+        unit_from = pd.Series(np.asarray(uniques, dtype = object)).str.lower()
         
         if if_given_unit:
-            df['unit_to'] = given_unit.lower()
+            unit_to = pd.Series([given_unit.lower()] * len(unit_from), dtype = object)
         elif if_given_category:
-            df['unit_to'] = [self.select_units(x, unit_category) for x in df[Unit] ]
+            unit_to = pd.Series([self.select_units(x, unit_category) for x in unit_from], dtype = object)
         else:
-            df['unit_to'] = [self.select_units(x) for x in df[Unit] ]
+            unit_to = pd.Series([self.select_units(x) for x in unit_from], dtype = object)
                 
-        df['unit_conv'] = df['unit_to'] + '_per_' + df[Unit] 
+        factor = self.conversion_factors(unit_to, unit_from)
+        
+        if if_unit_numerator:        # if numerator, directly multiply numerator, otherwise divide
+            values = np.asarray(df[Value]) * factor[codes]
+        else:
+            values = np.asarray(df[Value]) / factor[codes]
+        
+        return pd.DataFrame({Unit : unit_to.astype(str).take(codes).set_axis(df.index),
+                             Value : values}, index = df.index)
+    
+    # Convert the values of a compound unit, held as a numerator and a denominator unit column, to the
+    # compound unit to_unit given as 'numerator/denominator', e.g. 'USD/MJ' or 'g/MJ'. The factors of
+    # both sides are looked up once per unique unit, and the values converted in one pass.
+    # Returns the numerator and denominator unit columns, in lower case, and the value column.
+    def unit_convert_compound_df (self, df, to_unit,
+                                  Value = 'Value',
+                                  Unit_numerator = 'Unit (numerator)', Unit_denominator = 'Unit (denominator)'):
+        
+        if '/' not in to_unit:
+            raise ValueError ('The compound unit ' + to_unit + ' is not of the form numerator/denominator ..')
+        to_numerator, to_denominator = [x.strip().lower() for x in to_unit.split('/', 1)]
         
-        missing_keys = df.loc[~ (df['unit_conv'].isin(self.dict_units.keys()) ), 'unit_conv' ].unique()
+        factors = []
+        codes = []
+        for Unit, unit in [(Unit_numerator, to_numerator), (Unit_denominator, to_denominator)]:
+            unit_codes, uniques = pd.factorize(df[Unit], use_na_sentinel = False)
+            unit_from = pd.Series(np.asarray(uniques, dtype = object)).str.lower()
+            factors.append(self.conversion_factors(pd.Series([unit] * len(unit_from), dtype = object), unit_from))
+            codes.append(unit_codes)
+        
+        values = np.asarray(df[Value]) * (factors[0][codes[0]] / factors[1][codes[1]])
+        
+        return pd.DataFrame({Unit_numerator : to_numerator, Unit_denominator : to_denominator,
+                             Value : values}, index = df.index)
+    
+    # Conversion factors from the units unit_from to the units unit_to, series of lower case units.
+    # Factors are taken from the table, else from the closure of the unit categories, and are 1
+    # between a unit and itself. Raises a KeyError for pairs without a factor.
+    def conversion_factors(self, unit_to, unit_from):
+        unit_conv = unit_to + '_per_' + unit_from
+        
+        listed = unit_conv.isin(self.dict_units.keys()).to_numpy()
+        factor = unit_conv.map(self.dict_units).to_numpy()
+        if not listed.all():
+            same = (unit_to == unit_from).to_numpy()
+            factor = np.where(listed, factor, np.where(same, 1., self.closure_factor(unit_to, unit_from)))
+        
+        missing_keys = unit_conv.loc[~ listed & np.isnan(factor.astype(float))].unique()
         if len(missing_keys) > 0:            
             print('WARNING: missing unit conversion keys:')
             print(missing_keys)
             raise KeyError ('Please update the unit_conversions table before model execution .. ')
         
-        if if_unit_numerator:        # if numerator, directly multiply numerator, otherwise divide
-            df[Value] = np.where(
-                 [x in self.dict_units for x in df['unit_conv'] ],
-                 df[Value] * df['unit_conv'].map(self.dict_units),
-                 df[Value] )
-        else:
-            df[Value] = np.where(
-                 [x in self.dict_units for x in df['unit_conv'] ],
-                 df[Value] / df['unit_conv'].map(self.dict_units),
-                 df[Value] )
+        return factor
+    
+    # Build the closure of the conversion factors of every unit category, or read it from
+    # closure_cache_path when it was built from the same conversion table by the same code.
+    # Rows of the table inconsistent with the other rows are reported in a warning.
+    def setup_unit_closure(self):
+        pairs = self.df_units.loc[self.df_units['Category'].notna(), ['Category', 'Convert_From', 'Convert_To', 'Multiply_By']]
+        h = hashlib.sha1(pd.util.hash_pandas_object(pairs.astype(str), index = False).values.tobytes())
+        h.update(code_digest(unit_closure).encode())
+        key = h.hexdigest()
+        f = None if self.closure_cache_path is None else self.closure_cache_path + '/' + f_unit_closure
+        groups = dict(list(pairs.groupby('Category', sort = True)))
+        
+        self.closure = None
+        if f is not None and os.path.isfile(f):
+            with np.load(f) as cached:
+                if str(cached['key']) == key:
+                    self.closure = {str(c) : (cached['units_' + str(i)], cached['factor_' + str(i)], cached['inconsistent_' + str(i)])
+                                    for i, c in enumerate(cached['categories'])}
         
-        df.drop(['unit_conv', Unit], axis = 1, inplace = True)
-        df.rename(columns = {'unit_to' : Unit}, inplace = True)
+        if self.closure is None:
+            self.closure = {c : unit_closure(grp) for c, grp in groups.items()}
+            if f is not None:
+                os.makedirs(self.closure_cache_path, exist_ok = True)
+                arrays = {'key' : np.array(key), 'categories' : np.array(list(self.closure.keys()), dtype = str)}
+                for i, (units, factor, inconsistent) in enumerate(self.closure.values()):
+                    arrays['units_' + str(i)] = units
+                    arrays['factor_' + str(i)] = factor
+                    arrays['inconsistent_' + str(i)] = inconsistent
+                # written to a temporary file first, the cache is complete once it is in place
+                with open(f + '.tmp', 'wb') as fh:
+                    np.savez(fh, **arrays)
+                os.replace(f + '.tmp', f)
         
-        return df[[Unit, Value]].copy()
+        self.closure_inconsistent = pd.concat([pairs.iloc[:0]] + [groups[c].iloc[inconsistent] for c, (_, _, inconsistent) in self.closure.items()])
+        if self.closure_inconsistent.shape[0] > 0:
+            print('WARNING: unit conversion rows inconsistent with their reverse or other rows, not used to derive pairs not in the table:')
+            print(self.closure_inconsistent.to_string(index = False))
+        
+        # category and matrix position of every unit
+        self.unit_position = {u : (c, i) for c, (units, _, _) in self.closure.items() for i, u in enumerate(units)}
+    
+    # Conversion factors from units_from to units_to, lists of lower case units, from the closure of
+    # the unit categories. NaN where the units are not of the same category or not connected.
+    def closure_factor(self, units_to, units_from):
+        factor = np.full(len(units_to), np.nan)
+        for k, (t, f) in enumerate(zip(units_to, units_from)):
+            ct, it = self.unit_position.get(t, (None, None))
+            cf, jf = self.unit_position.get(f, (None, None))
+            if ct is not None and ct == cf:
+                factor[k] = self.closure[ct][1][it, jf]
+        return factor
     
     def setup_hv_convert(self):
         self.hv_EIA['LHV_by_HHV'] = self.hv_EIA['LHV'] / self.hv_EIA['HHV']
@@ -196,6 +405,96 @@ class model_units:
         self.hv_EIA.drop(columns=['LHV_y'], inplace=True)
         
         
+
+    # Input files the object is constructed from
+    def source_files(self):
+        return unit_source_files(self.input_path_units, self.input_path_GREET, self.input_path_corr)
+
+
+# Input files of the unit conversion object of the given input folders
+def unit_source_files(input_path_units, input_path_GREET, input_path_corr):
+    return [input_path_units + '/' + f_unit_convert, input_path_units + '/' + f_tool_units,
+            input_path_GREET + '/' + f_GREET_HV, input_path_corr + '/' + f_corr_EF_GREET_EIA]
+
+
+# Size, modification time and hash of the files, hashed only when with_hash is True
+def _file_records(files, with_hash = True):
+    records = {}
+    for f in files:
+        st = os.stat(f)
+        records[f] = {'size' : st.st_size, 'mtime_ns' : st.st_mtime_ns, 'sha1' : hash_file(f) if with_hash else None}
+    return records
+
+
+# True when the files are unchanged since the records were taken, judged by size and modification
+# time, or by the hash of the file when these differ
+def _files_unchanged(records):
+    for f, rec in records.items():
+        if not os.path.isfile(f):
+            return False
+        st = os.stat(f)
+        if rec['size'] != st.st_size:
+            return False
+        if rec['mtime_ns'] != st.st_mtime_ns and (rec['sha1'] is None or rec['sha1'] != hash_file(f)):
+            return False
+    return True
+
+
+# Unit conversion object of the input folders, loaded from the compiled object pickled in
+# cache_path when it was constructed from the current input files and this module, with the same
+# options.
+# Otherwise the object is constructed from the input files and pickled to cache_path.
+def load_model_units(input_path_units, input_path_GREET, input_path_corr, cache_path, verbose = True,
+                     class_object_for = 'EERE_Tool'):
+    # the module is a source of the compiled object as well, objects of older versions are not loaded
+    files = unit_source_files(input_path_units, input_path_GREET, input_path_corr) + [os.path.abspath(__file__)]
+    f = cache_path + '/' + f_units_compiled
+    if os.path.isfile(f):
+        try:
+            with open(f, 'rb') as fh:
+                compiled = pickle.load(fh)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # written by another version of the class, constructed again
+            compiled = None
+        if compiled is not None and compiled['files'] == files and compiled['class_object_for'] == class_object_for \
+                and _files_unchanged(compiled['sources']):
+            ob_units = compiled['ob_units']
+            ob_units.verbose = verbose
+            return ob_units
+    
+    if verbose:
+        print('Unit conversions: compiling the unit conversion object to ' + f + ' ..')
+    sources = _file_records(files)
+    ob_units = model_units(input_path_units, input_path_GREET, input_path_corr, verbose, class_object_for,
+                           closure_cache_path = cache_path)
+    os.makedirs(cache_path, exist_ok = True)
+    # written to a temporary file first, the compiled object is complete once it is in place
+    with open(f + '.tmp', 'wb') as fh:
+        pickle.dump({'files' : files, 'class_object_for' : class_object_for, 'sources' : sources,
+                     'ob_units' : ob_units}, fh, protocol = 4)
+    os.replace(f + '.tmp', f)
+    return ob_units
+
+
+# Unit conversion object shared by all callers in the process. It is constructed, or loaded from
+# cache_path when given, on the first call for the input folders, and again when any of its input
+# files changed since.
+def shared_model_units(input_path_units, input_path_GREET, input_path_corr, cache_path = None,
+                       class_object_for = 'EERE_Tool'):
+    key = (input_path_units, input_path_GREET, input_path_corr, cache_path, class_object_for)
+    with _shared_units_lock:
+        if key in _shared_units and _files_unchanged(_shared_units[key][0]):
+            return _shared_units[key][1]
+        files = unit_source_files(input_path_units, input_path_GREET, input_path_corr)
+        sources = _file_records(files, with_hash = False)
+        if cache_path is None:
+            ob_units = model_units(input_path_units, input_path_GREET, input_path_corr, class_object_for = class_object_for)
+        else:
+            ob_units = load_model_units(input_path_units, input_path_GREET, input_path_corr, cache_path,
+                                        class_object_for = class_object_for)
+        _shared_units[key] = (sources, ob_units)
+        return ob_units
+
     
 #%%
 
@@ -222,3 +521,15 @@ if __name__ == '__main__':
     print( ob_units.select_units('kto') )
     
     print( ob_units.unit_convert_df(df_test[['Unit', 'Value']]) )
+
+    # Compound unit with a derived denominator pair, barrel to kiloliter is not in the table:
+    # 1 barrel = 42 gal * 3.785411784 liter/gal = 0.158987294928 kiloliter
+    df_test_compound = pd.DataFrame({
+        'Value' : [100],
+        'Unit (numerator)' : ['USD'],
+        'Unit (denominator)' : ['barrel']})
+
+    df_test_compound = ob_units.unit_convert_compound_df(df_test_compound, 'USD/kiloliter')
+    print( df_test_compound )
+    assert np.isclose(df_test_compound['Value'].iloc[0], 100 / 0.158987294928, rtol = 1E-4), \
+        'USD/barrel to USD/kiloliter does not match the hand computed factor ..'